@@ -0,0 +1,526 @@
+# Micro-benchmarks for pure-Python hot paths
+#
+# Measures query building, input sanitizing, nquad generation and
+# response post-processing without DGraph: all database calls are
+# replaced by stubs that answer from the fixture payloads.
+#
+# Usage:
+#   python benchmarks/micro.py                               # run all benchmarks
+#   python benchmarks/micro.py build_query_string sanitizer_dataset
+#   python benchmarks/micro.py --out micro.json --baseline benchmarks/micro_baseline.json
+#
+#   # profiling: writes <name>.prof (cProfile, e.g. for snakeviz) and
+#   # <name>.folded (collapsed stacks for flamegraph.pl or speedscope)
+#   python benchmarks/micro.py sanitizer_newssource --profile profiles/
+#
+# Timing follows pyperf: the number of loops is calibrated so that
+# every sample takes at least `--min-time`; we report the mean,
+# median and standard deviation of the time per call.
+
+import sys
+from os.path import dirname
+sys.path.append(dirname(sys.path[0]))
+
+import argparse
+import cProfile
+import collections
+import contextlib
+import datetime
+import json
+import platform
+import pstats
+import random
+import statistics
+import threading
+import time
+import typing as t
+from pathlib import Path
+from unittest import mock
+
+from meteor import create_app, dgraph
+from meteor.main.model import *
+from meteor.flaskdgraph import Schema
+from meteor.flaskdgraph.client import DGraph
+from meteor.flaskdgraph.query import build_query_string, generate_query_forms
+from meteor.flaskdgraph.dgraph_types import dict_to_nquad, make_nquad, UID, NewID, Scalar
+from meteor.flaskdgraph.nquads import NQuadWriter
+from meteor.flaskdgraph.utils import recursive_restore_sequence
+from meteor.api.sanitizer import Sanitizer
+from meteor.users.constants import USER_ROLES
+
+from benchmarks.run import BenchmarkConfig, compare
+from benchmarks.synthetic import Generator, WORDS
+
+
+class MicroConfig(BenchmarkConfig):
+    WTF_CSRF_ENABLED = False
+
+
+""" Fixtures """
+
+class Fixtures:
+
+    """
+        Realistic payloads with stable UIDs.
+        `types` maps every UID to its dgraph.type for the DB stubs.
+    """
+
+    def __init__(self, seed: int = 42):
+        self.random = random.Random(seed)
+        self.types = {}
+        self._next_uid = 0x1000
+        self.user_uid = self.uid('User')
+        self.authors = self.uids('Author', 250)
+        self.languages = self.uids('Language', 40)
+        self.countries = self.uids('Country', 60)
+        self.channels = self.uids('Channel', 8)
+        self.sources = self.uids('NewsSource', 500)
+        self.text_types = self.uids('TextType', 10)
+        self.modalities = self.uids('Modality', 5)
+        self.file_formats = self.uids('FileFormat', 20)
+        self.meta_variables = self.uids('MetaVariable', 30)
+        self.concept_variables = self.uids('ConceptVariable', 30)
+        self.text_units = self.uids('UnitOfAnalysis', 10)
+        self.operations = self.uids('Operation', 25)
+
+    def uid(self, dgraph_type: str) -> str:
+        uid = hex(self._next_uid)
+        self._next_uid += 1
+        self.types[uid] = dgraph_type
+        return uid
+
+    def uids(self, dgraph_type: str, n: int) -> list:
+        return [self.uid(dgraph_type) for _ in range(n)]
+
+    def sample(self, population: list, n: int) -> list:
+        return self.random.sample(population, min(n, len(population)))
+
+    def words(self, n: int) -> str:
+        return ' '.join(self.random.choice(WORDS) for _ in range(n))
+
+    """ Payloads for Sanitizer (as sent to /api/add) """
+
+    def large_dataset(self, n_sources: int = 300, n_authors: int = 50) -> dict:
+        return {'name': 'Comparative ' + self.words(4).title(),
+                'alternate_names': [self.words(2).title() for _ in range(20)],
+                'authors': self.sample(self.authors, n_authors),
+                'date_published': 2021,
+                'url': 'https://example.org/dataset',
+                'doi': '10.1234/dataset.5678',
+                'description': self.words(200),
+                'conditions_of_access': 'registration',
+                'fulltext_available': True,
+                'geographic_scope': ['multinational', 'national'],
+                'countries': self.sample(self.countries, 40),
+                'languages': self.sample(self.languages, 30),
+                'temporal_coverage_start': '1990-01-01',
+                'temporal_coverage_end': '2022-12-31',
+                'text_types': self.sample(self.text_types, 5),
+                'modalities': self.sample(self.modalities, 3),
+                'file_formats': self.sample(self.file_formats, 8),
+                'sources_included': self.sample(self.sources, n_sources),
+                'documentation': [f'https://example.org/docs/{i}' for i in range(10)],
+                'meta_variables': self.sample(self.meta_variables, 20),
+                'concept_variables': self.sample(self.concept_variables, 20),
+                'text_units': self.sample(self.text_units, 5)}
+
+    def paper(self, n_authors: int = 200) -> dict:
+        return {'title': self.words(8).capitalize() + ': ' + self.words(5),
+                'authors': self.sample(self.authors, n_authors),
+                'date_published': 2019,
+                'paper_kind': 'journal-article',
+                'venue': 'Journal of ' + self.words(2).title(),
+                'url': 'https://example.org/paper',
+                'doi': '10.1234/paper.91011',
+                'description': self.words(150),
+                'methodologies': self.sample(self.operations, 6),
+                'concept_variables': self.sample(self.concept_variables, 10),
+                'sources_included': self.sample(self.sources, 50),
+                'countries': self.sample(self.countries, 10),
+                'channels': self.sample(self.channels, 4),
+                'geographic_scope': ['national'],
+                'languages': self.sample(self.languages, 5)}
+
+    def newssource(self, n_audience: int = 60) -> dict:
+        dates = sorted(datetime.date(2010, 1, 1) + datetime.timedelta(days=self.random.randrange(4000))
+                       for _ in range(n_audience))
+        return {'name': self.words(2).title(),
+                'channel': self.channels[0],
+                'identifier': '@' + self.words(1),
+                'identifier|kind': 'handle',
+                'alternate_names': [self.words(2).title() for _ in range(10)],
+                'date_founded': 1995,
+                'publication_kind': ['newspaper', 'news site'],
+                'special_interest': False,
+                'publication_cycle': 'continuous',
+                'geographic_scope': 'national',
+                'countries': self.sample(self.countries, 1),
+                'languages': self.sample(self.languages, 3),
+                'payment_model': 'partly free',
+                'contains_ads': 'yes',
+                'audience_size': [d.isoformat() for d in dates],
+                'audience_size|unit': {str(i): 'followers' for i in range(n_audience)},
+                'audience_size|count': {str(i): 1000 * (i + 1) for i in range(n_audience)},
+                'audience_size|data_from': {str(i): 'platform' for i in range(n_audience)},
+                'audience_size_recent': 1000 * n_audience,
+                'audience_size_recent|unit': 'followers',
+                'audience_size_recent|timestamp': dates[-1].isoformat(),
+                'party_affiliated': 'no',
+                'description': self.words(100)}
+
+    """ Query dictionaries (as produced by `request.args.to_dict(flat=False)`) """
+
+    def query(self) -> dict:
+        return {'dgraph.type': ['NewsSource'],
+                'languages': self.sample(self.languages, 3),
+                'languages*connector': ['OR'],
+                'channel': self.sample(self.channels, 2),
+                'countries': self.sample(self.countries, 4),
+                'publication_kind': ['newspaper', 'news site'],
+                'audience_size|count': ['10000'],
+                'audience_size|count*operator': ['gt'],
+                'audience_size|unit': ['followers'],
+                '_terms': ['daily news'],
+                '_max_results': ['50'],
+                '_page': ['2']}
+
+    """ DGraph responses """
+
+    def response(self, n: int = 300) -> bytes:
+        """ JSON response with the shape of a `view/uid` or `query` result """
+        generator = Generator(n, seed=self.random.randrange(1000), density=0.8)
+        nodes = list(generator.nodes())
+        return json.dumps({'q': nodes}).encode('utf-8')
+
+    def author_sequences(self, n_entries: int = 200, n_authors: int = 20) -> list:
+        entries = []
+        for _ in range(n_entries):
+            names = [f'Author {i}' for i in range(n_authors)]
+            order = list(range(n_authors))
+            self.random.shuffle(order)
+            entries.append({'uid': self.uid('ScientificPublication'),
+                            'name': self.words(4),
+                            '_authors_fallback': names,
+                            '_authors_fallback|sequence': {str(i): s for i, s in enumerate(order)},
+                            'authors': [{'uid': a, 'name': 'Jane Doe', 'authors|sequence': i}
+                                        for i, a in enumerate(self.sample(self.authors, 5))]})
+        return entries
+
+
+""" DB Stubs """
+
+@contextlib.contextmanager
+def stub_dgraph(fixtures: Fixtures):
+    """ replace all DGraph calls that are made during validation """
+
+    user = {'uid': fixtures.user_uid,
+            'email': 'benchmark-admin@opted.eu',
+            'display_name': 'Benchmark',
+            'role': USER_ROLES.Admin,
+            '_account_status': 'active',
+            'name': 'Jane Doe',
+            'iso_3166_1_2': 'at'}
+
+    by_type = collections.defaultdict(list)
+    for uid, dgraph_type in fixtures.types.items():
+        by_type[dgraph_type.lower()].append({'uid': uid,
+                                             'name': f'{dgraph_type} {uid}',
+                                             '_unique_name': f'{dgraph_type.lower()}_{uid}',
+                                             'dgraph.type': [dgraph_type],
+                                             'entry_review_status': 'accepted'})
+
+    class Response(dict):
+        # query blocks for choices are named after the lowercase dgraph.type
+        def __missing__(self, key):
+            return by_type[key]
+
+    def query(query_string, variables=None, raw=False):
+        return Response(q=[user])
+
+    def get_dgraphtype(uid, clean=['Entry', 'Resource']):
+        return fixtures.types.get(str(uid), False)
+
+    # plain functions instead of mocks, so the stubs do not show up in profiles
+    with mock.patch.object(dgraph, 'query', new=query), \
+            mock.patch.object(dgraph, 'get_uid', new=lambda *args, **kwargs: None), \
+            mock.patch.object(dgraph, 'get_uids', new=lambda *args, **kwargs: None), \
+            mock.patch.object(dgraph, 'get_unique_name', new=lambda uid: 'print'), \
+            mock.patch.object(dgraph, 'get_dgraphtype', new=get_dgraphtype):
+        yield
+
+
+""" Benchmarks """
+
+# every benchmark gets the fixtures and returns the function to time
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__.replace('bench_', '')] = func
+    return func
+
+
+@benchmark
+def bench_build_query_string(fx: Fixtures) -> t.Callable:
+    query = fx.query()
+    return lambda: build_query_string(query)
+
+
+@benchmark
+def bench_build_query_string_count(fx: Fixtures) -> t.Callable:
+    query = fx.query()
+    return lambda: build_query_string(query, count=True)
+
+
+@benchmark
+def bench_generate_query_forms(fx: Fixtures) -> t.Callable:
+    return lambda: generate_query_forms()
+
+
+def _sanitizer(data: dict, dgraph_type: str, fx: Fixtures) -> t.Callable:
+    user = User(uid=fx.user_uid)
+    return lambda: Sanitizer(dict(data), user, dgraph_type=dgraph_type)
+
+
+@benchmark
+def bench_sanitizer_dataset(fx: Fixtures) -> t.Callable:
+    return _sanitizer(fx.large_dataset(), 'Dataset', fx)
+
+
+@benchmark
+def bench_sanitizer_paper(fx: Fixtures) -> t.Callable:
+    return _sanitizer(fx.paper(), 'ScientificPublication', fx)
+
+
+@benchmark
+def bench_sanitizer_newssource(fx: Fixtures) -> t.Callable:
+    return _sanitizer(fx.newssource(), 'NewsSource', fx)
+
+
+@benchmark
+def bench_dict_to_nquad(fx: Fixtures) -> t.Callable:
+    user = User(uid=fx.user_uid)
+    entry = Sanitizer(fx.large_dataset(), user, dgraph_type='Dataset').entry
+    return lambda: dict_to_nquad(entry)
+
+
+@benchmark
+def bench_make_nquad(fx: Fixtures) -> t.Callable:
+    subject = UID(fx.sources[0])
+    now = datetime.datetime(2023, 1, 1)
+    objects = [Scalar(now, facets={'unit': 'followers', 'count': i, 'data_from': 'platform'})
+               for i in range(100)]
+    objects += [UID(uid, facets={'sequence': i}) for i, uid in enumerate(fx.authors[:100])]
+    objects += [NewID('_:new' + str(i)) for i in range(100)]
+
+    def run():
+        for o in objects:
+            make_nquad(subject, 'audience_size', o)
+
+    return run
+
+
+@benchmark
+def bench_nquad_writer_json(fx: Fixtures) -> t.Callable:
+    # bulk import path: synthetic nodes in DGraph's JSON format
+    nodes = list(Generator(200, seed=42).nodes())
+
+    def run():
+        writer = NQuadWriter()
+        writer.write_json(nodes)
+        return writer.getvalue()
+
+    return run
+
+
+@benchmark
+def bench_recursive_restore_sequence(fx: Fixtures) -> t.Callable:
+    data = fx.author_sequences()
+    return lambda: recursive_restore_sequence(data)
+
+
+@benchmark
+def bench_datetime_hook(fx: Fixtures) -> t.Callable:
+    payload = fx.response()
+    return lambda: json.loads(payload, object_hook=DGraph.datetime_hook)
+
+
+@benchmark
+def bench_schema_decoder(fx: Fixtures) -> t.Callable:
+    # current decoder, as reference for `datetime_hook`
+    payload = fx.response()
+    return lambda: dgraph.decoder.decode(payload)
+
+
+@benchmark
+def bench_schema_as_dict(fx: Fixtures) -> t.Callable:
+    notifications = [Notification(_notify=fx.user_uid,
+                                  _title='New Dataset',
+                                  _content=fx.words(30),
+                                  _linked=uid) for uid in fx.sources[:100]]
+    return lambda: [n.as_dict() for n in notifications]
+
+
+@benchmark
+def bench_schema_provide_types(fx: Fixtures) -> t.Callable:
+    return lambda: Schema.provide_types()
+
+
+""" Timing """
+
+def calibrate(func: t.Callable, min_time: float) -> int:
+    """ number of loops so that one sample takes at least `min_time` """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - start >= min_time or loops >= 1_000_000:
+            return loops
+        loops *= 2
+
+
+def timeit(func: t.Callable, samples: int = 10, min_time: float = 0.1, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        func()
+    loops = calibrate(func, min_time)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((time.perf_counter() - start) / loops)
+    return {'n': samples * loops,
+            'loops': loops,
+            'samples': samples,
+            'mean': statistics.mean(timings),
+            'p50': statistics.median(timings),
+            'stdev': statistics.stdev(timings) if samples > 1 else 0.0,
+            'min': min(timings),
+            'max': max(timings)}
+
+
+""" Profiling """
+
+class StackSampler:
+
+    """
+        Samples the call stack of a thread in regular intervals
+        and collects collapsed stacks (`func;func;func count`).
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: Path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def profile(name: str, func: t.Callable, out: Path, loops: int = 50) -> None:
+    out.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for _ in range(loops):
+        func()
+    profiler.disable()
+    profiler.dump_stats(out / f'{name}.prof')
+
+    with StackSampler(threading.get_ident()) as sampler:
+        for _ in range(loops):
+            func()
+    sampler.write(out / f'{name}.folded')
+
+    print(f'\n{name}: {out / (name + ".prof")}, {out / (name + ".folded")}')
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run micro-benchmarks')
+    parser.add_argument('benchmarks', nargs='*', default=list(BENCHMARKS),
+                        help=f'any of: {", ".join(BENCHMARKS)}')
+    parser.add_argument('--samples', default=10, type=int)
+    parser.add_argument('--min-time', default=0.1, type=float,
+                        help='minimum duration of a sample (seconds)')
+    parser.add_argument('--seed', default=42, type=int)
+    parser.add_argument('--profile', type=Path,
+                        help='write cProfile and collapsed stack output to this directory')
+    parser.add_argument('--profile-loops', default=50, type=int)
+    parser.add_argument('--out', type=Path, help='write results as JSON')
+    parser.add_argument('--baseline', type=Path, help='compare results with this file')
+    parser.add_argument('--metric', default='p50', choices=['mean', 'p50', 'min'])
+    parser.add_argument('--tolerance', default=0.2, type=float)
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f'Unknown benchmarks: {", ".join(unknown)}')
+
+    app = create_app(config_class=MicroConfig)
+    fixtures = Fixtures(seed=args.seed)
+
+    results = {'meta': {'date': datetime.datetime.now().isoformat(),
+                        'python': platform.python_version(),
+                        'platform': platform.platform(),
+                        'samples': args.samples,
+                        'seed': args.seed},
+               'scenarios': {}}
+
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}), \
+            stub_dgraph(fixtures):
+        for name in args.benchmarks:
+            func = BENCHMARKS[name](fixtures)
+            if args.profile:
+                profile(name, func, args.profile, loops=args.profile_loops)
+                continue
+            result = timeit(func, samples=args.samples, min_time=args.min_time)
+            results['scenarios'][name] = result
+            print(f'{name:<28} {result["mean"] * 1e3:10.3f}ms +- {result["stdev"] * 1e3:.3f}ms '
+                  f'(median {result["p50"] * 1e3:.3f}ms, {result["loops"]} loops x {result["samples"]})')
+
+    if args.profile:
+        return
+
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, metric=args.metric, tolerance=args.tolerance)
+        for row in rows:
+            flag = 'REGRESSION' if row['regression'] else 'ok'
+            print(f'{row["scenario"]:<28} {args.metric} {row["baseline"] * 1e3:10.3f}ms '
+                  f'-> {row["current"] * 1e3:10.3f}ms ({row["ratio"]:.2f}x) {flag}')
+        if any(row['regression'] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+# Latency and throughput benchmarks for API routes
+#
+# Runs a fixed set of scenarios through the Flask test client, either
+# against a live DGraph (loaded with `benchmarks/synthetic.py`) or
+# against a recording of DGraph responses (see `benchmarks/stand_in.py`).
+#
+# Usage:
+#   # live DGraph, also record responses for later replays
+#   python benchmarks/run.py --record benchmarks/recordings/10k.json.gz --out results.json
+#
+#   # replay recording, compare against stored baseline
+#   python benchmarks/run.py --replay benchmarks/recordings/10k.json.gz \
+#       --out results.json --baseline benchmarks/baseline.json
+#
+# Exits with status 1 if a scenario got slower than the baseline
+# by more than `--tolerance` (default: 20 %).
+
+import sys
+from os.path import dirname
+sys.path.append(dirname(sys.path[0]))
+
+import argparse
+import datetime
+import json
+import platform
+import random
+import secrets
+import statistics
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from flask_jwt_extended import create_access_token
+
+from meteor import create_app, dgraph
+from meteor.config import Config
+from meteor.misc.metrics import metrics
+
+from benchmarks.synthetic import USERS, WORDS
+from benchmarks.stand_in import Recording, RecordingClient, ReplayClient
+
+
+class BenchmarkConfig(Config):
+    TESTING = False
+    DEBUG_MODE = False
+    SECRET_KEY = secrets.token_hex(32)
+    JWT_SECRET_KEY = SECRET_KEY
+    # send notifications within the request, so their DGraph
+    # calls are measured (and recorded) deterministically
+    NOTIFICATIONS_SYNC = True
+    HTTP_CACHE_ONLY = True
+    SLACK_LOGGING_ENABLED = False
+
+
+FIXTURE_QUERY = '''{
+    sources(func: type(NewsSource), first: 200) @filter(eq(entry_review_status, "accepted")) { uid }
+    languages(func: type(Language), first: 20) { uid }
+    countries(func: type(Country), first: 20) { uid }
+    channels(func: type(Channel)) { uid }
+    pending(func: eq(entry_review_status, "pending"), first: 1000) { uid }
+}'''
+
+
+""" Scenarios """
+
+def scenario_query(client, fixtures: dict, rng: random.Random, i: int):
+    query = {'languages': rng.choice(fixtures['languages']),
+             'channel': rng.choice(fixtures['channels'])}
+    return client.get('/api/query', query_string=query, headers=fixtures['headers'])
+
+
+def scenario_quicksearch(client, fixtures: dict, rng: random.Random, i: int):
+    term = ' '.join(rng.sample(WORDS, 2))
+    return client.get('/api/quicksearch', query_string={'term': term},
+                      headers=fixtures['headers'])
+
+
+def scenario_view_uid(client, fixtures: dict, rng: random.Random, i: int):
+    return client.get('/api/view/uid/' + rng.choice(fixtures['sources']),
+                      headers=fixtures['headers'])
+
+
+def scenario_view_reverse(client, fixtures: dict, rng: random.Random, i: int):
+    # countries and languages have the most incoming edges
+    uid = rng.choice(fixtures['countries'] + fixtures['languages'])
+    return client.get('/api/view/reverse/' + uid, headers=fixtures['headers'])
+
+
+def scenario_view_similar(client, fixtures: dict, rng: random.Random, i: int):
+    return client.get('/api/view/similar/' + rng.choice(fixtures['sources']),
+                      headers=fixtures['headers'])
+
+
+def scenario_add(client, fixtures: dict, rng: random.Random, i: int):
+    data = {'name': f'Benchmark Organization {fixtures["run"]} {i}',
+            'description': ' '.join(rng.sample(WORDS, 8)),
+            'ownership_kind': 'private ownership',
+            'country': rng.choice(fixtures['countries']),
+            'is_ngo': False}
+    return client.post('/api/add/Organization', json={'data': data},
+                       headers=fixtures['headers'])
+
+
+def scenario_review_submit(client, fixtures: dict, rng: random.Random, i: int):
+    # every review consumes a pending entry
+    with fixtures['lock']:
+        uid = fixtures['pending'].pop() if fixtures['pending'] else None
+    if uid is None:
+        return None
+    return client.post('/api/review/submit',
+                       data={'uid': uid, 'status': rng.choice(['accepted', 'revise'])},
+                       headers=fixtures['headers'])
+
+
+SCENARIOS = {
+    'query': scenario_query,
+    'quicksearch': scenario_quicksearch,
+    'view_uid': scenario_view_uid,
+    'view_reverse': scenario_view_reverse,
+    'view_similar': scenario_view_similar,
+    'add': scenario_add,
+    'review_submit': scenario_review_submit,
+}
+
+# scenarios that write to the database
+WRITE_SCENARIOS = {'add', 'review_submit'}
+
+
+""" Runner """
+
+def get_fixtures(app, user: str) -> dict:
+    with app.app_context():
+        data = dgraph.query(FIXTURE_QUERY)
+        user_uid = dgraph.get_uid('email', user)
+        if user_uid is None:
+            raise ValueError(f'User <{user}> not found. Did you load the synthetic data?')
+        token = create_access_token(identity=user_uid)
+    fixtures = {k: [item['uid'] for item in v] for k, v in data.items()}
+    fixtures['headers'] = {'Authorization': 'Bearer ' + token}
+    fixtures['lock'] = threading.Lock()
+    fixtures['run'] = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+    return fixtures
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    if len(values) == 0:
+        return 0.0
+    k = (len(values) - 1) * p / 100
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+
+def run_scenario(app, name: str, fixtures: dict, iterations: int = 100,
+                 warmup: int = 10, concurrency: int = 1, seed: int = 42) -> dict:
+    """ run a scenario `iterations` times, spread over `concurrency` threads """
+    func = SCENARIOS[name]
+    latencies = []
+    errors = []
+    status_codes = {}
+    lock = threading.Lock()
+
+    def worker(worker_id: int, n: int, record: bool):
+        rng = random.Random(seed + worker_id)
+        client = app.test_client()
+        for i in range(n):
+            start = time.perf_counter()
+            response = func(client, fixtures, rng, worker_id * n + i)
+            duration = time.perf_counter() - start
+            if response is None:
+                # nothing left to do (e.g., no more pending entries)
+                return
+            if not record:
+                continue
+            with lock:
+                latencies.append(duration)
+                status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+    # warm up caches and lazy imports, single threaded
+    if name not in WRITE_SCENARIOS:
+        worker(-1, warmup, record=False)
+
+    per_thread = max(1, iterations // concurrency)
+    threads = [threading.Thread(target=worker, args=(w, per_thread, True))
+               for w in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if len(latencies) == 0:
+        return {'n': 0, 'errors': 0, 'status_codes': status_codes}
+
+    return {'n': len(latencies),
+            'errors': len(errors),
+            'status_codes': {str(k): v for k, v in status_codes.items()},
+            'concurrency': concurrency,
+            'mean': statistics.mean(latencies),
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies),
+            'throughput': len(latencies) / elapsed}
+
+
+def compare(results: dict, baseline: dict, metric: str = 'p50',
+            tolerance: float = 0.2) -> t.List[dict]:
+    """ compare two result sets, returns one row per scenario """
+    rows = []
+    for name, result in results['scenarios'].items():
+        try:
+            before = baseline['scenarios'][name][metric]
+        except KeyError:
+            continue
+        after = result.get(metric)
+        if not before or after is None:
+            continue
+        ratio = after / before
+        rows.append({'scenario': name,
+                     'baseline': before,
+                     'current': after,
+                     'ratio': ratio,
+                     'regression': ratio > 1 + tolerance})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run API benchmarks')
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS),
+                        choices=list(SCENARIOS))
+    parser.add_argument('--iterations', default=100, type=int)
+    parser.add_argument('--warmup', default=10, type=int)
+    parser.add_argument('--concurrency', default=1, type=int)
+    parser.add_argument('--seed', default=42, type=int)
+    parser.add_argument('--user', default=USERS[0]['email'],
+                        help='email of the (admin) user that runs the scenarios')
+    parser.add_argument('--endpoint', default='localhost:9080', help='DGraph endpoint')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--record', type=Path, help='record DGraph responses to this file')
+    mode.add_argument('--replay', type=Path, help='replay recorded DGraph responses')
+    parser.add_argument('--replay-latency', action='store_true',
+                        help='delay replayed responses by the recorded server latency')
+    parser.add_argument('--out', type=Path, help='write results as JSON')
+    parser.add_argument('--baseline', type=Path, help='compare results with this file')
+    parser.add_argument('--metric', default='p50', choices=['mean', 'p50', 'p90', 'p99'])
+    parser.add_argument('--tolerance', default=0.2, type=float)
+    args = parser.parse_args()
+
+    BenchmarkConfig.DGRAPH_ENDPOINT = args.endpoint
+    app = create_app(config_class=BenchmarkConfig)
+
+    recording = None
+    with app.app_context():
+        if args.replay:
+            dgraph._client = ReplayClient(Recording.load(args.replay),
+                                          latency=args.replay_latency)
+        elif args.record:
+            recording = Recording(meta={'date': datetime.datetime.now().isoformat(),
+                                        'endpoint': args.endpoint})
+            dgraph._client = RecordingClient(dgraph.connection, recording)
+
+    fixtures = get_fixtures(app, args.user)
+    metrics.reset()
+
+    results = {'meta': {'date': datetime.datetime.now().isoformat(),
+                        'mode': 'replay' if args.replay else 'live',
+                        'python': platform.python_version(),
+                        'platform': platform.platform(),
+                        'iterations': args.iterations,
+                        'concurrency': args.concurrency,
+                        'seed': args.seed},
+               'scenarios': {}}
+
+    for name in args.scenarios:
+        result = run_scenario(app, name, fixtures,
+                              iterations=args.iterations, warmup=args.warmup,
+                              concurrency=args.concurrency, seed=args.seed)
+        results['scenarios'][name] = result
+        if result['n'] > 0:
+            print(f'{name:<15} n={result["n"]:<5} errors={result["errors"]:<4} '
+                  f'p50={result["p50"] * 1000:8.2f}ms p90={result["p90"] * 1000:8.2f}ms '
+                  f'p99={result["p99"] * 1000:8.2f}ms {result["throughput"]:8.1f} req/s')
+        else:
+            print(f'{name:<15} skipped (no data)')
+
+    results['dgraph_metrics'] = metrics.render()
+
+    if recording is not None:
+        recording.save(args.record)
+        print(f'Recorded {len(recording)} responses: {args.record}')
+
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, metric=args.metric, tolerance=args.tolerance)
+        regressions = [row for row in rows if row['regression']]
+        for row in rows:
+            flag = 'REGRESSION' if row['regression'] else 'ok'
+            print(f'{row["scenario"]:<15} {args.metric} {row["baseline"] * 1000:8.2f}ms '
+                  f'-> {row["current"] * 1000:8.2f}ms ({row["ratio"]:.2f}x) {flag}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
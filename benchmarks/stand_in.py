@@ -0,0 +1,221 @@
+# Recorded-response stand-in for DGraph
+#
+# Benchmarks can run against a live DGraph or against a recording of
+# its responses. A recording is made once against a DGraph that is
+# loaded with synthetic data (see `benchmarks/synthetic.py`) and can
+# be replayed on any machine, so the benchmarks measure the
+# application code without network and database noise.
+#
+#   recording = Recording()
+#   dgraph._client = RecordingClient(dgraph.connection, recording)
+#   ... run scenarios ...
+#   recording.save('benchmarks/recordings/10k.json.gz')
+#
+#   dgraph._client = ReplayClient(Recording.load('benchmarks/recordings/10k.json.gz'))
+
+import sys
+from os.path import dirname
+sys.path.append(dirname(sys.path[0]))
+
+import gzip
+import json
+import hashlib
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from meteor.misc.metrics import fingerprint
+
+
+class Latency:
+
+    def __init__(self, total_ns: int = 0):
+        self.total_ns = total_ns
+
+
+class Response:
+
+    """ Mimics the parts of `pydgraph.Response` used by `meteor.flaskdgraph.client` """
+
+    def __init__(self, json: bytes = b'{}', uids: dict = None, latency_ns: int = 0):
+        self.json = json
+        self.uids = uids or {}
+        self.latency = Latency(latency_ns)
+
+    def __bool__(self) -> bool:
+        return True
+
+
+class ReplayError(Exception):
+    pass
+
+
+def request_key(operation: str, query: str = None, variables: dict = None) -> str:
+    """ exact key: operation, query and variables """
+    key = operation + '\n' + (query or '') + '\n' + json.dumps(variables or {}, sort_keys=True)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def shape_key(operation: str, query: str = None) -> str:
+    """ fallback key: operation and query fingerprint (ignores literals) """
+    return operation + ':' + fingerprint(query)
+
+
+class Recording:
+
+    """
+        Stores DGraph responses by exact request and by query shape.
+        Mutations are only stored by shape, because they usually
+        contain timestamps and differ in every run.
+    """
+
+    def __init__(self, exact: dict = None, shapes: dict = None, meta: dict = None):
+        self.exact = exact or {}
+        self.shapes = shapes or {}
+        self.meta = meta or {}
+        self._lock = threading.Lock()
+
+    def add(self, operation: str, query: str, variables: dict, response) -> None:
+        entry = {'json': response.json.decode('utf-8') if response.json else '{}',
+                 'uids': dict(response.uids) if response.uids else {},
+                 'latency_ns': int(getattr(response.latency, 'total_ns', 0))}
+        with self._lock:
+            if operation == 'query':
+                self.exact[request_key(operation, query, variables)] = entry
+            self.shapes.setdefault(shape_key(operation, query), entry)
+
+    def get(self, operation: str, query: str = None, variables: dict = None) -> dict:
+        entry = None
+        if operation == 'query':
+            entry = self.exact.get(request_key(operation, query, variables))
+        if entry is None:
+            entry = self.shapes.get(shape_key(operation, query))
+        if entry is None:
+            raise ReplayError(f'No recorded response for {operation} <{fingerprint(query)}>: {query}')
+        return entry
+
+    def __len__(self) -> int:
+        return len(self.exact) + len(self.shapes)
+
+    def save(self, path: t.Union[str, Path]) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        opener = gzip.open if path.suffix == '.gz' else open
+        with opener(path, 'wt', encoding='utf-8') as f:
+            json.dump({'meta': self.meta, 'exact': self.exact, 'shapes': self.shapes}, f)
+
+    @classmethod
+    def load(cls, path: t.Union[str, Path]) -> 'Recording':
+        path = Path(path)
+        opener = gzip.open if path.suffix == '.gz' else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(exact=data['exact'], shapes=data['shapes'], meta=data.get('meta'))
+
+
+""" Recording """
+
+class RecordingTxn:
+
+    def __init__(self, txn, recording: Recording):
+        self._txn = txn
+        self._recording = recording
+
+    def __getattr__(self, name):
+        return getattr(self._txn, name)
+
+    def query(self, query, variables=None, **kwargs):
+        response = self._txn.query(query, variables=variables, **kwargs)
+        self._recording.add('query', query, variables, response)
+        return response
+
+    def mutate(self, *args, **kwargs):
+        response = self._txn.mutate(*args, **kwargs)
+        self._recording.add('mutate', None, None, response)
+        return response
+
+    def do_request(self, request, **kwargs):
+        response = self._txn.do_request(request, **kwargs)
+        self._recording.add('upsert', request.query, None, response)
+        return response
+
+
+class RecordingClient:
+
+    """ Wraps a `pydgraph.DgraphClient` and records every response """
+
+    def __init__(self, client, recording: Recording):
+        self._client = client
+        self.recording = recording
+
+    def txn(self, *args, **kwargs) -> RecordingTxn:
+        return RecordingTxn(self._client.txn(*args, **kwargs), self.recording)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+""" Replay """
+
+class _Request:
+
+    def __init__(self, query: str = None, mutations: list = None, **kwargs):
+        self.query = query
+        self.mutations = mutations
+
+
+class ReplayTxn:
+
+    def __init__(self, client: 'ReplayClient', read_only: bool = False, **kwargs):
+        self._client = client
+        self.read_only = read_only
+
+    def _respond(self, operation: str, query: str = None, variables: dict = None) -> Response:
+        entry = self._client.recording.get(operation, query, variables)
+        if self._client.latency:
+            # simulate the time DGraph needed to answer
+            time.sleep(entry['latency_ns'] / 1e9)
+        return Response(json=entry['json'].encode('utf-8'),
+                        uids=entry['uids'],
+                        latency_ns=entry['latency_ns'])
+
+    def query(self, query, variables=None, **kwargs) -> Response:
+        return self._respond('query', query, variables)
+
+    def mutate(self, *args, **kwargs) -> Response:
+        return self._respond('mutate')
+
+    def create_mutation(self, **kwargs) -> dict:
+        return kwargs
+
+    def create_request(self, query=None, mutations=None, **kwargs) -> _Request:
+        return _Request(query=query, mutations=mutations)
+
+    def do_request(self, request: _Request, **kwargs) -> Response:
+        return self._respond('upsert', request.query)
+
+    def commit(self) -> None:
+        pass
+
+    def discard(self) -> None:
+        pass
+
+
+class ReplayClient:
+
+    """
+        Drop-in replacement for `pydgraph.DgraphClient` that answers
+        from a `Recording`. With `latency=True` every response is
+        delayed by the server latency that was recorded.
+    """
+
+    def __init__(self, recording: Recording, latency: bool = False):
+        self.recording = recording
+        self.latency = latency
+
+    def txn(self, read_only: bool = False, **kwargs) -> ReplayTxn:
+        return ReplayTxn(self, read_only=read_only)
+
+    def alter(self, *args, **kwargs) -> None:
+        pass
@@ -0,0 +1,455 @@
+# Synthetic data generator for benchmarks
+#
+# Generates a graph that follows the types, relationships and facets
+# declared in `meteor/main/model.py` at a configurable scale.
+#
+# Usage:
+#   python benchmarks/synthetic.py --scale 10k --out data/benchmark-10k
+#   python benchmarks/synthetic.py --scale 100k --out data/benchmark-100k --load --set-schema
+#
+# The output directory contains:
+#   - `schema.dql`: the DGraph schema generated from the model
+#   - `chunk-00000.json`, ...: JSON arrays with blank nodes (`_:n123`),
+#       can be loaded with `dgraph live -f <dir> -s schema.dql` or with `--load`
+#       (with `--format rdf`: `chunk-00000.rdf`, ... N-Quads for `dgraph live`)
+#   - `manifest.json`: seed, scale and number of nodes per type
+
+import sys
+from os.path import dirname
+sys.path.append(dirname(sys.path[0]))
+
+import argparse
+import datetime
+import gzip
+import json
+import random
+import typing as t
+from pathlib import Path
+
+from meteor.main.model import *
+from meteor.main.custom_types import OrderedListRelationship
+from meteor.flaskdgraph import Schema
+from meteor.flaskdgraph.nquads import NQuadWriter
+from meteor.users.constants import USER_ROLES
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+# share of entries per dgraph type (roughly the distribution in production).
+# The order matters: relationships can only point to nodes generated before.
+ENTRY_WEIGHTS = {
+    'Organization': 0.08,
+    'Person': 0.05,
+    'PoliticalParty': 0.05,
+    'Government': 0.02,
+    'Parliament': 0.02,
+    'JournalisticBrand': 0.08,
+    'NewsSource': 0.35,
+    'Author': 0.10,
+    'ScientificPublication': 0.10,
+    'Archive': 0.03,
+    'Dataset': 0.06,
+    'Tool': 0.04,
+    'Collection': 0.01,
+    'LearningMaterial': 0.01,
+}
+
+# controlled vocabularies: fixed number of nodes independent of scale
+VOCABULARY = {
+    'Country': 60,
+    'Multinational': 5,
+    'Subnational': 120,
+    'Language': 40,
+    'Channel': 8,
+    'ProgrammingLanguage': 12,
+    'Operation': 25,
+    'FileFormat': 20,
+    'MetaVariable': 30,
+    'ConceptVariable': 30,
+    'TextType': 10,
+    'UnitOfAnalysis': 10,
+    'Modality': 5,
+}
+
+CHANNELS = ['print', 'website', 'facebook', 'twitter',
+            'instagram', 'telegram', 'vkontakte', 'transcript']
+
+WORDS = ['news', 'daily', 'times', 'post', 'herald', 'tribune', 'journal', 'gazette',
+         'observer', 'standard', 'courier', 'express', 'review', 'chronicle', 'monitor',
+         'radio', 'television', 'digital', 'weekly', 'morning', 'evening', 'national',
+         'regional', 'european', 'public', 'free', 'independent', 'people', 'voice',
+         'party', 'union', 'alliance', 'democratic', 'social', 'liberal', 'green',
+         'corpus', 'parliament', 'speeches', 'debates', 'manifesto', 'election', 'media',
+         'analysis', 'text', 'mining', 'sentiment', 'topic', 'model', 'toolkit', 'parser',
+         'archive', 'collection', 'dataset', 'survey', 'panel', 'study', 'comparative',
+         'politics', 'agenda', 'policy', 'government', 'cabinet', 'minister', 'council']
+
+FIRST_NAMES = ['Anna', 'Ben', 'Clara', 'David', 'Eva', 'Felix', 'Greta', 'Hugo', 'Ines',
+               'Jonas', 'Katja', 'Lukas', 'Maria', 'Nils', 'Olga', 'Paul', 'Rosa', 'Simon']
+
+LAST_NAMES = ['Müller', 'Schmidt', 'Novak', 'Rossi', 'Garcia', 'Kowalski', 'Dubois',
+              'Jensen', 'Horvath', 'Papadopoulos', 'Silva', 'Nagy', 'Virtanen', 'Smith']
+
+# users for `_added_by`, `_reviewed_by` and for logging into the benchmark app
+USERS = [{'email': 'benchmark-admin@opted.eu', 'role': USER_ROLES.Admin},
+         {'email': 'benchmark-reviewer@opted.eu', 'role': USER_ROLES.Reviewer},
+         {'email': 'benchmark-contributor@opted.eu', 'role': USER_ROLES.Contributor}]
+PASSWORD = 'benchmark123'
+
+# predicates that are set by the generator itself (or never)
+SKIP_PREDICATES = {'uid', 'dgraph.type', '_unique_name', '_date_created',
+                   '_date_modified', '_added_by', '_reviewed_by', '_edited_by',
+                   'entry_review_status', '_legacy_id', '_authors_fallback',
+                   'wikidata_id', 'hdl'}
+
+
+class Generator:
+
+    """
+        Seeded, streaming generator of synthetic entries.
+        Iterate over `Generator.nodes()` to get JSON objects
+        that can be used as `set_obj` in mutations.
+    """
+
+    def __init__(self, n_entries: int, seed: int = 42,
+                 density: float = 0.6, pending: float = 0.05,
+                 start: datetime.datetime = datetime.datetime(2015, 1, 1)):
+        self.n_entries = n_entries
+        self.random = random.Random(seed)
+        self.seed = seed
+        # probability that an optional predicate is filled
+        self.density = density
+        # share of entries with `entry_review_status: pending`
+        self.pending = pending
+        self.start = start
+        self.counter = 0
+        # blank node ids per dgraph type
+        self.pool = {}
+        self.counts = {}
+        self._predicates = {}
+
+    """ Values """
+
+    def blank_node(self, dgraph_type: str) -> str:
+        self.counter += 1
+        node = f'_:n{self.counter}'
+        self.pool.setdefault(dgraph_type, []).append(node)
+        self.counts[dgraph_type] = self.counts.get(dgraph_type, 0) + 1
+        return node
+
+    def words(self, n: int = 3) -> str:
+        return ' '.join(self.random.choice(WORDS) for _ in range(n)).title()
+
+    def person_name(self) -> str:
+        return f'{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}'
+
+    def date(self) -> datetime.datetime:
+        days = (datetime.datetime(2024, 1, 1) - self.start).days
+        return self.start + datetime.timedelta(days=self.random.randrange(days),
+                                               seconds=self.random.randrange(86400))
+
+    def targets(self, constraint: t.Union[list, None], n: int = 1) -> list:
+        candidates = []
+        for dgraph_type in (constraint or ['Entry']):
+            if dgraph_type == 'Entry':
+                for entry_type in ENTRY_WEIGHTS:
+                    candidates.append(entry_type)
+            elif dgraph_type in self.pool:
+                candidates.append(dgraph_type)
+        candidates = [c for c in candidates if c in self.pool]
+        if len(candidates) == 0:
+            return []
+        result = []
+        for _ in range(n):
+            pool = self.pool[self.random.choice(candidates)]
+            result.append(pool[self.random.randrange(len(pool))])
+        return list(dict.fromkeys(result))
+
+    def facet_value(self, facet: Facet, index: int = 0):
+        if facet.key == 'sequence':
+            return index
+        if facet.choices:
+            choice = self.random.choice(facet.choices)
+            return choice[0] if isinstance(choice, tuple) else choice
+        if facet.type is datetime.datetime:
+            return self.date().isoformat()
+        if facet.type is int:
+            return self.random.randint(100, 1_000_000)
+        if facet.type is bool:
+            return self.random.random() < 0.5
+        return self.words(1).lower()
+
+    def scalar_value(self, name: str, predicate):
+        predicate_type = predicate.dgraph_predicate_type
+        is_list = predicate_type.startswith('[')
+        n = self.random.randint(1, 3) if is_list else 1
+
+        if hasattr(predicate, 'values') and len(predicate.values) > 0:
+            values = self.random.sample(predicate.values, min(n, len(predicate.values)))
+            if 'int' in predicate_type:
+                values = [int(v) for v in values]
+        elif 'datetime' in predicate_type:
+            values = sorted(self.date().isoformat() for _ in range(n))
+        elif 'bool' in predicate_type:
+            values = [self.random.random() < 0.5]
+        elif 'int' in predicate_type:
+            values = [self.random.randint(0, 1_000_000) for _ in range(n)]
+        elif 'geo' in predicate_type:
+            values = [{'type': 'Point',
+                       'coordinates': [round(self.random.uniform(-10, 30), 4),
+                                       round(self.random.uniform(35, 65), 4)]}]
+        elif name in ('url', 'website', 'github', 'cran', 'pypi'):
+            values = [f'https://example.org/{self.words(2).lower().replace(" ", "-")}']
+        elif name == 'description':
+            values = [self.words(12).capitalize()]
+        else:
+            values = [self.words(2) for _ in range(n)]
+
+        if is_list:
+            return values
+        return values[0]
+
+    """ Nodes """
+
+    def predicates(self, dgraph_type: str) -> dict:
+        # Schema.get_predicates() returns deep copies, only do that once per type
+        if dgraph_type not in self._predicates:
+            self._predicates[dgraph_type] = Schema.get_predicates(dgraph_type)
+        return self._predicates[dgraph_type]
+
+    def node(self, dgraph_type: str, required_only: bool = False, **kwargs) -> dict:
+        uid = self.blank_node(dgraph_type)
+        node = {'uid': uid,
+                'dgraph.type': Schema.resolve_inheritance(dgraph_type)}
+        node.update(kwargs)
+        for name, predicate in self.predicates(dgraph_type).items():
+            if name in SKIP_PREDICATES or name in node:
+                continue
+            if isinstance(predicate, (Password, ReverseRelationship)):
+                continue
+            if not predicate.required and (required_only or self.random.random() > self.density):
+                continue
+            facets = predicate.facets or {}
+            if 'uid' in predicate.dgraph_predicate_type:
+                constraint = getattr(predicate, 'relationship_constraint', None)
+                is_list = predicate.dgraph_predicate_type.startswith('[')
+                targets = self.targets(constraint, n=self.random.randint(1, 4) if is_list else 1)
+                if len(targets) == 0:
+                    continue
+                edges = []
+                for i, target in enumerate(targets):
+                    edge = {'uid': target}
+                    if isinstance(predicate, OrderedListRelationship):
+                        edge[f'{name}|sequence'] = i
+                    for facet in facets.values():
+                        edge[f'{name}|{facet.key}'] = self.facet_value(facet, index=i)
+                    edges.append(edge)
+                node[name] = edges if is_list else edges[0]
+            else:
+                value = self.scalar_value(name, predicate)
+                node[name] = value
+                for facet in facets.values():
+                    if isinstance(value, list):
+                        node[f'{name}|{facet.key}'] = {str(i): self.facet_value(facet, index=i)
+                                                       for i in range(len(value))}
+                    else:
+                        node[f'{name}|{facet.key}'] = self.facet_value(facet)
+        return node
+
+    def users(self) -> t.Iterator[dict]:
+        for user in USERS:
+            yield self.node('User', required_only=True,
+                            email=user['email'],
+                            display_name=user['email'].split('@')[0],
+                            _pw=PASSWORD,
+                            role=user['role'],
+                            _account_status='active',
+                            _date_joined=self.start.isoformat())
+
+    def vocabulary(self) -> t.Iterator[dict]:
+        for dgraph_type, n in VOCABULARY.items():
+            for i in range(n):
+                kwargs = {'_unique_name': f'{dgraph_type.lower()}_{i}',
+                          'entry_review_status': 'accepted',
+                          '_date_created': self.start.isoformat()}
+                if dgraph_type == 'Channel':
+                    kwargs['name'] = CHANNELS[i]
+                    kwargs['_unique_name'] = CHANNELS[i]
+                elif dgraph_type in ('Country', 'Language'):
+                    kwargs['name'] = self.words(1) + 'ian' + str(i)
+                    kwargs['opted_scope'] = True
+                yield self.node(dgraph_type, required_only=True, **kwargs)
+
+    def entry(self, dgraph_type: str, i: int) -> dict:
+        created = self.date()
+        status = 'pending' if self.random.random() < self.pending else 'accepted'
+        users = self.pool['User']
+        kwargs = {'_unique_name': f'{dgraph_type.lower()}_{i}',
+                  'entry_review_status': status,
+                  '_date_created': created.isoformat(),
+                  '_added_by': {'uid': self.random.choice(users),
+                                '_added_by|ip': '127.0.0.1',
+                                '_added_by|timestamp': created.isoformat()}}
+        if status == 'accepted':
+            kwargs['_reviewed_by'] = {'uid': users[0],
+                                      '_reviewed_by|ip': '127.0.0.1',
+                                      '_reviewed_by|timestamp': created.isoformat()}
+        if dgraph_type in ('Person', 'Author'):
+            kwargs['name'] = self.person_name()
+        elif dgraph_type == 'NewsSource':
+            kwargs['name'] = self.words(2)
+            kwargs['channel'] = {'uid': self.random.choice(self.pool['Channel'])}
+        else:
+            kwargs['name'] = self.words(3)
+        return self.node(dgraph_type, **kwargs)
+
+    def entries(self) -> t.Iterator[dict]:
+        for dgraph_type, weight in ENTRY_WEIGHTS.items():
+            for i in range(max(1, round(self.n_entries * weight))):
+                yield self.entry(dgraph_type, i)
+
+    def nodes(self) -> t.Iterator[dict]:
+        yield from self.users()
+        yield from self.vocabulary()
+        yield from self.entries()
+
+    def manifest(self) -> dict:
+        return {'seed': self.seed,
+                'entries': self.n_entries,
+                'density': self.density,
+                'pending': self.pending,
+                'nodes': self.counter,
+                'types': self.counts,
+                'users': [u['email'] for u in USERS],
+                'password': PASSWORD}
+
+
+""" Output """
+
+def write_chunks(nodes: t.Iterable[dict], out: Path,
+                 chunk_size: int = 10_000, compress: bool = False,
+                 format: str = 'json') -> t.List[Path]:
+    """ write nodes into JSON arrays (or N-Quad files) of `chunk_size` """
+    out.mkdir(parents=True, exist_ok=True)
+    files = []
+    chunk = []
+
+    def flush():
+        suffix = '.' + format + ('.gz' if compress else '')
+        path = out / f'chunk-{len(files):05d}{suffix}'
+        opener = gzip.open if compress else open
+        with opener(path, 'wt', encoding='utf-8') as f:
+            if format == 'rdf':
+                writer = NQuadWriter(out=f, separator='\n')
+                writer.write_json(chunk)
+                f.write('\n')
+            else:
+                json.dump(chunk, f, ensure_ascii=False)
+        files.append(path)
+
+    for node in nodes:
+        chunk.append(node)
+        if len(chunk) >= chunk_size:
+            flush()
+            chunk = []
+    if len(chunk) > 0:
+        flush()
+    return files
+
+
+def read_chunk(path: Path) -> list:
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _replace_blank_nodes(obj, uids: dict):
+    """ replace references to blank nodes of previous chunks with their uids """
+    if isinstance(obj, list):
+        return [_replace_blank_nodes(o, uids) for o in obj]
+    if isinstance(obj, dict):
+        uid = obj.get('uid', '')
+        if uid.startswith('_:') and uid[2:] in uids:
+            obj['uid'] = uids[uid[2:]]
+        return {k: _replace_blank_nodes(v, uids) for k, v in obj.items()}
+    return obj
+
+
+def load(files: t.List[Path], endpoint: str = 'localhost:9080',
+         schema: str = None) -> dict:
+    """
+        Load chunks into DGraph with pydgraph.
+        Blank nodes are only valid within a transaction, so references
+        to nodes from earlier chunks are replaced with the assigned uids.
+        (`dgraph live` does this for us, and is faster for large scales)
+    """
+    import pydgraph
+    client_stub = pydgraph.DgraphClientStub(endpoint)
+    client = pydgraph.DgraphClient(client_stub)
+    if schema:
+        client.alter(pydgraph.Operation(schema=schema))
+    uids = {}
+    try:
+        for path in files:
+            chunk = _replace_blank_nodes(read_chunk(path), uids)
+            # N-Quads are parsed faster by DGraph than JSON
+            writer = NQuadWriter()
+            writer.write_json(chunk)
+            txn = client.txn()
+            try:
+                response = txn.mutate(set_nquads=writer.getvalue())
+                txn.commit()
+            finally:
+                txn.discard()
+            uids.update(response.uids)
+            print(f'Loaded {path.name}: {len(chunk)} nodes')
+    finally:
+        client_stub.close()
+    return uids
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic benchmark data')
+    parser.add_argument('--scale', default='10k',
+                        help='number of entries: 10k, 100k, 1m or any integer')
+    parser.add_argument('--out', default='data/benchmark', type=Path)
+    parser.add_argument('--seed', default=42, type=int)
+    parser.add_argument('--density', default=0.6, type=float,
+                        help='probability that an optional predicate is filled')
+    parser.add_argument('--pending', default=0.05, type=float,
+                        help='share of entries that wait for review')
+    parser.add_argument('--chunk-size', default=10_000, type=int)
+    parser.add_argument('--compress', action='store_true')
+    parser.add_argument('--format', default='json', choices=['json', 'rdf'],
+                        help='output format of the chunks (rdf only works with `dgraph live`)')
+    parser.add_argument('--load', action='store_true', help='load into DGraph with pydgraph')
+    parser.add_argument('--set-schema', action='store_true', help='alter DGraph schema before loading')
+    parser.add_argument('--endpoint', default='localhost:9080')
+    args = parser.parse_args()
+    if args.load and args.format != 'json':
+        parser.error('--load requires --format json')
+
+    n_entries = SCALES.get(args.scale.lower()) or int(args.scale)
+    generator = Generator(n_entries, seed=args.seed,
+                          density=args.density, pending=args.pending)
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    schema = Schema.generate_dgraph_schema()
+    with open(args.out / 'schema.dql', 'w') as f:
+        f.write(schema)
+
+    files = write_chunks(generator.nodes(), args.out,
+                         chunk_size=args.chunk_size, compress=args.compress,
+                         format=args.format)
+
+    with open(args.out / 'manifest.json', 'w') as f:
+        json.dump(generator.manifest(), f, indent=2)
+
+    print(f'Generated {generator.counter} nodes in {len(files)} chunks: {args.out}')
+
+    if args.load:
+        load(files, endpoint=args.endpoint,
+             schema=schema if args.set_schema else None)
+
+
+if __name__ == '__main__':
+    main()
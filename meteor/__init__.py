@@ -21,12 +21,16 @@ from flask_mail import Mail
 
 # Markdown Rendering
 from meteor.misc.markdown import Markdown
-from markdown.extensions.toc import TocExtension
 
 # Custom Dgraph Extension
-from meteor.flaskdgraph import DGraph
+from meteor.flaskdgraph import DGraph, QueryPlanner
 
 dgraph = DGraph()
+# picks root functions for user-built queries
+query_planner = QueryPlanner(dgraph)
+
+# Shared HTTP layer for external APIs
+from meteor.external.http_client import http_client
 
 class AnonymousUser(AnonymousUserMixin):
     _role = 0
@@ -120,14 +124,22 @@ def create_app(config_class=Config, config_json=None):
     jwt.init_app(app)
 
     dgraph.init_app(app)
+    http_client.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
 
+    from meteor.misc.mailqueue import mail_queue
+    mail_queue.init_app(app)
+
     # csrf = CSRFProtect(app)
 
     from meteor.api.routes import api
     app.register_blueprint(api, url_prefix='/api')
 
-    Markdown(app, extensions=[TocExtension(baselevel=3, anchorlink=True), 'fenced_code'])
+    from meteor.misc.compression import compressor
+    compressor.init_app(app)
+
+    Markdown(app, extensions=['toc', 'fenced_code'],
+             extension_configs={'toc': {'baselevel': 3, 'anchorlink': True}})
 
     return app
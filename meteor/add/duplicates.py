@@ -0,0 +1,191 @@
+"""
+    Staged duplicate detection for new entries
+
+    Runs on every keystroke of the add form, so the expensive parts
+    only run when the cheap ones did not find anything:
+
+    1. Exact identifiers (DOI, arXiv, CRAN, PyPI, GitHub), terms
+        and name prefixes. All of them are answered by indexes.
+    2. Fuzzy matching of the name, only if stage 1 found nothing.
+        Uses an in-memory trigram index per DGraph type that is scored
+        with `thefuzz`, instead of `match(name, $query, 3)` which
+        computes the Levenshtein distance for the whole name index.
+"""
+
+import re
+import array
+import threading
+import itertools
+import collections
+import typing as t
+
+from flask import current_app
+from thefuzz import fuzz
+
+from meteor import dgraph
+from meteor.flaskdgraph.utils import strip_query
+from meteor.misc.indexes import LazyIndex
+
+
+IDENTIFIERS = ['doi', 'arxiv', 'cran', 'pypi', 'github']
+
+# compact representation of potential duplicates
+PROJECTION = '''uid dgraph.type name _unique_name alternate_names entry_review_status
+                doi arxiv cran pypi github title
+                channel { name } country { name }'''
+
+
+def normalize(name: str) -> str:
+    name = name.replace('https://', '').replace('http://', '').replace('www.', '')
+    return ' '.join(strip_query(name).lower().split())
+
+
+def _escape_regexp(query: str) -> str:
+    return re.sub(r'([.^$*+?()\[\]{}|\\/-])', r'\\\1', query)
+
+
+def trigrams(text: str) -> t.Set[str]:
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyIndex:
+
+    """
+        Trigram index over names (and alternate names) of one DGraph type.
+        Candidates that share the most trigrams with the query are
+        scored with `fuzz.ratio`.
+    """
+
+    def __init__(self, entries: t.Iterable[dict] = None) -> None:
+        self.uids = []
+        self.names = []
+        self.postings = collections.defaultdict(lambda: array.array('I'))
+        self.indexed = set()
+        self._lock = threading.Lock()
+        for entry in entries or []:
+            self._add(entry['uid'], entry.get('name'), entry.get('alternate_names'))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self.indexed
+
+    def _add(self, uid: str, name: t.Any = None, alternate_names: t.Iterable = None) -> None:
+        self.indexed.add(uid)
+        names = [name] if name else []
+        names += list(alternate_names or [])
+        for name in names:
+            name = normalize(str(name))
+            if not name:
+                continue
+            i = len(self.names)
+            self.uids.append(uid)
+            self.names.append(name)
+            for gram in trigrams(name):
+                self.postings[gram].append(i)
+
+    def add(self, uid: str, name: t.Any = None, alternate_names: t.Iterable = None) -> None:
+        with self._lock:
+            self._add(uid, name, alternate_names)
+
+    def search(self, query: str, limit: int = 10, threshold: int = 80,
+               candidates: int = 200) -> t.List[t.Tuple[str, int]]:
+        """ returns list of `(uid, score)`, best matches first """
+        query = normalize(query)
+        if not query:
+            return []
+        with self._lock:
+            postings = [self.postings[gram] for gram in trigrams(query) if gram in self.postings]
+            counts = collections.Counter(itertools.chain.from_iterable(postings))
+            scores = {}
+            for i, _ in counts.most_common(candidates):
+                score = fuzz.ratio(query, self.names[i])
+                if score >= threshold and score > scores.get(self.uids[i], -1):
+                    scores[self.uids[i]] = score
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+class DuplicateIndex(LazyIndex):
+
+    """ Lazily built `FuzzyIndex` per DGraph type, rebuilt after `DUPLICATE_INDEX_TTL` seconds """
+
+    ttl_setting = 'DUPLICATE_INDEX_TTL'
+
+    def __init__(self, ttl: int = 600) -> None:
+        super().__init__(ttl=ttl)
+
+    def _build(self, dgraph_type: str) -> FuzzyIndex:
+        query_string = f'''{{ q(func: type("{dgraph_type}")) {{ uid name alternate_names }} }}'''
+        data = dgraph.query(query_string)
+        return FuzzyIndex(data['q'])
+
+    def update(self, uid: str) -> None:
+        """ 
+            add new entries to existing indexes. Changed names are 
+            picked up with the next rebuild
+        """
+        indexes = [(dgraph_type, index) for dgraph_type, index in self.items() if uid not in index]
+        if len(indexes) == 0:
+            return
+        query_string = '''query duplicate_names($id: string) {
+            q(func: uid($id)) @filter(has(dgraph.type)) { dgraph.type name alternate_names }
+        }'''
+        try:
+            data = dgraph.query(query_string, variables={'$id': uid})
+        except Exception as e:
+            current_app.logger.warning(f'Could not update duplicate index with <{uid}>: {e}')
+            return
+        for entry in data['q']:
+            for dgraph_type, index in indexes:
+                if dgraph_type in entry.get('dgraph.type', []):
+                    index.add(uid, entry.get('name'), entry.get('alternate_names'))
+
+
+duplicate_index = DuplicateIndex()
+
+
+def _quick_check(name: str, dgraph_type: str, limit: int) -> t.List[dict]:
+    query = strip_query(name.replace('https://', '').replace('http://', '').replace('www.', '')).strip()
+    identifier = name.strip()
+    type_filter = f'@filter(type("{dgraph_type}"))'
+
+    # identifiers are unique across types
+    blocks = [f'v_{predicate} as {predicate}(func: eq({predicate}, $identifier))'
+              for predicate in IDENTIFIERS]
+    if query:
+        blocks += [f'v_terms as terms(func: allofterms(name, $query)) {type_filter}',
+                   f'v_alternate as alternate(func: allofterms(alternate_names, $query)) {type_filter}',
+                   f'v_title as title(func: allofterms(title, $query)) {type_filter}']
+    # trigram index requires at least 3 characters
+    if len(query) >= 3:
+        blocks.append(f'v_prefix as prefix(func: regexp(name, /^{_escape_regexp(query)}/i)) {type_filter}')
+
+    variables = [block.split(' ')[0] for block in blocks]
+    query_string = ('query duplicate_check($query: string, $identifier: string) { '
+                    + ' '.join(blocks)
+                    + f' check(func: uid({", ".join(variables)}), first: {limit}) {{ {PROJECTION} }} }}')
+    result = dgraph.query(query_string, variables={'$query': query, '$identifier': identifier})
+    return result['check']
+
+
+def _fetch(uids: t.List[str]) -> t.List[dict]:
+    if len(uids) == 0:
+        return []
+    query_string = f'{{ check(func: uid({", ".join(uids)})) {{ {PROJECTION} }} }}'
+    result = dgraph.query(query_string)
+    # keep order of scores
+    entries = {entry['uid']: entry for entry in result['check']}
+    return [entries[uid] for uid in uids if uid in entries]
+
+
+def find_duplicates(name: str, dgraph_type: str, limit: int = 20) -> t.List[dict]:
+    """ Potential duplicates of a new entry with `name` (or identifier) """
+    result = _quick_check(name, dgraph_type, limit)
+    if len(result) > 0 or len(normalize(name)) < 3:
+        return result
+
+    threshold = current_app.config.get('DUPLICATE_FUZZY_THRESHOLD', 80)
+    matches = duplicate_index.get(dgraph_type).search(name, limit=limit, threshold=threshold)
+    return _fetch([uid for uid, _ in matches])
@@ -13,11 +13,15 @@ import requests
 from requests.models import PreparedRequest
 import requests.exceptions
 from dateutil import parser as dateparser
-import feedparser
-from bs4 import BeautifulSoup as bs4
-import instaloader
-import tweepy
-from telethon.sync import TelegramClient
+
+# clients for external services are slow to import,
+# load them when they are needed for the first time
+from meteor.misc.lazy import LazyImport
+feedparser = LazyImport('feedparser')
+bs4 = LazyImport('bs4', 'BeautifulSoup')
+instaloader = LazyImport('instaloader')
+tweepy = LazyImport('tweepy')
+TelegramClient = LazyImport('telethon.sync', 'TelegramClient')
 
 # flask
 from flask import current_app
@@ -25,6 +29,7 @@ from dateutil.parser import isoparse
 
 from meteor import dgraph
 from meteor.errors import InventoryValidationError
+from meteor.external.http_client import http_client
 
 def geocode(address: str) -> dict:
     payload = {'q': address,
@@ -34,7 +39,7 @@ def geocode(address: str) -> dict:
                'namedetails': 1,
                'extratags': 1}
     api = "https://nominatim.openstreetmap.org/search"
-    r = requests.get(api, params=payload)
+    r = http_client.get(api, params=payload)
     if r.status_code != 200:
         return False
     elif len(r.json()) == 0:
@@ -46,7 +51,7 @@ def geocode(address: str) -> dict:
 def reverse_geocode(lat, lon) -> dict:
     api = "https://nominatim.openstreetmap.org/reverse"
     payload = {'lat': lat, 'lon': lon, 'format': 'json'}
-    r = requests.get(api, params=payload)
+    r = http_client.get(api, params=payload)
     if r.status_code != 200:
         return False
     elif 'display_name' not in r.json().keys():
@@ -404,7 +409,7 @@ def lookup_wikidata_id(query):
     result = {}
 
     try:
-        r = requests.get(api, params=params)
+        r = http_client.get(api, params=params)
         get_id = r.json()
         wikidataid = get_id['search'][0]['id']
         return wikidataid
@@ -419,7 +424,7 @@ def fetch_wikidata(wikidataid, query=None):
     try:
         params = {'action': 'wbgetentities', 'languages': 'en',
                   'ids': wikidataid, 'format': 'json'}
-        r = requests.get(api, params=params)
+        r = http_client.get(api, params=params)
         wikidata = r.json()
     except:
         return result
@@ -469,7 +474,7 @@ def fetch_wikidata(wikidataid, query=None):
         headquarters = wikidata['entities'][wikidataid]['claims']['P159'][0]['mainsnak']['datavalue']['value']['id']
         params = {'action': 'wbgetentities', 'languages': 'en',
                   'ids': headquarters, 'format': 'json', 'props': 'labels'}
-        r = requests.get(api, params=params)
+        r = http_client.get(api, params=params)
         wikidata = r.json()
         address = wikidata['entities'][headquarters]['labels']['en']['value']
         result['address'] = address
@@ -680,7 +685,7 @@ def cran(pkg) -> Union[dict, bool]:
 
     api = 'https://crandb.r-pkg.org/'
 
-    r = requests.get(api + pkg)
+    r = http_client.get(api + pkg)
 
     if r.status_code != 200:
         return False
@@ -752,7 +757,7 @@ def cran(pkg) -> Union[dict, bool]:
 
 def openalex_getauthorname(author_id: str) -> dict:
     api = "https://api.openalex.org/people/"
-    r = requests.get(api + author_id, params={'mailto': "info@opted.eu"})
+    r = http_client.get(api + author_id, params={'mailto': "info@opted.eu"})
     j = r.json()
     result = {'openalex': author_id}
     if 'display_name' in j:
@@ -6,10 +6,12 @@ from meteor import dgraph
 from meteor.flaskdgraph.schema import Schema
 from meteor.add.forms import NewEntry, AutoFill
 from meteor.add.dgraph import check_draft, get_draft, get_existing
+from meteor.add.duplicates import find_duplicates
+from meteor.misc.indexes import entry_changed
 from meteor.main.sanitizer import Sanitizer
 from meteor.users.utils import requires_access_level
 from meteor.users.dgraph import UserLogin
-from meteor.flaskdgraph.utils import strip_query, validate_uid
+from meteor.flaskdgraph.utils import validate_uid
 from meteor.misc.utils import IMD2dict
 
 add = Blueprint('add', __name__)
@@ -20,33 +22,9 @@ add = Blueprint('add', __name__)
 def new_entry():
     form = NewEntry()
     if form.validate_on_submit():
-        query = form.name.data.replace('https://', '').replace('http://', '').replace('www.', '')
-        query = strip_query(query)
-        identifier = form.name.data.strip()
-        query_string = f'''
-                query database_check($query: string, $identifier: string)
-                {{
-                    field1 as a(func: regexp(name, /$query/i)) @filter(type("{form.entity.data}"))
-                    field2 as b(func: allofterms(name, $query)) @filter(type("{form.entity.data}"))
-                    field3 as c(func: allofterms(alternate_names, $query)) @filter(type("{form.entity.data}"))
-                    field4 as d(func: match(name, $query, 3)) @filter(type("{form.entity.data}"))
-                    field5 as e(func: allofterms(title, $query)) @filter(type("{form.entity.data}"))
-                    doi as f(func: eq(doi, $identifier))
-                    arxiv as g(func: eq(arxiv, $identifier))
-                    cran as h(func: eq(cran, $identifier))
-                    pypi as i(func: eq(pypi, $identifier))
-                    github as j(func: eq(github, $identifier))
-
-                    check(func: uid(field1, field2, field3, field4, field5, doi, arxiv, cran, pypi, github)) {{
-                        uid
-                        expand(_all_) {{ name }}
-                        }}
-                }}
-        '''
-        result = dgraph.query(query_string, variables={
-                              '$query': query, '$identifier': identifier})
-        if len(result['check']) > 0:
-            return render_template('add/database_check.html', query=form.name.data, result=result['check'], entity=form.entity.data)
+        result = find_duplicates(form.name.data, form.entity.data)
+        if len(result) > 0:
+            return render_template('add/database_check.html', query=form.name.data, result=result, entity=form.entity.data)
         else:
             if form.entity.data == 'NewsSource':
                 return redirect(url_for('add.new_source', entry_name=form.name.data))
@@ -165,6 +143,7 @@ def new(dgraph_type=None, draft=None, populate_form: dict = None):
             else:
                 newuids = dict(result.uids)
                 uid = newuids[str(sanitizer.entry_uid).replace('_:', '')]
+            entry_changed(uid)
             return redirect(url_for('view.view_uid', uid=uid))
         except Exception as e:
             if current_app.debug:
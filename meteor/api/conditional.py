@@ -0,0 +1,74 @@
+"""
+    Conditional requests
+
+    Validators for `API.route(..., validator=...)`. A validator
+    gets the path parameters of a request and returns an ETag and
+    (optionally) the time of the last modification, without building
+    the response body. If the client already has this version
+    (`If-None-Match` / `If-Modified-Since`), the route answers with
+    `304 Not Modified` and the route function is not called at all.
+
+    Validators return `None` if the response must not be cached
+    (e.g., entries that are not public). Then the route runs as usual
+    and the response is marked as `private`.
+"""
+
+import json
+import hashlib
+import datetime
+import functools
+import typing as t
+
+from flask import current_app
+
+from meteor import dgraph
+from meteor.flaskdgraph import Schema
+from meteor.flaskdgraph.utils import validate_uid, as_datetime
+
+
+class Validator(t.NamedTuple):
+    etag: str
+    last_modified: t.Optional[datetime.datetime] = None
+
+
+def _entry_validator(root: str, variables: dict) -> t.Optional[Validator]:
+    query_string = f'''query validator($value: string) {{
+        q(func: {root}) @filter(has(dgraph.type)) {{
+            uid entry_review_status _date_created _date_modified
+        }}
+    }}'''
+    data = dgraph.query(query_string, variables=variables)
+    if len(data['q']) == 0:
+        return None
+    entry = data['q'][0]
+    # only public entries are the same for every user
+    if entry.get('entry_review_status', 'accepted') != 'accepted':
+        return None
+    last_modified = as_datetime(entry.get('_date_modified') or entry.get('_date_created'))
+    version = last_modified.isoformat() if last_modified else ''
+    etag = hashlib.sha1(f"{entry['uid']}:{version}:{current_app.config['APP_VERSION']}".encode('utf-8')).hexdigest()
+    return Validator(etag, last_modified)
+
+
+def entry_by_uid(uid: str, **kwargs) -> t.Optional[Validator]:
+    uid = validate_uid(uid)
+    if not uid:
+        return None
+    return _entry_validator('uid($value)', {'$value': uid})
+
+
+def entry_by_unique_name(unique_name: str, **kwargs) -> t.Optional[Validator]:
+    return _entry_validator('eq(_unique_name, $value)', {'$value': unique_name})
+
+
+@functools.lru_cache(maxsize=1)
+def schema_hash(app_version: str) -> str:
+    """ hash of all types and predicates, only changes with a deploy """
+    schema = {dgraph_type: sorted(Schema.get_predicates(dgraph_type).keys())
+              for dgraph_type in Schema.get_types(private=True)}
+    schema['__version__'] = app_version
+    return hashlib.sha1(json.dumps(schema, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def schema(**kwargs) -> Validator:
+    return Validator(schema_hash(current_app.config['APP_VERSION']))
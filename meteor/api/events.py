@@ -0,0 +1,144 @@
+"""
+    Change feed
+
+    The API routes publish events (new entries, edits, reviews,
+    comments, deleted drafts and notifications) to an in-process
+    broker. Clients subscribe with long-polling (`/events`) or
+    Server-Sent Events (`/events/stream`) instead of re-polling
+    the views.
+
+    Every event gets a sequence number. Clients resume after a
+    reconnect by sending the last sequence number they received. Only
+    the latest `size` events are kept. If a client falls further behind,
+    the response says `reset` and the client has to reload its views.
+    The `stream` id changes when the process restarts, which also
+    invalidates sequence numbers.
+
+    Events only contain uids, DGraph types and the kind of change,
+    never the content of an entry. Events that are not public (e.g.,
+    new pending entries) are only delivered to reviewers and to the
+    user who caused them. Events for a single user (`user`) are only
+    delivered to that user.
+"""
+
+import json
+import time
+import secrets
+import datetime
+import itertools
+import threading
+import collections
+import typing as t
+
+from meteor import dgraph
+from meteor.users.constants import USER_ROLES
+
+
+EVENT_KINDS = ['add', 'edit', 'review', 'comment', 'delete', 'notification']
+
+
+class ChangeFeed:
+
+    """ Ring buffer of events with sequence numbers """
+
+    def __init__(self, size: int = 10000) -> None:
+        self.stream = secrets.token_hex(4)
+        self._events = collections.deque(maxlen=size)
+        self._counter = itertools.count(1)
+        self._condition = threading.Condition()
+        self.seq = 0
+
+    def publish(self, kind: str, uid: str = None, dgraph_type: str = None,
+                public: bool = True, actor: str = None, user: str = None,
+                **data) -> dict:
+        """
+            `public`: if `False`, only reviewers and the `actor` receive the event
+            `user`: only this user receives the event
+        """
+        assert kind in EVENT_KINDS, f'Unknown event kind: {kind}'
+        event = {'event': kind,
+                 'uid': str(uid) if uid else None,
+                 'dgraph_type': dgraph_type,
+                 'time': datetime.datetime.now().isoformat(),
+                 **data}
+        with self._condition:
+            event['seq'] = next(self._counter)
+            self._events.append((event, public, actor, user))
+            self.seq = event['seq']
+            self._condition.notify_all()
+        return event
+
+    def since(self, seq: int, subscription: 'Subscription' = None) -> t.Tuple[t.List[dict], bool]:
+        """ events after `seq`; second value is `True` if some were already dropped """
+        with self._condition:
+            events = list(self._events)
+        if len(events) == 0:
+            return [], False
+        reset = seq < events[0][0]['seq'] - 1
+        result = [event for event, public, actor, user in events
+                  if event['seq'] > seq and
+                  (subscription is None or subscription.matches(event, public, actor, user))]
+        return result, reset
+
+    def wait(self, seq: int, subscription: 'Subscription' = None,
+             timeout: float = 25) -> t.Tuple[t.List[dict], bool]:
+        """ like `since`, but blocks up to `timeout` seconds until there are events """
+        deadline = time.monotonic() + timeout
+        while True:
+            events, reset = self.since(seq, subscription)
+            if events or reset:
+                return events, reset
+            with self._condition:
+                # skip events that do not match
+                seq = max(seq, self.seq)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], False
+                self._condition.wait_for(lambda: self.seq > seq, remaining)
+
+
+class Subscription:
+
+    """
+        Which events a user receives.
+
+        `dgraph_types` and `uids` restrict the events to these types
+        or entries. With `following` only entries and types the user
+        follows (`follows_entities`, `follows_types`) are included.
+    """
+
+    def __init__(self, user=None, dgraph_types: t.Iterable[str] = None,
+                 uids: t.Iterable[str] = None, following: bool = False) -> None:
+        self.user = user.uid if user is not None and user.is_authenticated else None
+        self.reviewer = self.user is not None and user._role >= USER_ROLES.Reviewer
+        self.dgraph_types = set(dgraph_types) if dgraph_types else None
+        self.uids = set(uids) if uids else None
+        if following and self.user:
+            self._load_follows()
+
+    def _load_follows(self) -> None:
+        query_string = '''query follows($user: string) {
+            q(func: uid($user)) { follows_types follows_entities { uid } }
+        }'''
+        data = dgraph.query(query_string, variables={'$user': self.user})
+        follows = data['q'][0] if len(data['q']) > 0 else {}
+        self.dgraph_types = (self.dgraph_types or set()) | set(follows.get('follows_types', []))
+        self.uids = (self.uids or set()) | {item['uid'] for item in follows.get('follows_entities', [])}
+
+    def matches(self, event: dict, public: bool = True, actor: str = None, user: str = None) -> bool:
+        if user is not None:
+            return user == self.user
+        if not public and not (self.reviewer or (actor and actor == self.user)):
+            return False
+        if self.dgraph_types is None and self.uids is None:
+            return True
+        return ((self.dgraph_types is not None and event.get('dgraph_type') in self.dgraph_types) or
+                (self.uids is not None and event.get('uid') in self.uids))
+
+
+def format_sse(event: dict) -> str:
+    """ Server-Sent Event, `id` is the sequence number """
+    return f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+
+change_feed = ChangeFeed()
@@ -1,39 +1,199 @@
 import typing as t
+import time
+import queue
+import threading
+import collections
+from flask import current_app
 from meteor import dgraph
 from meteor.flaskdgraph.utils import validate_uid
 from meteor.main.model import Notification, User
 from meteor.users.constants import USER_ROLES
+from meteor.api.events import change_feed
 
 from logging import getLogger
 
 logger = getLogger()
 
-def get_unread_notifications(user: User) -> t.List[dict]:
-    
-    query_string = '''query getNotifications($user : string) {
-        q(func: type("Notification"), orderasc: _notification_date) 
-            @filter(uid_in(_notify, $user) AND (eq(_read, "false"))) {
-                uid _notification_date _read _title _content _linked { uid dgraph.type _unique_name name }
-            }
-        }  
-    '''
+
+class NotificationQueue:
+
+    """
+        Small in-process queue that dispatches notifications 
+        off the request path. A single worker thread processes
+        the jobs one by one in an app context.
+
+        When the app is in TESTING mode (or `NOTIFICATIONS_SYNC` is set)
+        the jobs run immediately instead.
+    """
+
+    def __init__(self) -> None:
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, 
+                                                name='notifications',
+                                                daemon=True)
+                self._worker.start()
+
+    @staticmethod
+    def _execute(func: t.Callable, args: tuple, kwargs: dict) -> None:
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logger.exception(f'Could not dispatch notifications ({func.__name__}): {e}')
+
+    def _run(self) -> None:
+        while True:
+            app, func, args, kwargs = self._queue.get()
+            try:
+                with app.app_context():
+                    self._execute(func, args, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, func: t.Callable, *args, **kwargs) -> None:
+        app = current_app._get_current_object()
+        if app.config.get('TESTING') or app.config.get('NOTIFICATIONS_SYNC'):
+            self._execute(func, args, kwargs)
+            return
+        self._start()
+        self._queue.put((app, func, args, kwargs))
+
+    def join(self) -> None:
+        """ block until all queued notifications are dispatched """
+        self._queue.join()
+
+
+notification_queue = NotificationQueue()
+
+
+""" Inbox """
+
+NOTIFICATION_FIELDS = 'uid _notification_date _read _title _content _linked { uid dgraph.type _unique_name name }'
+
+
+def _inbox(user: User, unread: bool = False, first: int = None, offset: int = 0) -> t.List[dict]:
+    """ notifications of a user, starting from the user via the reverse `_notify` edge """
+    pagination = 'orderasc: _notification_date'
+    if first is not None:
+        pagination += f', first: {int(first)}, offset: {int(offset)}'
+    filt = ' @filter(eq(_read, "false"))' if unread else ''
+    query_string = f'''query getNotifications($user : string) {{
+        q(func: uid($user)) {{
+            notifications: ~_notify ({pagination}){filt} {{
+                {NOTIFICATION_FIELDS}
+            }}
+        }}
+    }}'''
     data = dgraph.query(query_string, variables={'$user': user.uid})
+    if len(data['q']) == 0:
+        return []
+    return data['q'][0].get('notifications', [])
 
-    return data['q']
 
+def get_unread_notifications(user: User, first: int = None, offset: int = 0) -> t.List[dict]:
+    return _inbox(user, unread=True, first=first, offset=offset)
 
-def get_all_notifications(user: User) -> t.List[dict]:
-    
-    query_string = '''query getNotifications($user : string) {
-        q(func: type("Notification"), orderasc: _notification_date) 
-            @filter(uid_in(_notify, $user)) {
-                uid _notification_date _read _title _content _linked { uid dgraph.type _unique_name name }
-            }
-        }  
-    '''
+
+def get_all_notifications(user: User, first: int = None, offset: int = 0) -> t.List[dict]:
+    return _inbox(user, first=first, offset=offset)
+
+
+def count_unread_notifications(user: User) -> int:
+    query_string = '''query countNotifications($user : string) {
+        q(func: uid($user)) {
+            unread: count(~_notify @filter(eq(_read, "false")))
+        }
+    }'''
     data = dgraph.query(query_string, variables={'$user': user.uid})
+    if len(data['q']) == 0:
+        return 0
+    return data['q'][0].get('unread', 0)
+
+
+class UnreadCounter:
+
+    """
+        Number of unread notifications per user. Counts are loaded
+        once and then maintained when notifications are dispatched or
+        dismissed. Expire after `ttl` seconds to pick up notifications
+        from other processes. Not cached in TESTING mode.
+
+        `wait` blocks until the count of a user changes, so clients
+        can long-poll instead of polling the inbox.
+    """
+
+    def __init__(self, ttl: int = 300) -> None:
+        self.ttl = ttl
+        self._counts = {}
+        # incremented whenever the count of a user changes
+        self._versions = collections.defaultdict(int)
+        self._condition = threading.Condition()
+
+    def get(self, user: User) -> int:
+        if current_app.config.get('TESTING'):
+            return count_unread_notifications(user)
+        ttl = current_app.config.get('NOTIFICATION_COUNTER_TTL', self.ttl)
+        cached = self._counts.get(user.uid)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        count = count_unread_notifications(user)
+        with self._condition:
+            self._counts[user.uid] = (time.monotonic(), count)
+        return count
+
+    def increment(self, user_uids: t.Iterable[str]) -> None:
+        with self._condition:
+            for uid in user_uids:
+                cached = self._counts.get(uid)
+                if cached is not None:
+                    self._counts[uid] = (cached[0], cached[1] + 1)
+                self._versions[uid] += 1
+            self._condition.notify_all()
+
+    def invalidate(self, user_uid: str) -> None:
+        with self._condition:
+            self._counts.pop(user_uid, None)
+            self._versions[user_uid] += 1
+            self._condition.notify_all()
 
-    return data['q']
+    def wait(self, user: User, known: int = None, timeout: float = 25) -> int:
+        """ returns the unread count as soon as it differs from `known` (or after `timeout`) """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            version = self._versions[user.uid]
+        count = self.get(user)
+        while count == known:
+            with self._condition:
+                while self._versions[user.uid] == version:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return count
+                    self._condition.wait(remaining)
+                version = self._versions[user.uid]
+            count = self.get(user)
+        return count
+
+
+unread_counter = UnreadCounter()
+
+
+def _dispatch(notifications: t.Union[dict, t.List[dict]]):
+    """ write notifications and update the unread counters of the recipients """
+    res = dgraph.mutation(notifications)
+    if isinstance(notifications, dict):
+        notifications = [notifications]
+    unread_counter.increment(notification['_notify']['uid'] for notification in notifications)
+    for notification in notifications:
+        linked = notification.get('_linked') or {}
+        change_feed.publish('notification', linked.get('uid'), 
+                            user=notification['_notify']['uid'],
+                            title=notification.get('_title'))
+    return res
 
 
 def mark_notifications_as_read(uids: t.List[str], 
@@ -50,6 +210,7 @@ def mark_notifications_as_read(uids: t.List[str],
 
     if not notifications:
         raise ValueError
+    unread_counter.invalidate(user.uid)
     return notifications    
 
 def dispatch_notification(user: User, 
@@ -66,7 +227,7 @@ def dispatch_notification(user: User,
                           _title=title,
                           _content=content,
                           _linked=linked)
-    res = dgraph.mutation(notify.as_dict())
+    res = _dispatch(notify.as_dict())
     return res.uids[notify.as_dict()['uid'].replace('_:', '')]
 
 def notify_new_type(dgraph_type: str, 
@@ -92,10 +253,62 @@ def notify_new_type(dgraph_type: str,
                                   _title=f"New {dgraph_type}",
                                   _content=message,
                                   _linked=new_uid).as_dict() for user in users]
-    res = dgraph.mutation(notifications)
+    res = _dispatch(notifications)
     logger.debug(f'Dispatched notifications: {res.uids}')
     logger.debug(res)
 
+def notify_new_entry(uid: str, 
+                     dgraph_type: str = None, 
+                     role=USER_ROLES.Contributor) -> None:
+    """
+        Notify all users about a new entry, who either
+        follow the `dgraph_type` or any entity related to the entry.
+
+        Combines `notify_new_type` and `notify_new_entity`: 
+        recipients are gathered with one query, every user
+        gets at most one notification and all notifications
+        are written in one mutation.
+    """
+    if dgraph_type is None:
+        dgraph_type = dgraph.get_dgraphtype(uid)
+
+    query_string = """query UsersFollow($uid: string, $type: string, $role: int) {
+        entry(func: uid($uid)) {
+            name entry_review_status
+            expand(_all_) { u as uid }
+        }
+        t as var(func: eq(follows_types, $type))
+        users(func: ge(role, $role)) @filter(uid(t) OR uid_in(follows_entities, uid(u))) {
+            uid
+            follows_entities @filter(uid(u)) {
+                    uid name
+                }
+            }
+        }"""
+
+    res = dgraph.query(query_string, variables={'$uid': uid, '$type': dgraph_type, '$role': str(role)})
+    entry = res['entry'][0]
+    notifications = []
+    for user in res['users']:
+        message = (f'A new entry with the name "{entry["name"]}" ({dgraph_type}) was added. ')
+        if entry['entry_review_status'] == 'pending':
+            message += 'The entry is awaiting review. '
+        if 'follows_entities' in user:
+            message += f"You receive this notification, because you follow the entities: "
+            message += ", ".join([follow['name'] for follow in user['follows_entities']])
+        else:
+            message += f"You receive this notification, because you follow the type: {dgraph_type}"
+        notify = Notification(_notify=user['uid'], 
+                              _title=f"New {entry['entry_review_status']} {dgraph_type}: <{entry['name']}>!",
+                              _content=message,
+                              _linked=uid)
+        notifications.append(notify.as_dict())
+    if len(notifications) == 0:
+        return
+    res = _dispatch(notifications)
+    logger.debug(f'Dispatched notifications: {res.uids}')
+
+
 def notify_new_entity(uid: str, role=USER_ROLES.Contributor) -> None:
     query_string = """query UsersFollow($uid: string, $role: int) {
         entry(func: uid($uid)) {
@@ -126,7 +339,7 @@ def notify_new_entity(uid: str, role=USER_ROLES.Contributor) -> None:
                               _content=message,
                               _linked=uid)
         notifications.append(notify.as_dict())
-    res = dgraph.mutation(notifications)
+    res = _dispatch(notifications)
     logger.debug(f'Dispatched notifications: {res.uids}')
     logger.debug(res)
 
@@ -162,7 +375,7 @@ def send_review_notification(uid: str, status: t.Literal['accepted', 'revise', '
                           _title=title,
                           _content=message,
                           _linked=uid)
-    res = dgraph.mutation(notify.as_dict())
+    res = _dispatch(notify.as_dict())
 
 
 def send_comment_notifications(uid: str):
@@ -190,6 +403,6 @@ def send_comment_notifications(uid: str):
                               _content=message,
                               _linked=uid)
         notifications.append(notify.as_dict())
-    res = dgraph.mutation(notifications)
+    res = _dispatch(notifications)
     logger.debug(f'Dispatched notifications: {res.uids}')
     logger.debug(res)
@@ -69,4 +69,10 @@ DGraphTypeDescription = typing.TypedDict('DGraphTypeDescription', {
 
 ReverseRelationships = typing.TypedDict('ReverseRelationships', {
     "predicate__dgraphtype": list
-})
\ No newline at end of file
+})
+ChangeFeed = typing.TypedDict('ChangeFeed', {
+    "stream": str,
+    "seq": int,
+    "reset": bool,
+    "events": list
+})
@@ -4,6 +4,10 @@
 """
 
 import typing
+import time
+import json
+import base64
+import threading
 
 from flask import current_app
 
@@ -12,42 +16,96 @@ from meteor.flaskdgraph import Schema
 from meteor.flaskdgraph import dql
 from meteor.flaskdgraph.dgraph_types import UID, dict_to_nquad, Variable, make_nquad, Scalar
 from meteor.main.model import User
+from meteor.misc.indexes import entry_changed, on_entry_changed
+from meteor.flaskdgraph.utils import as_datetime
 import datetime
 
-def get_overview(dgraph_type: str = None, 
-                 country: str = None, 
-                 user: str = None, 
-                 text_type: str = None) -> list:
+""" Review Overview """
 
+def encode_cursor(date_created: typing.Union[str, datetime.datetime], uids: typing.List[str]) -> str:
+    """ 
+        Position after the last entry of a page. Also contains all uids
+        with the same `_date_created`, so ties are not skipped or repeated.
+    """
+    cursor = json.dumps({'d': as_datetime(date_created).isoformat(), 'u': uids}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
 
-    query_vars = []
 
-    query_func = f'''{{ q(func: has(dgraph.type)) '''
+def decode_cursor(cursor: str) -> typing.Tuple[str, typing.List[str]]:
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        date_created = as_datetime(cursor['d']).isoformat()
+        return date_created, [str(uid) for uid in cursor['u']]
+    except Exception:
+        raise ValueError('Invalid cursor')
+
 
-    filt_string = '@filter( eq(entry_review_status, "pending") '
+def _overview_filters(dgraph_type: str = None, 
+                      country: str = None, 
+                      user: str = None, 
+                      text_type: str = None) -> typing.Tuple[typing.List[str], typing.List[dql.GraphQLVariable]]:
+    # entries without timestamp cannot be paginated
+    filters = ['has(_date_created)']
+    query_vars = []
 
     if dgraph_type:
-        filt_string += 'AND type($dgraphtype) '
+        filters.append('type($dgraphtype)')
         query_vars.append(dql.GraphQLVariable(dgraphtype=dgraph_type))
     
-    if country:
-        if country != 'all':
-            filt_string += f''' AND ( uid_in(country, $country) OR uid_in(countries, $country) ) '''
-            query_vars.append(dql.GraphQLVariable(country=country))
+    if country and country != 'all':
+        filters.append('( uid_in(country, $country) OR uid_in(countries, $country) )')
+        query_vars.append(dql.GraphQLVariable(country=country))
+
+    if text_type and text_type != 'any':
+        filters.append('uid_in(text_types, $texttype)')
+        query_vars.append(dql.GraphQLVariable(texttype=text_type))
+
+    if user and user != 'any':
+        filters.append('uid_in(_added_by, $user)')
+        query_vars.append(dql.GraphQLVariable(user=user))
+
+    return filters, query_vars
+
 
-    if text_type:
-        if text_type != 'any':
-            filt_string += f''' AND uid_in(text_types, $texttype) '''
-            query_vars.append(dql.GraphQLVariable(texttype=text_type))
+def _overview_query(query_func: str, filters: list, query_vars: list, query_fields: str) -> typing.Tuple[str, dict]:
+    query_head = ''
+    variables = None
+    if len(query_vars) > 0:
+        query_vars_declaration = ", ".join([f'{v.name} : {v.dtype}' for v in query_vars])
+        query_head = f'query getOverview( {query_vars_declaration} )'
+        variables = {var.name: var.value for var in query_vars}
 
-    if user:
-        if user != 'any':
-            filt_string += f''' AND uid_in(_added_by, $user) '''
-            query_vars.append(dql.GraphQLVariable(user=user))
+    filt_string = ''
+    if len(filters) > 0:
+        filt_string = '@filter( ' + ' AND '.join(filters) + ' )'
 
-    filt_string += ')'
+    query = f'{query_head} {{ q({query_func}) {filt_string} {{ {query_fields} }} }}'
+    return query, variables
 
-    query_fields = f''' uid name _unique_name dgraph.type entry_review_status
+
+def get_overview(dgraph_type: str = None, 
+                 country: str = None, 
+                 user: str = None, 
+                 text_type: str = None,
+                 first: int = 50,
+                 after: str = None) -> typing.Tuple[list, typing.Optional[str]]:
+    """
+        One page of pending entries, newest first.
+        Returns the entries and the cursor for the next page (`None` for the last page)
+    """
+
+    filters, query_vars = _overview_filters(dgraph_type, country=country, user=user, text_type=text_type)
+
+    # entries on the previous page with the same timestamp as the last one
+    skip = []
+    if after:
+        date_created, skip = decode_cursor(after)
+        filters.append('le(_date_created, $after)')
+        query_vars.append(dql.GraphQLVariable(after=date_created, dtype='datetime'))
+
+    query_func = f'func: eq(entry_review_status, "pending"), orderdesc: _date_created, first: {first + len(skip) + 1}'
+
+    query_fields = f''' uid name _unique_name dgraph.type entry_review_status _date_created
                         _added_by @facets(timestamp) {{ uid display_name }}
                         country {{ uid _unique_name name }} 
                         countries {{ uid _unique_name name }}
@@ -56,32 +114,81 @@ def get_overview(dgraph_type: str = None,
                         text_types {{ uid unique_name name }}
                     '''
 
-   
-    query_head = ''
-    if len(query_vars) > 0:
-        query_vars_declaration = ", ".join([f'{v.name} : {v.dtype}' for v in query_vars])
-        query_head += 'query getOverview( '
-        query_head += query_vars_declaration
-        query_head += ')'
-
-    query = f'{query_head} {query_func} {filt_string} {{ {query_fields} }} }}'
-
-    variables = None
-    if len(query_vars) > 0:
-        variables = {var.name: var.value for var in query_vars}
-
+    query, variables = _overview_query(query_func, filters, query_vars, query_fields)
     data = dgraph.query(query, variables=variables)
 
-    if len(data['q']) == 0:
-        return []
+    data = [item for item in data['q'] if item['uid'] not in skip]
+    has_next = len(data) > first
+    data = data[:first]
 
-    data = data['q']
     for item in data:
         if 'Entry' in item['dgraph.type']:
             item['dgraph.type'].remove('Entry')
         if 'Resource' in item['dgraph.type']:
             item['dgraph.type'].remove('Resource')
-    return data
+
+    cursor = None
+    if has_next:
+        last = as_datetime(data[-1]['_date_created'])
+        ties = [item['uid'] for item in data if as_datetime(item['_date_created']) == last]
+        if after and date_created == last.isoformat():
+            ties += skip
+        cursor = encode_cursor(last, ties)
+
+    return data, cursor
+
+
+def count_overview(dgraph_type: str = None, 
+                   country: str = None, 
+                   user: str = None, 
+                   text_type: str = None) -> int:
+    """ Number of pending entries """
+    filters, query_vars = _overview_filters(dgraph_type, country=country, user=user, text_type=text_type)
+    query, variables = _overview_query('func: eq(entry_review_status, "pending")', 
+                                       filters, query_vars, 'count(uid)')
+    data = dgraph.query(query, variables=variables)
+    return data['q'][0]['count']
+
+
+class OverviewCache:
+
+    """ 
+        First pages and counts of the review overview per filter preset 
+        (combination of filters). Cleared whenever entries are added or 
+        reviewed. Disabled in `TESTING` mode. 
+    """
+
+    def __init__(self, ttl: int = 60, max_presets: int = 256) -> None:
+        self.ttl = ttl
+        self.max_presets = max_presets
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, func: typing.Callable, *args, **kwargs) -> typing.Any:
+        if current_app.config.get('TESTING'):
+            return func(*args, **kwargs)
+        ttl = current_app.config.get('REVIEW_OVERVIEW_TTL', self.ttl)
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        value = func(*args, **kwargs)
+        with self._lock:
+            if len(self._cache) >= self.max_presets:
+                self._cache.clear()
+            self._cache[key] = (time.monotonic(), value)
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+overview_cache = OverviewCache()
+
+
+@on_entry_changed
+def _invalidate_overview(uid: str) -> None:
+    overview_cache.invalidate()
 
 
 def accept_entry(uid: str, reviewer: User) -> None:
@@ -91,6 +198,7 @@ def accept_entry(uid: str, reviewer: User) -> None:
                                 "_reviewed_by|timestamp": datetime.datetime.now().isoformat()}
               }
     dgraph.mutation(accepted)
+    entry_changed(uid)
 
 
 def mark_revise(uid: str, reviewer: User) -> None:
@@ -100,6 +208,7 @@ def mark_revise(uid: str, reviewer: User) -> None:
                                 "_reviewed_by|timestamp": datetime.datetime.now().isoformat()}
               }
     dgraph.mutation(revise)
+    entry_changed(uid)
     
 from string import ascii_letters
 
@@ -141,3 +250,4 @@ def reject_entry(uid: str, reviewer: User) -> None:
 
     dgraph.upsert(query, del_nquads=del_nquads)
     dgraph.upsert(None, set_nquads=set_nquads)
+    entry_changed(uid)
@@ -32,10 +32,15 @@ import typing as t
 from functools import wraps
 import inspect
 import re
+import time
+import json
+import hmac
+import math
 import collections
 
-from flask import Blueprint, jsonify, current_app, request, abort, url_for, render_template
+from flask import Blueprint, jsonify, current_app, request, abort, url_for, render_template, g, after_this_request
 from flask.scaffold import F
+from werkzeug.exceptions import HTTPException
 
 from flask_login import login_required
 import flask_jwt_extended as jwtx
@@ -44,7 +49,8 @@ from meteor.users.dgraph import AnonymousUser
 from meteor.errors import *
 from meteor.flaskdgraph import dql
 from meteor.flaskdgraph import build_query_string
-from meteor.flaskdgraph.utils import validate_uid, recursive_restore_sequence
+from meteor import query_planner
+from meteor.flaskdgraph.utils import validate_uid, recursive_restore_sequence, extract_block, strip_dgraph_types
 from meteor.api.view import get_entry, get_preview, get_reverse_relationships, get_rejected
 from meteor.view.utils import can_view
 
@@ -56,6 +62,12 @@ from meteor.main.model import *
 from meteor.api.sanitizer import Sanitizer
 from meteor.api.comments import get_comments, post_comment, remove_comment
 from meteor.api.responses import SuccessfulAPIOperation
+from meteor.api import conditional
+from meteor.api.conditional import Validator
+from meteor.misc.metrics import metrics, COUNT_BUCKETS
+from meteor.misc.compression import precompressed
+from meteor.misc.ratelimit import rate_limiter
+from meteor.misc import get_ip
 
 #: Maps Flask/Werkzeug rooting types to Swagger ones
 PATH_TYPES = {
@@ -315,12 +327,141 @@ class API(Blueprint):
                 return self.abort(400, message=f'Wrong API call, please review your provided parameters. Full error message: {e}')
         return logic
 
+    @staticmethod
+    def instrument(rule: str, f):
+        """
+            Decorator that measures the latency of a route and
+            how many DGraph calls it makes (helps to spot N+1 queries)
+        """
+
+        @wraps(f)
+        def timed(*args, **kw):
+            g._dgraph_calls = 0
+            status = 500
+            start = time.perf_counter()
+            try:
+                rv = f(*args, **kw)
+                if isinstance(rv, tuple) and len(rv) > 1 and isinstance(rv[1], int):
+                    status = rv[1]
+                else:
+                    status = getattr(rv, 'status_code', 200)
+                return rv
+            except HTTPException as e:
+                status = e.code
+                raise
+            finally:
+                metrics.observe('api_request_duration_seconds', 
+                                time.perf_counter() - start,
+                                route=rule, method=request.method, status=status)
+                metrics.observe('api_dgraph_calls_per_request', 
+                                g.get('_dgraph_calls', 0),
+                                buckets=COUNT_BUCKETS, route=rule)
+        return timed
+
+    @staticmethod
+    def conditional(f, validator: t.Callable[..., t.Optional[Validator]], max_age: int = 60):
+        """
+            Decorator for conditional GET requests (see `meteor.api.conditional`).
+            Answers with `304 Not Modified` if the client already has the
+            current version, otherwise adds `ETag`, `Last-Modified` and
+            `Cache-Control` headers to the response.
+        """
+
+        @wraps(f)
+        def cached(*args, **kw):
+            if request.method not in ('GET', 'HEAD'):
+                return f(*args, **kw)
+            try:
+                version = validator(**kw)
+            except Exception as e:
+                current_app.logger.warning(f'Could not compute validator for <{request.path}>: {e}')
+                version = None
+            if version is None:
+                response = current_app.make_response(f(*args, **kw))
+                if response.status_code == 200:
+                    response.cache_control.private = True
+                    response.cache_control.no_cache = True
+                return response
+
+            last_modified = version.last_modified
+            if last_modified is not None:
+                last_modified = last_modified.replace(microsecond=0)
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(version.etag)
+            else:
+                not_modified = (last_modified is not None and
+                                request.if_modified_since is not None and
+                                request.if_modified_since >= last_modified)
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(f(*args, **kw))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(version.etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            return response
+        return cached
+
+    @staticmethod
+    def client_key() -> str:
+        """ identifies the client for rate limiting: user id if logged in, otherwise IP """
+        try:
+            jwtx.verify_jwt_in_request(optional=True)
+            identity = jwtx.get_jwt_identity()
+        except Exception:
+            identity = None
+        if identity:
+            return f'user:{identity}'
+        return f'ip:{get_ip()}'
+
+    def limit(self, rule: str, f, cost: t.Union[float, t.Callable[[], float]]):
+        """
+            Decorator for expensive routes (see `meteor.misc.ratelimit`).
+            `cost` is the number of tokens a request takes, or a function
+            that computes it from the request (0: not expensive).
+        """
+
+        @wraps(f)
+        def limited(*args, **kw):
+            if not rate_limiter.enabled:
+                return f(*args, **kw)
+            tokens = cost() if callable(cost) else cost
+            if tokens <= 0:
+                return f(*args, **kw)
+            bucket = rate_limiter.consume(self.client_key(), tokens)
+            if not bucket.allowed:
+                metrics.inc('api_requests_rejected_total', route=rule, reason='rate_limit')
+                response = self.abort(429, message='Too many requests, please slow down.')
+                response.headers['Retry-After'] = str(math.ceil(bucket.retry_after))
+                return response
+            if not rate_limiter.admit():
+                metrics.inc('api_requests_rejected_total', route=rule, reason='overload')
+                response = self.abort(503, message='Server is busy, please try again later.')
+                response.headers['Retry-After'] = '1'
+                return response
+            try:
+                response = current_app.make_response(f(*args, **kw))
+            finally:
+                rate_limiter.release()
+            response.headers['X-RateLimit-Remaining'] = str(int(bucket.remaining))
+            return response
+        return limited
+
     def route(self, rule: str, authentication: bool = False, **options: t.Any) -> t.Callable[[F], F]:
         """ Custom extension of Flask default routing / rule creation 
             This decorator extract function arguments and details and 
             stores it the blueprint class (the dict "routes")
             This enables serving the OpenAPI scheme
             The decorator also applies the @query_params decorator
+
+            With `validator` the route supports conditional requests
+            (see `API.conditional`), `max_age` sets the `Cache-Control` header
+
+            With `cost` the route is rate limited (see `API.limit`)
         """
 
         methods = options.get('methods', ['GET'])
@@ -331,6 +472,9 @@ class API(Blueprint):
                 jwt_kwargs[k] = v
             except:
                 continue
+        validator = options.pop('validator', None)
+        max_age = options.pop('max_age', 60)
+        cost = options.pop('cost', None)
 
         def decorator(f: F) -> F:
             """ Custom extension """
@@ -384,6 +528,17 @@ class API(Blueprint):
             # This way, every function has request arguments handled
             # as keyword arguments
             f_wrapped = self.query_params(f)
+
+            # Answer conditional requests before running the route
+            if validator is not None:
+                f_wrapped = self.conditional(f_wrapped, validator, max_age=max_age)
+
+            # Rate limit expensive routes
+            if cost is not None:
+                f_wrapped = self.limit(rule, f_wrapped, cost)
+
+            # Measure request timing
+            f_wrapped = self.instrument(rule, f_wrapped)
             
             """ Business as usual (see flask.Scaffolding) """
             endpoint = options.pop("endpoint", None)
@@ -394,6 +549,78 @@ class API(Blueprint):
 
 api = API('api', __name__)
 
+
+def passthrough(data: bytes, block: str = 'data'):
+    """ 
+        Send a raw DGraph response (`dgraph.query(..., raw=True)`) 
+        straight to the client without decoding and re-encoding it.
+        Only the array of the query `block` is returned and 
+        the "Entry" type is removed from `dgraph.type`.
+    """
+    data = strip_dgraph_types(extract_block(data, block=block))
+    return current_app.response_class(data, mimetype=current_app.json.mimetype)
+
+
+def iter_json(data: t.Union[list, dict], dumps: t.Callable[[t.Any], str] = json.dumps,
+              chunk_size: int = 65536) -> t.Iterator[str]:
+    """
+        Encode a list (or a dict of lists) incrementally and yield chunks
+        of about `chunk_size` characters. Each item is encoded
+        separately, so the whole document is never held as one string.
+    """
+    buffer = []
+    size = 0
+
+    def write(s: str):
+        nonlocal size
+        buffer.append(s)
+        size += len(s)
+
+    def items(l: list):
+        nonlocal buffer, size
+        write('[')
+        for i, item in enumerate(l):
+            if i > 0:
+                write(',')
+            write(dumps(item))
+            if size >= chunk_size:
+                yield ''.join(buffer)
+                buffer, size = [], 0
+        write(']')
+
+    if isinstance(data, dict):
+        write('{')
+        for i, (key, value) in enumerate(data.items()):
+            if i > 0:
+                write(',')
+            write(dumps(key) + ':')
+            if isinstance(value, list):
+                yield from items(value)
+            else:
+                write(dumps(value))
+        write('}')
+    else:
+        yield from items(data)
+    yield ''.join(buffer)
+
+
+def stream_jsonify(data: t.Union[list, dict]):
+    """ like `jsonify`, but the response body is encoded while it is sent """
+    # the generator runs after the request context is gone
+    return current_app.response_class(iter_json(data, dumps=current_app.json.dumps),
+                                      mimetype=current_app.json.mimetype)
+
+
+def mark_downgraded() -> None:
+    """ set `X-Query-Downgraded` if the query planner dropped expensive filters """
+    if not g.get('_query_downgraded'):
+        return
+
+    @after_this_request
+    def downgraded(response):
+        response.headers['X-Query-Downgraded'] = 'true'
+        return response
+
 """ Schema API routes """
 
 @api.route('/swagger')
@@ -401,9 +628,15 @@ def swagger():
     """ Serves the Swagger UI """
     return render_template('swagger/swagger.html')
 
-@api.route('/openapi.json')
+@api.route('/openapi.json', validator=conditional.schema, max_age=3600)
 def schema() -> dict:
     """ Serves the schema according to OpenAPI specifications """
+    # the document only changes with the schema (and the host name in `servers`)
+    key = ('openapi', conditional.schema().etag, request.host_url)
+    return precompressed.response(key, lambda: current_app.json.dumps(openapi_document()).encode('utf-8'))
+
+def openapi_document() -> dict:
+    """ Generates the schema according to OpenAPI specifications """
     open_api = {
             "openapi": "3.0.3",
             "info": {
@@ -568,9 +801,9 @@ def schema() -> dict:
                 #                     'application/x-www-form-urlencoded']['schema'][
                 #                         'required'].append(post_param)
             
-    return jsonify(open_api)
+    return open_api
 
-@api.route('/schema/type/<dgraph_type>')
+@api.route('/schema/type/<dgraph_type>', validator=conditional.schema, max_age=3600)
 def get_dgraph_type(dgraph_type: str, new: bool = False, edit: bool = False) -> dict:
     """ 
         Get all predicates of given type alongside a description.
@@ -604,7 +837,7 @@ def get_dgraph_type(dgraph_type: str, new: bool = False, edit: bool = False) ->
 
 from meteor.api.responses import DGraphTypeDescription
 
-@api.route('/schema/types')
+@api.route('/schema/types', validator=conditional.schema, max_age=3600)
 def list_dgraph_types() -> t.List[DGraphTypeDescription]:
     """ 
         List all public Dgraph Types alongside a description
@@ -772,14 +1005,11 @@ def view_recent(limit: int = 5, dgraph_type: str = "Entry") -> t.List[Entry]:
                             }
                         }'''
     
-    result = dgraph.query(query_string, variables={'$limit': str(limit), '$type': dgraph_type})
-    for entry in result['data']:
-        if 'Entry' in entry['dgraph.type']:
-            entry['dgraph.type'].remove('Entry')
+    result = dgraph.query(query_string, variables={'$limit': str(limit), '$type': dgraph_type}, raw=True)
 
-    return jsonify(result['data'])
+    return passthrough(result, block='data')
 
-import random
+from meteor.view.sampling import sampling_index
 
 @api.route('/view/random')
 def view_random(limit: int = 5, dgraph_type: str = "Entry") -> t.List[Entry]:
@@ -797,27 +1027,13 @@ def view_random(limit: int = 5, dgraph_type: str = "Entry") -> t.List[Entry]:
     if dgraph_type not in Schema.get_types(private=False):
         return api.abort(404, message=f"Cannot find DGraph Type <{dgraph_type}>")
     
-    first_query = '''query getCount($type: string)
-                    {
-                        q(func: type($type)) 
-                            @filter(eq(entry_review_status, "accepted") AND has(_date_created)) {
-                                count(uid)
-                            }
-                        }'''
-    
-    count = dgraph.query(first_query, variables={'$type': dgraph_type})['q'][0]['count']
+    uids = sampling_index.sample(dgraph_type, limit)
+    if len(uids) == 0:
+        return jsonify([])
 
-    random_numbers = random.sample(range(1, count), limit)
-
-    query_string = 'query getRandom($type: string) {'
-    for i, num in enumerate(random_numbers):
-                    query_string += f'''var(func: type($type), first: 1, offset: {num}) 
-                            @filter(eq(entry_review_status, "accepted") AND has(_date_created)) {{
-                                random_{i} as uid
-                            }}
-                    '''
-    
-    query_string += "data(func: uid(" + ", ".join([f"random_{i}" for i in range(limit)]) + ')) '
+    # entries could have changed since the samples were drawn
+    query_string = "{"
+    query_string += "data(func: uid(" + ", ".join(uids) + ')) @filter(eq(entry_review_status, "accepted")) '
     query_string += """{
                         uid
                         _unique_name 
@@ -832,7 +1048,7 @@ def view_random(limit: int = 5, dgraph_type: str = "Entry") -> t.List[Entry]:
                     }
                 """
 
-    result = dgraph.query(query_string, variables={'$type': dgraph_type})
+    result = dgraph.query(query_string)
 
     for entry in result['data']:
         if 'Entry' in entry['dgraph.type']:
@@ -840,7 +1056,7 @@ def view_random(limit: int = 5, dgraph_type: str = "Entry") -> t.List[Entry]:
 
     return jsonify(result['data'])
 
-@api.route('/view/uid/<uid>', authentication=True, optional=True)
+@api.route('/view/uid/<uid>', authentication=True, optional=True, validator=conditional.entry_by_uid)
 def view_uid(uid: str) -> t.Union[Entry, PoliticalParty,
                                   Organization, JournalisticBrand, 
                                   NewsSource, Government, 
@@ -886,7 +1102,7 @@ def view_uid(uid: str) -> t.Union[Entry, PoliticalParty,
 
 
 
-@api.route('/view/entry/<unique_name>', authentication=True, optional=True)
+@api.route('/view/entry/<unique_name>', authentication=True, optional=True, validator=conditional.entry_by_unique_name)
 def view_unique_name(unique_name: str) -> t.Union[Entry, PoliticalParty,
                                   Organization, JournalisticBrand, 
                                   NewsSource, Government, 
@@ -933,7 +1149,11 @@ def view_unique_name(unique_name: str) -> t.Union[Entry, PoliticalParty,
 from meteor.api.responses import ReverseRelationships
 
 @api.route('/view/reverse/<uid>', authentication=True, optional=True)
-def view_reverse_relationships(uid: str) -> ReverseRelationships:
+def view_reverse_relationships(uid: str,
+                               predicates: t.List[str] = None,
+                               first: int = None,
+                               after: str = None,
+                               output: t.Literal['entries', 'count'] = 'entries') -> ReverseRelationships:
     """ 
         Get reverse (incoming) relationships for a given entry 
 
@@ -949,62 +1169,77 @@ def view_reverse_relationships(uid: str) -> ReverseRelationships:
         Using the example from above, it would contain the key `sources_included__datasets`.
 
         Each of these keys is a list of `Entry` objects. 
+
+        Options for entries with many relationships:
+
+        - `predicates`: only return these relationships, either by key
+            (`sources_included__datasets`) or by predicate (`sources_included`)
+        - `first`: return at most `first` entries per relationship (max: 500), ordered by uid.
+            The key `_next` then maps every relationship with more entries to a cursor,
+            pass it as `after` (together with exactly this one relationship in `predicates`) to get the next page.
+        - `output=count`: only return the number of entries per relationship
     
     """
 
     uid = validate_uid(uid)
     if not uid:
         return api.abort(404)
-    
-    dgraph_type = dgraph.get_dgraphtype(uid)
-    if not dgraph_type:
+
+    if first is not None and not 1 <= first <= 500:
+        return api.abort(400, message='`first` has to be between 1 and 500')
+    if after is not None and first is None:
+        return api.abort(400, message='`after` requires `first`')
+
+    try:
+        data = get_preview(uid=uid)
+    except (InventoryDatabaseError, InventoryValidationError):
+        return api.abort(404, message=f'The requested entry <{uid}> could not be found!')
+
+    # the preview already has the type, no need for another lookup
+    dgraph_types = [dt for dt in data['dgraph.type'] if dt not in ['Entry', 'Resource']]
+    if 'User' in dgraph_types or len(dgraph_types) == 0:
         return api.abort(404)
+    dgraph_type = dgraph_types[0]
     if dgraph_type in ['Channel', 'Country', 'Multinational', 
                        'Language', 'ProgrammingLanguage', 'TextType', 
-                       'Modality', 'Operation']:
-        return api.abort(400, f'Cannot perform this operation on dgraph.type <{dgraph_type}>. Try using the "/query" endpoint instead.')
-
-    data = get_preview(uid=uid)
-    if not data:
-        return api.abort(404, message=f'The requested entry <{uid}> could not be found!')
+                       'Modality', 'Operation'] and first is None and output != 'count':
+        return api.abort(400, f'Cannot perform this operation on dgraph.type <{dgraph_type}> without pagination. Try using `first`, `output=count` or the "/query" endpoint instead.')
 
     current_user = jwtx.current_user or AnonymousUser()
     if not can_view(data, current_user):
         if current_user.is_authenticated:
-            response = jsonify({
-                'status': 403,
-                'message': "You do not have the permissions to view this entry."})
-            response.status_code = 403
             return api.abort(403, message="You do not have the permissions to view this entry.")
         else:
             return api.abort(403, message="You do not have the permissions to view this entry. Try to login?")
     
-    results = get_reverse_relationships(uid)
+    try:
+        results = get_reverse_relationships(uid, dgraph_type=dgraph_type,
+                                            predicates=predicates,
+                                            first=first, after=after,
+                                            count=output == 'count')
+    except InventoryValidationError as e:
+        return api.abort(400, message=str(e))
 
-    return jsonify(results)
+    return stream_jsonify(results)
 
-@api.route('/view/ownership/<uid>')
-def view_ownership(uid: str) -> t.List[Entry]:
-    """ get data for plotting ownership network """
+from meteor.view.ownership import ownership_index
+
+@api.route('/view/ownership/<uid>', cost=2)
+def view_ownership(uid: str, depth: int = None) -> t.List[Entry]:
+    """ 
+        get data for plotting ownership network 
+        
+        Optionally, `depth` limits the network to entries that are 
+        at most `depth` ownership relations away from the entry.
+    """
 
     uid = validate_uid(uid)
     if not uid:
         return api.abort(404, message=f'Invalid UID <{uid}>')
-    query_string = """query ownership($id: string) {
-                        tmp(func: uid($id)) @recurse  {
-                            u as uid owns publishes ~owns ~publishes                                     
-                        }
-                        q(func: uid(uid(u))) 
-                            @filter(eq(entry_review_status, "accepted") AND 
-                                eq(dgraph.type,["Organization", "NewsSource", "PoliticalParty"]))  {
-                            name uid dgraph.type _unique_name
-                            channel { _unique_name uid name }
-                            publishes @filter(eq(entry_review_status, "accepted")) { uid _unique_name }
-                            owns @filter(eq(entry_review_status, "accepted")) { uid _unique_name }
-                        }
-                    }"""
-    result = dgraph.query(query_string=query_string, variables={'$id': uid})
-    return jsonify(result['q'])
+    if depth is not None and depth < 1:
+        return api.abort(400, message='Depth has to be at least 1')
+    result = ownership_index.subgraph(uid, view='api', depth=depth)
+    return jsonify(result)
 
 
 @login_required
@@ -1027,7 +1262,7 @@ def view_rejected(uid: str) -> Rejected:
 
 from meteor.api.view import get_similar
 
-@api.route('/view/similar/<uid>')
+@api.route('/view/similar/<uid>', cost=5)
 def view_similar(uid: str, max_results: int = 10) -> t.List[
         t.TypedDict('SimilarEntry', uid=str, _unique_name=str, name=str, 
                     aggregated_similarity=float, common_placeholder=int, similarity_placeholder=float)]:
@@ -1124,15 +1359,13 @@ def quicksearch(term: str = None, limit: int = 10) -> t.List[Entry]:
         '''
     result = dgraph.query(query_string, variables={'$name': term, 
                                                    '$name_regex': query_regex,
-                                                   '$limit': str(limit)})
-    for item in result['data']:
-        if 'Entry' in item['type']:
-            item['type'].remove('Entry')
-    return jsonify(result['data'])
+                                                   '$limit': str(limit)}, 
+                          raw=True)
+    return passthrough(result, block='data')
 
 
 # TODO: Add sorting parameter
-@api.route("/query")
+@api.route("/query", cost=lambda: 5 if request.args.get('_terms') else 0)
 def query(_max_results: int = 25, _page: int = 1, _terms: str = None) -> t.List[Entry]:
     """ 
         Perform query based on dgraph query parameters.
@@ -1144,6 +1377,12 @@ def query(_max_results: int = 25, _page: int = 1, _terms: str = None) -> t.List[
         - `_page`: current page
         - `_terms`: free-text search (searches various text fields)
 
+        Queries are rejected (400) if their estimated cost is over 
+        `QUERY_COST_BUDGET` (default: 10 million; nodes at the root 
+        times the weight of all filters). Free-text searches over the 
+        budget skip the regular expression on names instead, then 
+        the response has the header `X-Query-Downgraded: true`.
+
         Default Behaviour for other query parameters:
 
         - Most comparators check for equality by default.
@@ -1165,17 +1404,24 @@ def query(_max_results: int = 25, _page: int = 1, _terms: str = None) -> t.List[
     
     if len(r) > 0:
         try:
-            query_string = build_query_string(r)
+            query_string = build_query_string(r, planner=query_planner)
         except ValueError as e:
             return api.abort(400, message=f'{e}')  
+        mark_downgraded()
           
         search_terms = _terms
         if search_terms is not None and search_terms.strip() != '':
             variables = {'$searchTerms': search_terms.strip()}
         else:
             variables = None
-        result = dgraph.query(query_string, variables=variables)
-        result = result['q']
+        result = dgraph.query(query_string, variables=variables, raw=True)
+
+        # Only author lists (with sequence facets) need to be sorted in Python
+        # everything else can be passed on directly
+        if b'_authors_fallback|sequence"' not in result:
+            return passthrough(result, block='q')
+
+        result = dgraph.decoder.decode(result)['q']
 
         # clean 'Entry' from types
         if len(result) > 0:
@@ -1187,23 +1433,29 @@ def query(_max_results: int = 25, _page: int = 1, _terms: str = None) -> t.List[
         except Exception as e:
             current_app.logger.error(f'Could not restore sequence. \nData: {result}.\nError: {e}')
 
-        return jsonify(result)
+        return stream_jsonify(result)
     else:
         return api.abort(400)
 
 
-@api.route("/query/count")
+@api.route("/query/count", cost=lambda: 2 if request.args.get('_terms') else 0)
 def query_count(_terms: str = None) -> int:
-    """ get total number of hits for query """
+    """ 
+        get total number of hits for query 
+        
+        Same cost budget as `/query`: expensive queries are rejected 
+        or downgraded (header `X-Query-Downgraded: true`)
+    """
 
     r = {k: v for k, v in request.args.to_dict(
         flat=False).items() if v[0] != ''}
     
     if len(r) > 0:
         try:
-            query_string = build_query_string(r, count=True)
+            query_string = build_query_string(r, count=True, planner=query_planner)
         except ValueError as e:
             return api.abort(400, message=f'{e}')  
+        mark_downgraded()
         search_terms = _terms
         if search_terms is not None and search_terms.strip() != '':
             variables = {'$searchTerms': search_terms.strip()}
@@ -1338,12 +1590,19 @@ def lookup(query: str = None, predicate: str = None, dgraph_types: t.List[str] =
 
 """ Add new Entries """
 
-@api.route('/add/check', authentication=True)
+from meteor.add.duplicates import find_duplicates
+from meteor.misc.indexes import entry_changed
+from meteor.api.events import change_feed
+
+@api.route('/add/check', authentication=True, cost=0.5)
 def duplicate_check(name: str = None, dgraph_type: str = None) -> t.List[Entry]:
     """ 
         perform potential duplicate check. 
         
         If entries with similar name (or DOI) are found then it returns list of potential duplicates 
+
+        Meant to be called while the user types: the check is rate limited 
+        to about one request per second (after a burst of 60 requests)
     """
     if not name or not dgraph_type:
         return api.abort(400)
@@ -1353,36 +1612,10 @@ def duplicate_check(name: str = None, dgraph_type: str = None) -> t.List[Entry]:
     if not dgraph_type:
         return api.abort(400, message='Invalid DGraph type')
 
-    query = name.replace('https://', '').replace('http://', '').replace('www.', '')
-    query = strip_query(query)
-    identifier = name.strip()
-    query_string = f'''
-            query database_check($query: string, $identifier: string)
-            {{
-                field1 as a(func: regexp(name, /$query/i)) @filter(type("{dgraph_type}"))
-                field2 as b(func: allofterms(name, $query)) @filter(type("{dgraph_type}"))
-                field3 as c(func: allofterms(alternate_names, $query)) @filter(type("{dgraph_type}"))
-                field4 as d(func: match(name, $query, 3)) @filter(type("{dgraph_type}"))
-                field5 as e(func: allofterms(title, $query)) @filter(type("{dgraph_type}"))
-                doi as f(func: eq(doi, $identifier))
-                arxiv as g(func: eq(arxiv, $identifier))
-                cran as h(func: eq(cran, $identifier))
-                pypi as i(func: eq(pypi, $identifier))
-                github as j(func: eq(github, $identifier))
-
-                check(func: uid(field1, field2, field3, field4, field5, doi, arxiv, cran, pypi, github)) {{
-                    uid
-                    expand(_all_) {{ name }}
-                    }}
-            }}
-    '''
-    result = dgraph.query(query_string, variables={
-                            '$query': query, '$identifier': identifier})
-    
-    return jsonify(result['check'])
+    return jsonify(find_duplicates(name, dgraph_type))
     
 from meteor.api.requests import EditablePredicates, PublicDgraphTypes
-from meteor.api.notifications import notify_new_type
+from meteor.api.notifications import notify_new_entry, notification_queue
 
 @api.route('/add/<dgraph_type>', methods=['POST'], authentication=True)
 def add_new_entry(dgraph_type: str, data: EditablePredicates, draft: bool = False) -> SuccessfulAPIOperation:
@@ -1489,9 +1722,13 @@ def add_new_entry(dgraph_type: str, data: EditablePredicates, draft: bool = Fals
         # Subscribe user to their new entry
         jwtx.current_user.follow_entity(uid)
 
+        entry_changed(uid)
+        change_feed.publish('add', uid, dgraph_type, 
+                            public=str(sanitizer.entry.get('entry_review_status')) == 'accepted',
+                            actor=jwtx.current_user.uid)
+
         # Notify Reviewers about new Entry
-        notify_new_entity(uid, role=USER_ROLES.Reviewer)
-        notify_new_type(dgraph_type, uid, role=USER_ROLES.Reviewer)
+        notification_queue.submit(notify_new_entry, uid, dgraph_type, role=USER_ROLES.Reviewer)
         
         return jsonify(response)
     else:
@@ -1571,6 +1808,10 @@ def edit_uid(uid: str, data: EditablePredicates) -> SuccessfulAPIOperation:
             sanitizer.upsert_query, 
             del_nquads=sanitizer.delete_nquads, 
             set_nquads=sanitizer.set_nquads)
+        entry_changed(uid)
+        change_feed.publish('edit', uid, dgraph_type, 
+                            public=check.get('entry_review_status') == 'accepted',
+                            actor=jwtx.current_user.uid)
         return jsonify({'status': 'success',
                         'message': f'<{uid}> has been edited',
                         'uid': uid})
@@ -1591,6 +1832,7 @@ def delete_draft(uid: str) -> SuccessfulAPIOperation:
         return api.abort(403)
 
     draft_delete(check['uid'])
+    change_feed.publish('delete', check['uid'], public=False, actor=jwtx.current_user.uid)
 
     return jsonify({'status': 'success',
                     'message': 'Draft deleted!',
@@ -1600,13 +1842,15 @@ def delete_draft(uid: str) -> SuccessfulAPIOperation:
 
 from meteor.api import review
 from meteor.review.dgraph import accept_entry, reject_entry
-from meteor.api.notifications import send_review_notification, notify_new_entity
+from meteor.api.notifications import send_review_notification
 
 @api.route('/review', authentication=True)
 def overview(dgraph_type: str = None, 
              country: str = None, 
              text_type: str = None,
-             user: str = None) -> t.List[Entry]:
+             user: str = None,
+             first: int = 50,
+             after: str = None) -> t.List[Entry]:
     """ 
         Get an overview of all entries that need to be reviewed 
     
@@ -1616,6 +1860,11 @@ def overview(dgraph_type: str = None,
 
         The return objects also contain the keys which they were filtered by, i.e., 
         `added_by`, `country`, `countries`, `channel`, `channels`, `text_types`
+
+        Entries are sorted by date (newest first) and paginated: `first` sets the 
+        page size (default 50, max 500). If there are more entries, the response has
+        the header `X-Next-Cursor`; pass its value as `after` to get the next page.
+        Use `/review/count` to get the total number of entries.
     """
 
     if jwtx.current_user.role < USER_ROLES.Reviewer:
@@ -1624,12 +1873,54 @@ def overview(dgraph_type: str = None,
     if dgraph_type:
         dgraph_type = Schema.get_type(dgraph_type)
 
-    overview = review.get_overview(dgraph_type,
-                                   country=country,
-                                   user=user,
-                                   text_type=text_type)
+    first = min(max(first, 1), 500)
+
+    try:
+        if after:
+            overview, cursor = review.get_overview(dgraph_type,
+                                                   country=country,
+                                                   user=user,
+                                                   text_type=text_type,
+                                                   first=first,
+                                                   after=after)
+        else:
+            # first pages are the same for all reviewers
+            overview, cursor = review.overview_cache.get(('overview', dgraph_type, country, user, text_type, first),
+                                                         review.get_overview,
+                                                         dgraph_type,
+                                                         country=country,
+                                                         user=user,
+                                                         text_type=text_type,
+                                                         first=first)
+    except ValueError as e:
+        return api.abort(400, message=f'{e}')
+
+    response = jsonify(overview)
+    if cursor:
+        response.headers['X-Next-Cursor'] = cursor
+    return response
 
-    return jsonify(overview)
+@api.route('/review/count', authentication=True)
+def overview_count(dgraph_type: str = None, 
+                   country: str = None, 
+                   text_type: str = None,
+                   user: str = None) -> int:
+    """ Get the number of entries that need to be reviewed, accepts the same filters as `/review` """
+
+    if jwtx.current_user.role < USER_ROLES.Reviewer:
+        return api.abort(403, message="You need to be a reviewer to view this route.")
+
+    if dgraph_type:
+        dgraph_type = Schema.get_type(dgraph_type)
+
+    count = review.overview_cache.get(('count', dgraph_type, country, user, text_type),
+                                      review.count_overview,
+                                      dgraph_type,
+                                      country=country,
+                                      user=user,
+                                      text_type=text_type)
+
+    return jsonify(count)
 
 @api.route('/review/submit', methods=['POST'], authentication=True)
 def submit_review(uid: str, 
@@ -1639,19 +1930,21 @@ def submit_review(uid: str,
     if jwtx.current_user.role < USER_ROLES.Reviewer:
         return api.abort(403, message='You need to be a reviewer to access this route.')
 
+    # rejected entries lose their type
+    dgraph_type = (validate_uid(uid) and dgraph.get_dgraphtype(uid)) or None
+
     if status == 'accepted':
         try:
             review.accept_entry(uid, jwtx.current_user)
+            change_feed.publish('review', uid, dgraph_type, status=status,
+                                actor=jwtx.current_user.uid)
 
             # Notify user who made new entry 
-            send_review_notification(uid, "accepted")
+            notification_queue.submit(send_review_notification, uid, "accepted")
             
-            # Notify Users about new entry for this dgraph type
-            dgraph_type = dgraph.get_dgraphtype(uid)
-            notify_new_type(dgraph_type, uid)
-
-            # Notify Users who follow specific entities related to this new one
-            notify_new_entity(uid)
+            # Notify Users who follow this dgraph type 
+            # or specific entities related to this new one
+            notification_queue.submit(notify_new_entry, uid)
 
             return jsonify({'status': 200,
                             'message': 'Entry has been accepted!',
@@ -1663,8 +1956,10 @@ def submit_review(uid: str,
     elif status == 'rejected':
         try:
             review.reject_entry(uid, jwtx.current_user)
+            change_feed.publish('review', uid, dgraph_type, status=status,
+                                public=False, actor=jwtx.current_user.uid)
             # Notify user who made new entry 
-            send_review_notification(uid, "rejected")
+            notification_queue.submit(send_review_notification, uid, "rejected")
             
             return jsonify({'status': 200,
                             'message': 'Entry has been rejected!',
@@ -1676,9 +1971,11 @@ def submit_review(uid: str,
     elif status == 'revise':
         try:
             review.mark_revise(uid, jwtx.current_user)
+            change_feed.publish('review', uid, dgraph_type, status=status,
+                                public=False, actor=jwtx.current_user.uid)
 
             # Notify user who made new entry 
-            send_review_notification(uid, "revise")
+            notification_queue.submit(send_review_notification, uid, "revise")
                 
             return jsonify({'status': 200,
                             'message': 'Entry marked as "revise"!',
@@ -1718,11 +2015,16 @@ def leave_comment(uid: str, message: str) -> SuccessfulAPIOperation:
     try:
         result = post_comment(uid, message, jwtx.current_user)
         uid_return = list(result.values())[0]
+        check = check_entry(uid=uid)
+        dgraph_type = [dt for dt in check["dgraph.type"] if dt != "Entry"][0]
+        change_feed.publish('comment', uid, dgraph_type, 
+                            public=check.get('entry_review_status') == 'accepted',
+                            actor=jwtx.current_user.uid)
         # Notify involved Users 
         # - Entry Author
         # - Entry Reviewers
         # - Users who edited Entry
-        send_comment_notifications(uid)
+        notification_queue.submit(send_comment_notifications, uid)
 
         return jsonify({'status': 'success',
                         'message': f'Comment posted on <{uid}>.',
@@ -2206,7 +2508,7 @@ def show_all_users() -> t.List[User]:
     if jwtx.current_user.role < USER_ROLES.Admin:
         return api.abort(403)
     user_list = User.list_users()
-    return jsonify(user_list)
+    return stream_jsonify(user_list)
 
 
 @api.route('/admin/users/<uid>', authentication=True)
@@ -2243,21 +2545,54 @@ def change_user(uid: str, role: int) -> SuccessfulAPIOperation:
 
 """ Notifications """
 
-from meteor.api.notifications import get_all_notifications, get_unread_notifications, mark_notifications_as_read
+from meteor.api.notifications import get_all_notifications, get_unread_notifications, mark_notifications_as_read, unread_counter
 from meteor.main.model import Notification
 
 
 @api.route('/notifications/all', authentication=True)
-def show_all_notifications() -> t.List[Notification]:
-    """ lists all notifications for the current user """
+def show_all_notifications(first: int = None, offset: int = 0) -> t.List[Notification]:
+    """ 
+        lists all notifications for the current user (oldest first)
+    
+        Use `first` and `offset` for pagination
+    """
+    if first is not None and first < 1:
+        return api.abort(400, message='first has to be at least 1')
 
-    return get_all_notifications(jwtx.current_user)
+    return get_all_notifications(jwtx.current_user, first=first, offset=max(offset, 0))
 
 @api.route('/notifications/unread', authentication=True)
-def show_unread_notifications() -> t.List[Notification]:
-    """ lists unread notifications for the current user """
+def show_unread_notifications(first: int = None, offset: int = 0) -> t.List[Notification]:
+    """ 
+        lists unread notifications for the current user (oldest first)
+    
+        Use `first` and `offset` for pagination. To check for new notifications,
+        use `/notifications/unread/count` or `/notifications/unread/wait` instead.
+    """
+    if first is not None and first < 1:
+        return api.abort(400, message='first has to be at least 1')
+
+    return get_unread_notifications(jwtx.current_user, first=first, offset=max(offset, 0))
 
-    return get_unread_notifications(jwtx.current_user)
+@api.route('/notifications/unread/count', authentication=True)
+def show_unread_count() -> int:
+    """ number of unread notifications for the current user """
+
+    return jsonify(unread_counter.get(jwtx.current_user))
+
+@api.route('/notifications/unread/wait', authentication=True)
+def wait_unread_count(count: int = None, timeout: int = 25) -> int:
+    """ 
+        long-poll for new notifications
+
+        Responds as soon as the number of unread notifications differs
+        from `count` (the last known number) or after `timeout` seconds
+        (max. 55), with the current number of unread notifications.
+        Without `count` the route responds immediately.
+    """
+
+    timeout = min(max(timeout, 0), 55)
+    return jsonify(unread_counter.wait(jwtx.current_user, known=count, timeout=timeout))
 
 
 @api.route('/notifications/dismiss', methods=['POST'], authentication=True)
@@ -2279,6 +2614,104 @@ def dismiss_notifications(uids: t.List[str]) -> SuccessfulAPIOperation:
     return jsonify({'status': 200,
                     'message': 'Done'})
 
+""" Change Feed """
+
+from meteor.api.events import change_feed, Subscription, format_sse
+from meteor.api.responses import ChangeFeed
+
+def _feed_position(stream: str = None, since: int = None) -> t.Tuple[int, bool]:
+    """ where to resume the feed; second value is `True` if the client has to reload """
+    if since is None:
+        return change_feed.seq, False
+    if (stream is not None and stream != change_feed.stream) or since > change_feed.seq:
+        # process restarted in the meantime
+        return change_feed.seq, True
+    return since, False
+
+@api.route('/events', authentication=True, optional=True)
+def events(since: int = None, 
+           stream: str = None,
+           dgraph_types: t.List[str] = None,
+           uids: t.List[str] = None,
+           scope: t.Literal['all', 'following'] = 'all',
+           timeout: int = 25) -> ChangeFeed:
+    """
+        Long-poll for changes (new entries, edits, reviews, comments, deleted drafts and notifications)
+
+        Pass the `stream` and `seq` of the previous response as `stream` and `since`.
+        The route responds as soon as there are new events or after `timeout` seconds
+        (max. 55). Without `since` the route returns the current position immediately. 
+
+        If `reset` is `true`, events were missed (e.g., after a restart) and the
+        client should reload its data.
+
+        Events can be restricted to `dgraph_types` and `uids`. Use `scope=following`
+        to only receive events for entries and types you follow. Notifications
+        are always included.
+    """
+    current_user = jwtx.current_user or AnonymousUser()
+    subscription = Subscription(current_user, dgraph_types=dgraph_types, uids=uids, 
+                                following=scope == 'following')
+    timeout = min(max(timeout, 0), 55)
+
+    seq, reset = _feed_position(stream, since)
+    events = []
+    if since is not None and not reset:
+        events, reset = change_feed.wait(seq, subscription, timeout=timeout)
+    # events after `seq` that do not match the subscription can be skipped
+    seq = events[-1]['seq'] if events else max(seq, change_feed.seq)
+    return jsonify({'stream': change_feed.stream,
+                    'seq': seq,
+                    'reset': reset,
+                    'events': events})
+
+@api.route('/events/stream', authentication=True, optional=True)
+def events_stream(stream: str = None,
+                  since: int = None,
+                  dgraph_types: t.List[str] = None,
+                  uids: t.List[str] = None,
+                  scope: t.Literal['all', 'following'] = 'all') -> str:
+    """
+        Server-Sent Events of changes, accepts the same filters as `/events`.
+
+        The first event (`stream`) contains the current `stream` and `seq`. 
+        The `id` of every event is its sequence number, so browsers 
+        resume automatically (`Last-Event-ID`) after a reconnect. An event `reset`
+        means that events were missed. The server closes the connection after
+        a few minutes; clients reconnect automatically.
+    """
+    current_user = jwtx.current_user or AnonymousUser()
+    subscription = Subscription(current_user, dgraph_types=dgraph_types, uids=uids, 
+                                following=scope == 'following')
+    if request.headers.get('Last-Event-ID', '').isdigit():
+        since = int(request.headers['Last-Event-ID'])
+    seq, reset = _feed_position(stream, since)
+    duration = current_app.config.get('EVENT_STREAM_DURATION', 300)
+
+    def generate():
+        nonlocal seq, reset
+        yield f"event: stream\ndata: {json.dumps({'stream': change_feed.stream, 'seq': seq})}\n\n"
+        deadline = time.monotonic() + duration
+        while True:
+            if reset:
+                seq = change_feed.seq
+                yield f"id: {seq}\nevent: reset\ndata: {json.dumps({'stream': change_feed.stream, 'seq': seq})}\n\n"
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events, reset = change_feed.wait(seq, subscription, timeout=min(remaining, 15))
+            if len(events) == 0 and not reset:
+                # keep the connection open
+                yield ': keep-alive\n\n'
+            for event in events:
+                seq = event['seq']
+                yield format_sse(event)
+
+    return current_app.response_class(generate(), 
+                                      mimetype='text/event-stream',
+                                      headers={'Cache-Control': 'no-cache',
+                                               'X-Accel-Buffering': 'no'})
+
 from meteor.api.notifications import dispatch_notification
 
 @api.route('/debug/notification/dispatch', authentication=True)
@@ -2305,7 +2738,7 @@ from meteor.add.external import (instagram, twitter, get_wikidata, telegram, vko
 
 from meteor.api.responses import PublicationLike
 
-@api.route('/external/cran', methods=['POST'])
+@api.route('/external/cran', methods=['POST'], cost=3)
 def fetch_cran(package: str) -> PublicationLike:
     """ 
     Make an API call to CRAN. Get meta data on a CRAN package. 
@@ -2333,7 +2766,7 @@ def fetch_cran(package: str) -> PublicationLike:
 
 from meteor.api.responses import SocialMediaProfile
       
-@api.route('/external/twitter', methods=['POST'])
+@api.route('/external/twitter', methods=['POST'], cost=3)
 def fetch_twitter(handle: str) -> SocialMediaProfile:
     """ 
         Get metadata about a Twitter user from the Twitter API.
@@ -2365,7 +2798,7 @@ def fetch_twitter(handle: str) -> SocialMediaProfile:
 
     return jsonify(result)
 
-@api.route('/external/instagram', methods=['POST'])
+@api.route('/external/instagram', methods=['POST'], cost=3)
 def fetch_instagram(handle: str) -> SocialMediaProfile:
     """ 
         Get metadata about a Instagram user from the Instagram API.
@@ -2395,7 +2828,7 @@ def fetch_instagram(handle: str) -> SocialMediaProfile:
     print(result)
     return jsonify(result)
 
-@api.route("/external/vk", methods=['POST'])
+@api.route("/external/vk", methods=['POST'], cost=3)
 def fetch_vk(handle: str) -> SocialMediaProfile:
     """ 
         Get metadata about a VK user from the VK API.
@@ -2430,7 +2863,7 @@ def fetch_vk(handle: str) -> SocialMediaProfile:
 
     return jsonify(result)
 
-@api.route('/external/telegram', methods=['POST'])
+@api.route('/external/telegram', methods=['POST'], cost=3)
 def fetch_telegram(handle: str) -> SocialMediaProfile:
     """ 
         Get metadata about a Telegram bot or channel from the Telegram API.
@@ -2474,7 +2907,7 @@ def fetch_telegram(handle: str) -> SocialMediaProfile:
 
     return jsonify(result)
 
-@api.route('/external/website', methods=['POST'])
+@api.route('/external/website', methods=['POST'], cost=3)
 def resolve_website(url: str) -> SocialMediaProfile:
     # first check if website exists
     result = {'alternate_names': []}
@@ -2547,7 +2980,7 @@ def resolve_website(url: str) -> SocialMediaProfile:
     return jsonify(result)
 
 
-@api.route('/external/doi', methods=['POST'])
+@api.route('/external/doi', methods=['POST'], cost=3)
 def resolve_doi(identifier: str, fresh: bool=False) -> PublicationLike:
     """ 
         Automatically resolve meta data for a DOI.
@@ -2571,3 +3004,30 @@ def resolve_doi(identifier: str, fresh: bool=False) -> PublicationLike:
     except Exception as e:
         return api.abort(404, f'Could not resolve DOI <{identifier}>. Please verify that the DOI is correct. {e}')
 
+
+""" Metrics """
+
+@api.route('/metrics')
+def prometheus_metrics() -> str:
+    """ 
+        Request metrics in Prometheus text format 
+        (latency of routes and DGraph requests, DGraph calls per request) 
+
+        Disabled unless `METRICS_ENABLED` is set. Requires an admin 
+        or the header `Authorization: Bearer <METRICS_TOKEN>`.
+
+        Metrics are collected per worker process, every scrape only 
+        returns the numbers of the process that answered it.
+    """
+    if not current_app.config.get('METRICS_ENABLED', False):
+        return api.abort(404)
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        try:
+            jwtx.verify_jwt_in_request()
+        except Exception:
+            return api.abort(401)
+        if jwtx.current_user.role < USER_ROLES.Admin:
+            return api.abort(403)
+    return current_app.response_class(metrics.render(), 
+                                      mimetype='text/plain; version=0.0.4')
@@ -116,31 +116,89 @@ def get_entry(unique_name: str = None, uid: str = None, dgraph_type: t.Union[str
     return data
 
 
-def get_reverse_relationships(uid: str) -> dict:
+REVERSE_RELATIONSHIP_FIELDS = """uid _unique_name name name_abbrev title date_published entry_review_status dgraph.type
+                        channel { _unique_name name uid entry_review_status }
+                        authors @facets(orderasc: sequence) { _unique_name uid name entry_review_status }
+                        _authors_fallback @facets(orderasc: sequence)
+                        fulltext_available
+                        temporal_coverage_start temporal_coverage_end"""
+
+
+def reverse_relationship_keys(dgraph_type: str) -> t.Dict[str, tuple]:
+    """
+        Maps keys in the format `<predicate>__<dgraphtype>s`
+        to `(predicate, dgraph_type)` 
+    """
+    reverse_relationships = Schema.get_reverse_relationships(dgraph_type) or []
+    return {f"{predicate}__{dtype.lower()}s": (predicate, dtype) for predicate, dtype in reverse_relationships}
+
+
+def get_reverse_relationships(uid: str,
+                              dgraph_type: str = None,
+                              predicates: t.List[str] = None,
+                              first: int = None,
+                              after: str = None,
+                              count: bool = False) -> dict:
+    """
+        Get reverse relationships of an entry.
+
+        `predicates` selects relationships either by key (`sources_included__datasets`)
+        or by predicate (`sources_included`, all types). Pass the `dgraph_type` if it
+        is already known, to save a lookup.
+
+        With `first` every relationship returns at most `first` entries, ordered by uid.
+        The key `_next` maps relationships that have more entries to a cursor (the last
+        uid), use it as `after` to get the next page. Cursors belong to one relationship,
+        so `after` requires that `predicates` selects exactly one.
+
+        With `count=True` only the number of entries per relationship is returned.
+    """
     query_var = 'query get_entry($value: string) { q(func: uid($value)) {'
     
     uid = validate_uid(uid)
     if not uid:
         raise ValueError
 
-    dgraph_type = dgraph.get_dgraphtype(uid)
+    if dgraph_type is None:
+        dgraph_type = dgraph.get_dgraphtype(uid)
     
-    reverse_relationships = Schema.get_reverse_relationships(dgraph_type)
+    keys = reverse_relationship_keys(dgraph_type)
+    if predicates:
+        selected = {}
+        for p in predicates:
+            matches = {k: v for k, v in keys.items() if k == p or v[0] == p}
+            if len(matches) == 0:
+                raise InventoryValidationError(f'<{dgraph_type}> has no reverse relationship <{p}>')
+            selected.update(matches)
+        keys = selected
+
+    if after is not None:
+        if len(keys) != 1:
+            raise InventoryValidationError('`after` requires exactly one relationship in `predicates`')
+        after = validate_uid(after)
+        if not after:
+            raise InventoryValidationError('Invalid cursor provided')
+
+    if first is not None:
+        # one more, to know whether there is a next page
+        pagination = f"(first: {first + 1}" + (f", after: {after})" if after else ")")
+    else:
+        pagination = "(orderasc: _unique_name)"
+
     query_relationships = []
     result = {}
-    for predicate, dtype in reverse_relationships:
-        result[f"{predicate}__{dtype.lower()}s"] = []
-        subquery = f"""{predicate}__{dtype.lower()}s: ~{predicate} @filter(type({dtype})) (orderasc: _unique_name) @facets {{
-                        uid _unique_name name name_abbrev title date_published entry_review_status dgraph.type
-                        channel {{ _unique_name name uid entry_review_status }}
-                        authors @facets(orderasc: sequence) {{ _unique_name uid name entry_review_status }}
-                        _authors_fallback @facets(orderasc: sequence)
-                        fulltext_available
-                        temporal_coverage_start temporal_coverage_end
-                        }}"""
-        
-        query_relationships.append(subquery)
-
+    for key, (predicate, dtype) in keys.items():
+        if count:
+            result[key] = 0
+            query_relationships.append(f"{key}: count(~{predicate} @filter(type({dtype})))")
+        else:
+            result[key] = []
+            query_relationships.append(f"""{key}: ~{predicate} @filter(type({dtype})) {pagination} @facets {{
+                        {REVERSE_RELATIONSHIP_FIELDS}
+                        }}""")
+
+    if len(query_relationships) == 0:
+        return result
     
     query_string = query_var + "\n".join(query_relationships) + ' } }'
 
@@ -157,6 +215,14 @@ def get_reverse_relationships(uid: str) -> dict:
     
     result.update(data['q'][0])
 
+    if first is not None and not count:
+        cursors = {}
+        for key in keys:
+            if len(result[key]) > first:
+                result[key] = result[key][:first]
+                cursors[key] = result[key][-1]['uid']
+        result['_next'] = cursors
+
     return result
 
 def get_rejected(uid):
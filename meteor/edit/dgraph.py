@@ -5,6 +5,7 @@ from flask import current_app
 from meteor.flaskdgraph import Schema
 from meteor.flaskdgraph.dgraph_types import UID, Variable, Scalar, make_nquad, dict_to_nquad
 from meteor.flaskdgraph.utils import recursive_restore_sequence
+from meteor.misc.indexes import entry_changed
 
 import logging
 
@@ -112,3 +113,4 @@ def draft_delete(uid):
     final_delete = f'{uid.nquad} * * .'
 
     dgraph.upsert(None, del_nquads=final_delete)
+    entry_changed(uid)
@@ -11,6 +11,7 @@ from meteor.edit.forms import RefreshWikidataForm
 from meteor.edit.utils import can_delete, can_edit, channel_filter
 from meteor.edit.sanitizer import EditAudienceSizeSanitizer
 from meteor.edit.dgraph import draft_delete, get_entry, get_audience
+from meteor.misc.indexes import entry_changed
 from meteor.review.dgraph import check_entry, send_acceptance_notification
 from meteor.misc.utils import IMD2dict
 import traceback
@@ -102,6 +103,7 @@ def refresh_wikidata():
         result = dgraph.upsert(
             sanitizer.upsert_query, del_nquads=sanitizer.delete_nquads, set_nquads=sanitizer.set_nquads)
         current_app.logger.debug(result)
+        entry_changed(uid)
         flash(f'WikiData has been refreshed', 'success')
         return redirect(url_for('edit.edit_uid', uid=uid, **request.args))
     except Exception as e:
@@ -182,6 +184,7 @@ def entry(dgraph_type=None, unique_name=None, uid=None):
         try:
             result = dgraph.upsert(
                 sanitizer.upsert_query, del_nquads=sanitizer.delete_nquads, set_nquads=sanitizer.set_nquads)
+            entry_changed(uid)
             if request.form.get('accept'):
                 flash(f'{dgraph_type} has been edited and accepted', 'success')
                 send_acceptance_notification(uid)
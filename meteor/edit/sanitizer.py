@@ -1,4 +1,5 @@
 from meteor.flaskdgraph.dgraph_types import (UID, dict_to_nquad, Scalar)
+from meteor.flaskdgraph.nquads import NQuadWriter
 from meteor.errors import InventoryValidationError, InventoryPermissionError
 from meteor.main.sanitizer import Sanitizer
 from meteor.users.constants import USER_ROLES
@@ -47,8 +48,9 @@ class EditAudienceSizeSanitizer(Sanitizer):
         self.parse_audience_size()
 
         self.delete_nquads = self._make_delete_nquads()
-        nquads = dict_to_nquad(self.entry)
-        self.set_nquads = " \n ".join(nquads)
+        writer = NQuadWriter()
+        writer.write_dict(self.entry)
+        self.set_nquads = writer.getvalue()
 
     def _add_entry_meta(self, entry):
         facets = {'timestamp': datetime.datetime.now(
@@ -69,8 +71,10 @@ class EditAudienceSizeSanitizer(Sanitizer):
             for predicate in val:
                 del_obj.append({'uid': key, predicate: '*'})
 
-        nquads = [" \n ".join(dict_to_nquad(obj)) for obj in del_obj]
-        return " \n ".join(nquads)
+        writer = NQuadWriter()
+        for obj in del_obj:
+            writer.write_dict(obj)
+        return writer.getvalue()
 
     def _check_channel(self):
         query_string = f'{{ q(func: uid({self.entry_uid.query})) {{ channel {{ _unique_name }} }} }}'
@@ -13,6 +13,8 @@ from meteor.flaskdgraph.utils import strip_query, validate_uid
 from meteor.main.model import NewsSource, Schema
 from meteor.main.sanitizer import Sanitizer
 from meteor.add.dgraph import generate_fieldoptions
+from meteor.view.ownership import ownership_index
+from meteor.misc.indexes import entry_changed
 from meteor.flaskdgraph import dql
 
 
@@ -314,6 +316,7 @@ def submit():
         else:
             newuids = dict(result.uids)
             uid = newuids[str(sanitizer.entry_uid).replace('_:', '')]
+        entry_changed(uid)
         response = {'redirect': url_for('view.view_generic', dgraph_type='NewsSource', uid=uid)}
 
         return jsonify(response)
@@ -390,21 +393,8 @@ def ownership():
             uid = validate_uid(request.json.get('uid'))
             if not uid:
                 return abort(404)
-            query_string = """query ownership($id: string) {
-                                tmp(func: uid($id)) @recurse  {
-                                    u as uid owns publishes ~owns ~publishes                                     
-                                }
-                                q(func: uid(uid(u))) 
-                                    @filter(eq(entry_review_status, "accepted") AND 
-                                        eq(dgraph.type,["Organization", "NewsSource", "PoliticalParty", "Government", "Parliament"]))  {
-			                        name uid dgraph.type
-                                    channel { _unique_name }
-                                    publishes @filter(eq(entry_review_status, "accepted")) { uid }
-                                    owns @filter(eq(entry_review_status, "accepted")) { uid }
-                                }
-                            }"""
-            result = dgraph.query(query_string=query_string, variables={'$id': uid})
-            return jsonify(result['q'])
+            result = ownership_index.subgraph(uid, view='endpoint')
+            return jsonify(result)
         else:
             return abort(404)
     except Exception as e:
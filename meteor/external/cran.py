@@ -1,5 +1,6 @@
 import requests
 import re
+from meteor.external.http_client import http_client
 
 import typing
 
@@ -50,7 +51,7 @@ def cran(pkg) -> dict:
 
     api = 'https://crandb.r-pkg.org/'
 
-    r = requests.get(api + pkg)
+    r = http_client.get(api + pkg)
 
     r.raise_for_status()
 
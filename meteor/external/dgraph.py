@@ -1,35 +1,95 @@
+import typing
+
 from meteor.external.doi import resolve_doi, resolve_authors
 from meteor import dgraph
 from meteor.flaskdgraph import dql
 
+
+""" Batch Author Matching """
+
+def _author_ids(author: dict) -> typing.Tuple[typing.Union[str, None], list]:
+    openalex = author.get('openalex') or []
+    if not isinstance(openalex, list):
+        openalex = [openalex]
+    return author.get('orcid'), openalex
+
+
+def build_author_match_query(authors: typing.List[dict]) -> typing.Union[dql.DQLQuery, None]:
+    """
+        Single query that finds all existing `Author` entries 
+        which share an ORCID or OpenAlex ID with any of the `authors`.
+        Returns None if the authors do not have any IDs.
+    """
+    orcid_variables = {}
+    openalex_variables = {}
+    for author in authors:
+        orcid, openalex = _author_ids(author)
+        if orcid and orcid not in orcid_variables:
+            orcid_variables[orcid] = dql.GraphQLVariable(**{f'orcid{len(orcid_variables)}': orcid})
+        for o in openalex:
+            if o not in openalex_variables:
+                openalex_variables[o] = dql.GraphQLVariable(**{f'openalex{len(openalex_variables)}': o})
+
+    query_filter = []
+    if len(orcid_variables) > 0:
+        query_filter.append(dql.eq(orcid=list(orcid_variables.values())))
+    if len(openalex_variables) > 0:
+        query_filter.append(dql.eq(openalex=list(openalex_variables.values())))
+
+    if len(query_filter) == 0:
+        return None
+
+    return dql.DQLQuery(query_name="matchAuthors",
+                        func=dql.type_('Author'), 
+                        query_filter=query_filter, 
+                        filter_connector='OR',
+                        fetch=['uid', 'orcid', 'openalex'])
+
+
+def map_author_matches(authors: typing.List[dict], 
+                       matches: typing.List[dict]) -> typing.List[typing.Union[dict, None]]:
+    """
+        Maps the results of `build_author_match_query` back to the authors.
+        Returns a list with the same length as `authors`, each item 
+        is either the matched entry or None. ORCID matches take precedence.
+    """
+    by_orcid = {}
+    by_openalex = {}
+    for match in matches:
+        if match.get('orcid'):
+            by_orcid[match['orcid']] = match
+        for o in match.get('openalex', []):
+            by_openalex[o] = match
+
+    result = []
+    for author in authors:
+        orcid, openalex = _author_ids(author)
+        match = by_orcid.get(orcid)
+        if match is None:
+            for o in openalex:
+                if o in by_openalex:
+                    match = by_openalex[o]
+                    break
+        result.append(match)
+    return result
+
+
+def dgraph_match_authors(authors: typing.List[dict]) -> typing.List[typing.Union[dict, None]]:
+    query = build_author_match_query(authors)
+    if query is None:
+        return [None] * len(authors)
+    res = dgraph.query(query)
+    return map_author_matches(authors, res['q'])
+
+
 def dgraph_resolve_doi(doi: str) -> dict:
     publication = resolve_doi(doi)
     authors_tmp = publication.pop('_authors_tmp')
     authors = resolve_authors(authors_tmp)
 
-    query = dql.DQLQuery(func=dql.type_('Author'), query_filter=[
-        dql.eq(openalex=dql.GraphQLVariable(openalex='openalex')),
-        dql.eq(orcid=dql.GraphQLVariable(orcid='orcid'))], 
-        filter_connector='OR',
-        fetch=['uid', 'orcid', 'openalex']
-        )
-
-    for author in authors:
-        query.set_graphql_variables(orcid=author.get('orcid', 'None'))
-        if 'openalex' in author:
-            assert type(author['openalex']) == list, doi
-            openalex = ", ".join(author['openalex'])
-            openalex = f'"[{openalex}]"'
-            query.set_graphql_variables(openalex=openalex)
-        else:
-            query.set_graphql_variables(openalex='None')
-        res = dgraph.query(query)
-        if len(res['q']) > 0:
-            author['uid'] = res['q'][0]['uid']
+    for author, match in zip(authors, dgraph_match_authors(authors)):
+        if match:
+            author['uid'] = match['uid']
     
     publication['authors'] = authors
     return publication
-    
-
-
-
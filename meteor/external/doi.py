@@ -5,13 +5,24 @@ import datetime
 import lxml.html
 from meteor.external.openalex import OpenAlex
 from meteor.external.orcid import ORCID
+from meteor.external.http_client import http_client
 import logging
 import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 
 logger = logging.getLogger(__name__)
 
 ARXIV_PREFIX = "10.48550/arxiv."
 
+# seconds each provider gets to answer
+PROVIDER_TIMEOUT = 8
+# seconds `resolve_doi` waits in total before giving up
+RESOLVE_DEADLINE = 12
+# authors resolved at the same time by `resolve_authors`
+AUTHOR_WORKERS = 6
+
 class Publication(typing.TypedDict):
     doi: str
     url: typing.Optional[str]
@@ -52,11 +63,11 @@ def clean_orcid(orcid: str) -> str:
     return orcid
 
 
-def crossref(doi: str) -> dict:
+def crossref(doi: str, timeout: float = PROVIDER_TIMEOUT) -> dict:
 
     api = 'https://api.crossref.org/works/'
 
-    r = requests.get(api + doi)
+    r = http_client.get(api + doi, timeout=timeout)
     r.raise_for_status()
 
     publication = r.json()
@@ -129,12 +140,12 @@ def crossref(doi: str) -> dict:
     return result
 
 
-def doi_org(doi: str) -> dict:
+def doi_org(doi: str, timeout: float = PROVIDER_TIMEOUT) -> dict:
     api = "https://doi.org/"
 
     headers = {'Accept': "application/vnd.citationstyles.csl+json"}
 
-    r = requests.get(api + doi, headers=headers)
+    r = http_client.get(api + doi, headers=headers, timeout=timeout)
 
     r.raise_for_status()
 
@@ -182,10 +193,10 @@ def doi_org(doi: str) -> dict:
 
     return result
 
-def datacite(doi: str) -> dict:
+def datacite(doi: str, timeout: float = PROVIDER_TIMEOUT) -> dict:
     api = "https://api.datacite.org/dois/"
 
-    r = requests.get(api + doi, params={'affiliation': 'true'})
+    r = http_client.get(api + doi, params={'affiliation': 'true'}, timeout=timeout)
 
     r.raise_for_status()
 
@@ -243,7 +254,7 @@ def datacite(doi: str) -> dict:
 
     return result
 
-def zenodo(doi: str) -> dict:
+def zenodo(doi: str, timeout: float = PROVIDER_TIMEOUT) -> dict:
     """ 
         Get DOI meta data from Zenodo.org 
         Returns Authors as fallback (list of strings)
@@ -253,7 +264,7 @@ def zenodo(doi: str) -> dict:
 
     record = doi.split('.')[-1]
 
-    r = requests.get(api + record)
+    r = http_client.get(api + record, timeout=timeout)
 
     r.raise_for_status()
 
@@ -312,12 +323,12 @@ def zenodo(doi: str) -> dict:
     return result
 
 
-def jalc(doi: str) -> dict:
+def jalc(doi: str, timeout: float = PROVIDER_TIMEOUT) -> dict:
     api = "https://api.japanlinkcenter.org/dois/"
 
     headers = {"Accept": "application/json"}
 
-    r = requests.get(api + doi, headers=headers)
+    r = http_client.get(api + doi, headers=headers, timeout=timeout)
 
     r.raise_for_status()
 
@@ -376,108 +387,250 @@ def jalc(doi: str) -> dict:
     return result
 
 
-def resolve_doi(doi: str) -> dict:
+""" Provider Statistics """
+
+_provider_stats = {}
+_provider_stats_lock = threading.Lock()
+
+
+def _record_provider_stats(provider: str, latency: float, outcome: str) -> None:
+    with _provider_stats_lock:
+        stats = _provider_stats.setdefault(provider, {'calls': 0,
+                                                      'success': 0,
+                                                      'failure': 0,
+                                                      'timeout': 0,
+                                                      'total_latency': 0.0,
+                                                      'max_latency': 0.0})
+        stats['calls'] += 1
+        stats[outcome] += 1
+        stats['total_latency'] += latency
+        stats['max_latency'] = max(stats['max_latency'], latency)
+
+
+def get_provider_stats() -> typing.Dict[str, dict]:
+    """ 
+        Latency and success counts of all DOI providers 
+        since the process started. Latency in seconds.
+    """
+    with _provider_stats_lock:
+        result = {}
+        for provider, stats in _provider_stats.items():
+            result[provider] = dict(stats)
+            result[provider]['mean_latency'] = stats['total_latency'] / stats['calls']
+        return result
+
+
+def _call_provider(provider: str, service: typing.Callable, doi: str, timeout: float) -> dict:
+    """ runs in worker thread; keeps track of latency and outcome """
+    start = time.perf_counter()
+    try:
+        result = service(doi, timeout=timeout)
+    except requests.Timeout:
+        _record_provider_stats(provider, time.perf_counter() - start, 'timeout')
+        raise
+    except Exception:
+        _record_provider_stats(provider, time.perf_counter() - start, 'failure')
+        raise
+    _record_provider_stats(provider, time.perf_counter() - start, 'success')
+    return result
+
+
+def resolve_doi(doi: str, 
+                timeout: float = PROVIDER_TIMEOUT, 
+                deadline: float = RESOLVE_DEADLINE) -> dict:
     """ 
         query a series of APIs and return clean data 
-        Tries in this order
+        All services are queried at the same time, but the 
+        result of the service with the highest priority wins:
         1. OpenAlex (most convenient)
         2. Crossref
         3. Datacite
         4. JaLC
         5. DOI.org (has least useful metainfo)
 
+        `timeout` applies to each service, `deadline` to the
+        whole resolution.
+
         - Zenodo DOIs are handled by zenodo directly
     """
     doi = clean_doi(doi)
 
     if 'zenodo' in doi.lower():
         logger.debug('Using Zenodo')
-        return zenodo(doi)
+        return zenodo(doi, timeout=timeout)
     
     if 'arxiv' in doi.lower():
         doi = arxiv2doi(doi)
 
     openalex = OpenAlex()
 
-    services = (openalex.resolve_doi, crossref, datacite, jalc, doi_org)
+    services = (('openalex', openalex.resolve_doi), 
+                ('crossref', crossref), 
+                ('datacite', datacite), 
+                ('jalc', jalc), 
+                ('doi_org', doi_org))
 
-    for service in services:
-        try:
-            return service(doi)
-        except:
-            logger.debug(f'Could not resolve <{doi}> with {service.__name__}')
+    executor = ThreadPoolExecutor(max_workers=len(services), 
+                                  thread_name_prefix='resolve_doi')
+    futures = [executor.submit(_call_provider, name, service, doi, timeout) for name, service in services]
+    end = time.monotonic() + deadline
+    try:
+        # walk through services by priority; lower ranked services
+        # keep working in the background while we wait for the better ones
+        pending = set(futures)
+        for (name, _), future in zip(services, futures):
+            while not future.done():
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                _, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not future.done():
+                logger.debug(f'Deadline exceeded while resolving <{doi}>')
+                break
+            try:
+                return future.result()
+            except Exception as e:
+                logger.debug(f'Could not resolve <{doi}> with {name}: {e}')
+    finally:
+        # do not block the caller on slow services
+        executor.shutdown(wait=False, cancel_futures=True)
 
     raise requests.HTTPError(f'Could not resolve DOI: <{doi}> at all.')
 
 
+class _Lookups:
+
+    """
+        Deduplicates identical API lookups, e.g., when the same
+        ORCID appears several times in one author list. Concurrent 
+        callers with the same arguments wait for the first one.
+    """
+
+    def __init__(self) -> None:
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(func: typing.Callable, args: tuple, kwargs: dict) -> tuple:
+        _kwargs = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) 
+                               for k, v in kwargs.items()))
+        return (func.__qualname__, args, _kwargs)
+
+    def __call__(self, func: typing.Callable, *args, **kwargs):
+        key = self._key(func, args, kwargs)
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+
 def get_author_affiliations(author: dict,
-                           orcid_token: str = None) -> typing.List[str]:
+                           orcid_token: str = None,
+                           openalex: OpenAlex = None,
+                           orcid: ORCID = None,
+                           lookup: _Lookups = None) -> typing.List[str]:
     """
         Get the affiliations of an author
     """
     affiliations = []
+    lookup = lookup or _Lookups()
     if 'openalex' in author:
-        openalex = OpenAlex()
+        openalex = openalex or OpenAlex()
         try:
             if isinstance(author['openalex'], list):
                 for author_id in author['openalex']:
-                    affiliations.append(openalex.get_author_affiliations(author_id))
+                    affiliations.append(lookup(openalex.get_author_affiliations, author_id))
             else:
-                affiliations.append(openalex.get_author_affiliations(author['openalex']))
+                affiliations.append(lookup(openalex.get_author_affiliations, author['openalex']))
         except Exception as e:
             logger.debug(f"Could not get affiliation from openalex <{author['openalex']}>: {e}")
     if 'orcid' in author:
-        orcid = ORCID(token=orcid_token)
+        orcid = orcid or ORCID(token=orcid_token)
         try:
-            affiliations += orcid.get_author_affiliations(author['orcid'])
+            affiliations += lookup(orcid.get_author_affiliations, author['orcid'])
         except Exception as e:
             logger.debug(f"Could not get affiliation from orcid <{author['orcid']}>: {e}")
     return list(set(affiliations))
 
 
+def _resolve_author(author: dict, 
+                    openalex: OpenAlex, 
+                    orcid: ORCID, 
+                    lookup: _Lookups) -> dict:
+    if 'orcid' in author:
+        orcid_id = clean_orcid(author['orcid'])
+        author['orcid'] = orcid_id
+        try:
+            openalex_id = lookup(openalex.get_author_by_orcid, orcid_id)['id'].replace('https://openalex.org/', '')
+            try:
+                author['openalex'].append(openalex_id)
+            except:
+                author['openalex'] = [openalex_id]
+        except requests.HTTPError:
+            pass
+    else:
+        try:
+            orcid_details = lookup(orcid.resolve_author,
+                                   name=author.get('name'),
+                                   family_name=author.get('family_name'),
+                                   given_name=author.get('given_name'),
+                                   affiliation=author.get('affiliations'))
+            if orcid_details:
+                author['orcid'] = orcid_details['orcid-id']
+                try:
+                    openalex_id = lookup(openalex.get_author_by_orcid, orcid_details['orcid-id'])['id'].replace('https://openalex.org/', '')
+                    try:
+                        author['openalex'].append(openalex_id)
+                    except:
+                        author['openalex'] = [openalex_id]
+                except requests.HTTPError:
+                    pass
+        except requests.HTTPError:
+            pass
+
+    if not 'affiliations' in author:
+        author['affiliations'] = get_author_affiliations(author, 
+                                                         openalex=openalex, 
+                                                         orcid=orcid, 
+                                                         lookup=lookup)
+    if author['affiliations'] is None or None in author['affiliations']:
+        _ = author.pop('affiliations')
+    return author
+
+
 def resolve_authors(authors_tmp: typing.List[dict], 
-                    orcid_token: str=None) -> typing.List[dict]:
+                    orcid_token: str=None,
+                    max_workers: int = AUTHOR_WORKERS) -> typing.List[dict]:
     """ 
         Try to get canonical IDs for authors 
         1. Check if there is an ORCID ID provided and try to get OpenAlex ID
         2. Try to query ORCID API to find author candidates
             Only adds ORCID ID to cases that are very sure
+
+        Authors are resolved concurrently (at most `max_workers` at a time),
+        identical lookups are only sent once.
     """
     openalex = OpenAlex()
+    # ORCID reads the token from the app config, so it has to be 
+    # created here and not in the worker threads
     orcid = ORCID(token=orcid_token)
-    for author in authors_tmp:
-        if 'orcid' in author:
-            orcid_id = clean_orcid(author['orcid'])
-            author['orcid'] = orcid_id
-            try:
-                openalex_id = openalex.get_author_by_orcid(orcid_id)['id'].replace('https://openalex.org/', '')
-                try:
-                    author['openalex'].append(openalex_id)
-                except:
-                    author['openalex'] = [openalex_id]
-            except requests.HTTPError:
-                pass
-        else:
-            try:
-                orcid_details = orcid.resolve_author(name=author.get('name'),
-                                                    family_name=author.get('family_name'),
-                                                    given_name=author.get('given_name'),
-                                                    affiliation=author.get('affiliations'))
-                if orcid_details:
-                    author['orcid'] = orcid_details['orcid-id']
-                    try:
-                        openalex_id = openalex.get_author_by_orcid(orcid_details['orcid-id'])['id'].replace('https://openalex.org/', '')
-                        try:
-                            author['openalex'].append(openalex_id)
-                        except:
-                            author['openalex'] = [openalex_id]
-                    except requests.HTTPError:
-                        pass
-            except requests.HTTPError:
-                pass
+    lookup = _Lookups()
+    if len(authors_tmp) < 2 or max_workers < 2:
+        for author in authors_tmp:
+            _resolve_author(author, openalex, orcid, lookup)
+        return authors_tmp
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(authors_tmp)),
+                            thread_name_prefix='resolve_authors') as executor:
+        futures = [executor.submit(_resolve_author, author, openalex, orcid, lookup) for author in authors_tmp]
+        for future in futures:
+            future.result()
 
-        if not 'affiliations' in author:
-            author['affiliations'] = get_author_affiliations(author, orcid_token=orcid_token)
-        if author['affiliations'] is None or None in author['affiliations']:
-            _ = author.pop('affiliations')
     return authors_tmp
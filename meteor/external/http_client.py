@@ -0,0 +1,379 @@
+"""
+    Shared HTTP layer for all external metadata lookups.
+
+    - keeps one pooled `requests.Session` per host
+    - caches responses on disk with a TTL per provider
+    - revalidates expired entries with ETag / Last-Modified
+    - remembers 404s for a while (negative caching)
+    - can run in cache-only mode (tests, offline imports)
+    - respects the rate limits of the providers
+
+    The cache directory (`HTTP_CACHE_DIR`) is pruned every `PRUNE_EVERY`
+    writes: entries that were not refreshed for `MAX_AGE` seconds are
+    deleted, then the oldest ones until at most `HTTP_CACHE_MAX_ENTRIES`
+    (default: 50000) are left.
+
+    Usage:
+
+        from meteor.external.http_client import http_client
+        r = http_client.get('https://api.crossref.org/works/' + doi)
+        r.raise_for_status()
+
+    The returned object is a regular `requests.Response`, no
+    matter whether it came from the network or from the cache.
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+import tempfile
+import threading
+import typing
+import urllib.parse
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# seconds
+DAY = 60 * 60 * 24
+
+PROVIDER_TTL = {
+    'crossref': 30 * DAY,
+    'datacite': 30 * DAY,
+    'jalc': 30 * DAY,
+    'doi_org': 30 * DAY,
+    'zenodo': 7 * DAY,
+    'openalex': 7 * DAY,
+    'orcid': 1 * DAY,
+    'cran': 1 * DAY,
+    'wikidata': 7 * DAY,
+    'nominatim': 30 * DAY,
+    'default': 1 * DAY
+}
+
+# how long a 404 is remembered
+NEGATIVE_TTL = 1 * DAY
+
+# expired entries are kept for revalidation, but not forever
+MAX_AGE = 2 * max(PROVIDER_TTL.values())
+MAX_ENTRIES = 50000
+PRUNE_EVERY = 1000
+
+HOST_PROVIDERS = {
+    'api.crossref.org': 'crossref',
+    'api.datacite.org': 'datacite',
+    'api.japanlinkcenter.org': 'jalc',
+    'doi.org': 'doi_org',
+    'zenodo.org': 'zenodo',
+    'api.openalex.org': 'openalex',
+    'pub.orcid.org': 'orcid',
+    'crandb.r-pkg.org': 'cran',
+    'www.wikidata.org': 'wikidata',
+    'nominatim.openstreetmap.org': 'nominatim',
+}
+
+# request headers that change the response and are part of the cache key
+VARY_HEADERS = ('Accept', )
+
+# maximum requests per second (polite pool limits of the providers)
+RATE_LIMITS = {
+    'openalex': 10,
+    'orcid': 12,
+    'crossref': 50,
+    'datacite': 10,
+    'zenodo': 2,
+    'wikidata': 5,
+    'nominatim': 1,
+}
+
+
+class CacheMissError(requests.HTTPError):
+    """
+        Raised in cache-only mode when a response is not in the cache.
+        Subclass of HTTPError, so callers treat it like a failed lookup.
+    """
+    pass
+
+
+class RateLimiter:
+
+    """
+        Spaces out requests to a host evenly, so we never exceed
+        `rate` requests per second. Thread-safe.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        # sleep outside the lock, other threads can reserve later slots
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class HTTPClient:
+
+    """
+        Pooled and cached HTTP GET requests
+    """
+
+    def __init__(self, app=None, cache_dir: str = None,
+                 enabled: bool = True, cache_only: bool = False,
+                 max_entries: int = MAX_ENTRIES):
+        self._sessions = {}
+        self._rate_limiters = {}
+        self._lock = threading.Lock()
+        self.cache_dir = Path(cache_dir or os.environ.get('HTTP_CACHE_DIR') or
+                              Path(tempfile.gettempdir()) / 'meteor-http-cache')
+        self.enabled = enabled
+        self.cache_only = cache_only or bool(os.environ.get('HTTP_CACHE_ONLY'))
+        self.max_entries = max_entries
+        self._writes = 0
+        self.app = app
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('HTTP_CACHE_DIR', str(self.cache_dir))
+        app.config.setdefault('HTTP_CACHE_ENABLED', self.enabled)
+        app.config.setdefault('HTTP_CACHE_ONLY', self.cache_only)
+        app.config.setdefault('HTTP_CACHE_MAX_ENTRIES', self.max_entries)
+        self.configure(cache_dir=app.config['HTTP_CACHE_DIR'],
+                       enabled=app.config['HTTP_CACHE_ENABLED'],
+                       cache_only=app.config['HTTP_CACHE_ONLY'],
+                       max_entries=app.config['HTTP_CACHE_MAX_ENTRIES'])
+
+    def configure(self, cache_dir: str = None, enabled: bool = None,
+                  cache_only: bool = None, max_entries: int = None) -> None:
+        if cache_dir is not None:
+            self.cache_dir = Path(cache_dir)
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if cache_only is not None:
+            self.cache_only = bool(cache_only)
+        if max_entries is not None:
+            self.max_entries = int(max_entries)
+
+    """ Sessions """
+
+    def session(self, host: str) -> requests.Session:
+        """ one session (with connection pool) per host """
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[host] = session
+            return self._sessions[host]
+
+    def rate_limiter(self, provider: str) -> typing.Union[RateLimiter, None]:
+        if provider not in RATE_LIMITS:
+            return None
+        with self._lock:
+            if provider not in self._rate_limiters:
+                self._rate_limiters[provider] = RateLimiter(RATE_LIMITS[provider])
+            return self._rate_limiters[provider]
+
+    def _request(self, host: str, provider: str, url: str, **kwargs) -> requests.Response:
+        limiter = self.rate_limiter(provider)
+        if limiter:
+            limiter.wait()
+        return self.session(host).get(url, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+    """ Cache Storage """
+
+    @staticmethod
+    def cache_key(url: str, params: dict = None, headers: dict = None) -> str:
+        if params:
+            url = url + '?' + urllib.parse.urlencode(sorted(params.items()), doseq=True)
+        key = [url]
+        if headers:
+            for h in VARY_HEADERS:
+                if h in headers:
+                    key.append(h + ':' + headers[h])
+        return hashlib.sha256('\n'.join(key).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / (key + '.json')
+
+    def _load(self, key: str) -> typing.Union[dict, None]:
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key: str, entry: dict) -> None:
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # write to temporary file first, so concurrent readers
+            # never see half written entries
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f'Could not write HTTP cache entry {path}: {e}')
+        with self._lock:
+            self._writes += 1
+            due = self._writes % PRUNE_EVERY == 0
+        if due:
+            self.prune()
+
+    def invalidate(self, url: str, params: dict = None, headers: dict = None) -> None:
+        try:
+            self._path(self.cache_key(url, params=params, headers=headers)).unlink()
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        """ delete all cached responses """
+        if not self.cache_dir.exists():
+            return
+        for path in self.cache_dir.glob('*/*.json'):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def prune(self, max_age: float = MAX_AGE) -> int:
+        """ 
+            delete entries that were not refreshed for `max_age` seconds
+            and the oldest ones above `max_entries`. Returns number of deleted files
+        """
+        if self.cache_only or not self.cache_dir.exists():
+            return 0
+        now = time.time()
+        entries = []
+        deleted = 0
+        for path in self.cache_dir.glob('*/*'):
+            try:
+                mtime = path.stat().st_mtime
+                # .tmp files are leftovers of interrupted writes
+                if now - mtime > max_age or (path.suffix == '.tmp' and now - mtime > 3600):
+                    path.unlink()
+                    deleted += 1
+                elif path.suffix == '.json':
+                    entries.append((mtime, path))
+            except OSError:
+                pass
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.max_entries, 0)]:
+            try:
+                path.unlink()
+                deleted += 1
+            except OSError:
+                pass
+        return deleted
+
+    """ Serialization """
+
+    @staticmethod
+    def _entry_from_response(r: requests.Response) -> dict:
+        return {'url': r.url,
+                'status_code': r.status_code,
+                'reason': r.reason,
+                'headers': dict(r.headers),
+                'encoding': r.encoding,
+                'content': base64.b64encode(r.content).decode('ascii'),
+                'stored': time.time()}
+
+    @staticmethod
+    def _response_from_entry(entry: dict) -> requests.Response:
+        r = requests.Response()
+        r.url = entry['url']
+        r.status_code = entry['status_code']
+        r.reason = entry.get('reason')
+        r.headers = CaseInsensitiveDict(entry['headers'])
+        r.encoding = entry.get('encoding')
+        r._content = base64.b64decode(entry['content'])
+        r.from_cache = True
+        return r
+
+    """ Requests """
+
+    @staticmethod
+    def provider(url: str) -> str:
+        return HOST_PROVIDERS.get(urllib.parse.urlsplit(url).hostname, 'default')
+
+    def ttl(self, provider: str, status_code: int) -> int:
+        if status_code == 404:
+            return NEGATIVE_TTL
+        return PROVIDER_TTL.get(provider, PROVIDER_TTL['default'])
+
+    def get(self, url: str, params: dict = None, headers: dict = None,
+            timeout: float = None, provider: str = None, ttl: int = None,
+            **kwargs) -> requests.Response:
+        """
+            Drop-in replacement for `requests.get`
+
+            `provider` determines the TTL (inferred from host if omitted),
+            `ttl` overrides it for this call.
+        """
+        host = urllib.parse.urlsplit(url).hostname
+        provider = provider or self.provider(url)
+
+        if not self.enabled:
+            return self._request(host, provider, url, params=params, headers=headers,
+                                 timeout=timeout, **kwargs)
+
+        key = self.cache_key(url, params=params, headers=headers)
+        entry = self._load(key)
+
+        if entry is not None:
+            max_age = ttl if ttl is not None else self.ttl(provider, entry['status_code'])
+            if self.cache_only or time.time() - entry['stored'] < max_age:
+                return self._response_from_entry(entry)
+        elif self.cache_only:
+            raise CacheMissError(f'Not in cache: {url} {params or ""}')
+
+        request_headers = dict(headers or {})
+        if entry is not None and entry['status_code'] == 200:
+            # conditional revalidation of stale entry
+            cached_headers = CaseInsensitiveDict(entry['headers'])
+            if 'ETag' in cached_headers:
+                request_headers['If-None-Match'] = cached_headers['ETag']
+            if 'Last-Modified' in cached_headers:
+                request_headers['If-Modified-Since'] = cached_headers['Last-Modified']
+
+        r = self._request(host, provider, url, params=params, headers=request_headers,
+                          timeout=timeout, **kwargs)
+        r.from_cache = False
+
+        if r.status_code == 304 and entry is not None:
+            entry['stored'] = time.time()
+            self._store(key, entry)
+            return self._response_from_entry(entry)
+
+        if r.status_code in (200, 404):
+            self._store(key, self._entry_from_response(r))
+
+        return r
+
+
+http_client = HTTPClient()
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return http_client.get(url, **kwargs)
@@ -1,6 +1,7 @@
 import typing
 import requests
 from thefuzz import fuzz
+from meteor.external.http_client import http_client
 
 class OpenAlex:
 
@@ -10,8 +11,8 @@ class OpenAlex:
     def __init__(self) -> None:
         pass
 
-    def resolve_doi(self, doi: str) -> dict:
-        r = requests.get(self.api + 'works/doi:' + doi, params=self.params)
+    def resolve_doi(self, doi: str, timeout: float = None) -> dict:
+        r = http_client.get(self.api + 'works/doi:' + doi, params=self.params, timeout=timeout)
         r.raise_for_status()
         j = r.json()
 
@@ -62,7 +63,7 @@ class OpenAlex:
 
     def get_author_name(self, author_id: str) -> dict:
         """ Retrieve the name of an author based on OpenAlex ID """
-        r = requests.get(self.api + 'people/' + author_id, params=self.params)
+        r = http_client.get(self.api + 'people/' + author_id, params=self.params)
         r.raise_for_status()
         j = r.json()
         result = {'openalex': author_id}
@@ -87,14 +88,14 @@ class OpenAlex:
         params = {"search": query
                   **self.params}
 
-        r = requests.get(self.api + 'authors/', params=params)
+        r = http_client.get(self.api + 'authors/', params=params)
 
         r.raise_for_status()
 
     def get_author_by_orcid(self, orcid: str) -> dict:
         """ Get OpenAlex Author information by providing an ORCID ID """
 
-        r = requests.get(self.api + 'authors/orcid:' + orcid, params=self.params)
+        r = http_client.get(self.api + 'authors/orcid:' + orcid, params=self.params)
         r.raise_for_status()
 
         return r.json()
@@ -104,7 +105,7 @@ class OpenAlex:
         
             Raises: HTTP Error, KeyError
         """
-        r = requests.get(self.api + 'people/' + author_id, params=self.params)
+        r = http_client.get(self.api + 'people/' + author_id, params=self.params)
         r.raise_for_status()
         j = r.json()
         return j['last_known_institution']['display_name']
@@ -1,3 +1,4 @@
 from .client import DGraph
 from .schema import Schema
-from .query import build_query_string
\ No newline at end of file
+from .query import build_query_string
+from .planner import QueryPlanner, QueryTooExpensive
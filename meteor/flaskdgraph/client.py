@@ -1,10 +1,13 @@
 from typing import Union
 import json
+import time
 from dateutil.parser import isoparse
-from flask import current_app, g
+from flask import current_app, g, has_app_context
 import pydgraph
 import logging
 from . import dql
+from .decoder import SchemaDecoder
+from meteor.misc.metrics import metrics, fingerprint, SIZE_BUCKETS
 
 class DGraph(object):
 
@@ -17,6 +20,8 @@ class DGraph(object):
     def __init__(self, app=None):
 
         self.logger = logging.getLogger(__name__)
+        self.slow_query_logger = logging.getLogger(__name__ + '.slow_queries')
+        self.decoder = SchemaDecoder()
 
         self.app = app
         if app is not None:
@@ -27,6 +32,11 @@ class DGraph(object):
         app.config.setdefault('DGRAPH_ENDPOINT', 'localhost:9080')
         app.config.setdefault('DGRAPH_CREDENTIALS', None)
         app.config.setdefault('DGRAPH_OPTIONS', None)
+        # 'auto' uses orjson if available, alternatively: 'json' or 'orjson'
+        app.config.setdefault('DGRAPH_JSON_BACKEND', 'auto')
+        self.decoder.backend = app.config['DGRAPH_JSON_BACKEND']
+        # log queries that take longer (in seconds); None = disabled
+        app.config.setdefault('DGRAPH_SLOW_QUERY_THRESHOLD', None)
         app.teardown_appcontext(self.teardown)
 
     """ 
@@ -131,11 +141,61 @@ class DGraph(object):
         else:
             return ''
 
+    """
+        Instrumentation
+    """
+
+    def _record(self, operation: str, 
+                query_string: str, 
+                duration: float, 
+                response=None, 
+                error: bool = False) -> None:
+        """ 
+            collect latency, server latency and response size of a request
+            and count the DGraph calls of the current request 
+        """
+        query_fingerprint = fingerprint(query_string)
+        query_name = query_fingerprint.split(':')[0] if ':' in query_fingerprint else 'anonymous'
+        metrics.observe('dgraph_request_duration_seconds', duration, 
+                        operation=operation, query=query_name)
+        if error:
+            metrics.inc('dgraph_errors_total', operation=operation)
+        try:
+            metrics.observe('dgraph_server_duration_seconds', 
+                            response.latency.total_ns / 1e9, 
+                            operation=operation)
+        except AttributeError:
+            pass
+        try:
+            size = len(response.json)
+            metrics.observe('dgraph_response_bytes', size, buckets=SIZE_BUCKETS, operation=operation)
+        except (AttributeError, TypeError):
+            size = None
+
+        if not has_app_context():
+            return
+        g._dgraph_calls = g.get('_dgraph_calls', 0) + 1
+        threshold = current_app.config.get('DGRAPH_SLOW_QUERY_THRESHOLD')
+        if threshold is not None and duration >= float(threshold):
+            metrics.inc('dgraph_slow_queries_total', operation=operation)
+            self.slow_query_logger.warning(
+                f'Slow DGraph {operation} ({duration:.3f}s, {size} bytes) '
+                f'<{query_fingerprint}>: {query_string}')
+
     """    
         Generic Query Methods 
     """
 
-    def query(self, query_string: Union[dql.DQLQuery, str], variables: dict=None) -> dict:
+    def query(self, query_string: Union[dql.DQLQuery, str], 
+              variables: dict=None, 
+              raw: bool=False) -> Union[dict, bytes]:
+        """
+            Send a read-only query to DGraph.
+
+            Returns the decoded response, datetime predicates are
+            converted to `datetime` objects. With `raw=True` the 
+            undecoded JSON bytes are returned.
+        """
         # check if we got a DQLQuery Object
         try:
             variables = query_string.get_graphql_variables()
@@ -144,15 +204,22 @@ class DGraph(object):
             pass
 
         self.logger.debug(f"Sending dgraph query: {query_string}")
-        if variables is None:
-            res = self.connection.txn(read_only=True).query(query_string)
-        else:
-            self.logger.debug(f"Got the following variables {variables}")
-            res = self.connection.txn(read_only=True).query(
-                query_string, variables=variables)
+        start = time.perf_counter()
+        try:
+            if variables is None:
+                res = self.connection.txn(read_only=True).query(query_string)
+            else:
+                self.logger.debug(f"Got the following variables {variables}")
+                res = self.connection.txn(read_only=True).query(
+                    query_string, variables=variables)
+        except Exception:
+            self._record('query', query_string, time.perf_counter() - start, error=True)
+            raise
+        self._record('query', query_string, time.perf_counter() - start, response=res)
         self.logger.debug(f"Received response for dgraph query.")
-        data = json.loads(res.json, object_hook=self.datetime_hook)
-        return data
+        if raw:
+            return res.json
+        return self.decoder.decode(res.json)
 
     def get_uid(self, field: str, value: str, query_filter: list = None) -> Union[str, None]:
         value = str(value).strip()
@@ -220,6 +287,7 @@ class DGraph(object):
         #     raise TypeError()
 
         txn = self.connection.txn()
+        start = time.perf_counter()
 
         try:
             response = txn.mutate(set_obj=data)
@@ -230,6 +298,9 @@ class DGraph(object):
         finally:
             txn.discard()
 
+        self._record('mutation', None, time.perf_counter() - start, 
+                     response=response, error=not response)
+
         if response:
             return response
         else:
@@ -287,6 +358,7 @@ class DGraph(object):
             cond=cond)
         request = txn.create_request(query=query, mutations=[
                                      mutation], commit_now=True)
+        start = time.perf_counter()
 
         try:
             response = txn.do_request(request)
@@ -296,6 +368,9 @@ class DGraph(object):
         finally:
             txn.discard()
 
+        self._record('upsert', query, time.perf_counter() - start, 
+                     response=response, error=not response)
+
         if response:
             self.logger.debug(f'Response: {response}')
             return response
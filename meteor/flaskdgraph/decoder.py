@@ -0,0 +1,125 @@
+"""
+    Schema aware JSON decoding of DGraph responses
+
+    Only values of predicates (and facets) that are declared as
+    `datetime` in the Schema are converted to `datetime` objects.
+    All other strings are left untouched.
+
+    Uses `orjson` if it is installed, otherwise the standard library.
+"""
+
+import typing as t
+import json
+from datetime import datetime
+from dateutil.parser import isoparse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def parse_datetime(s: str) -> t.Union[datetime, str]:
+    """ fast ISO parser with fallback to dateutil """
+    if not isinstance(s, str) or len(s) <= 4:
+        return s
+    try:
+        return datetime.fromisoformat(s)
+    except ValueError:
+        pass
+    try:
+        return isoparse(s)
+    except (ValueError, OverflowError):
+        return s
+
+
+class SchemaDecoder:
+
+    """
+        Decodes DGraph JSON responses and converts datetime predicates.
+
+        The list of datetime predicates is generated from the Schema
+        and refreshed automatically when new types are registered.
+    """
+
+    # predicates that are not declared in the Schema
+    extra_datetime_predicates = {'_account_status|timestamp'}
+
+    def __init__(self, backend: str = 'auto') -> None:
+        self.backend = backend
+        self._schema_size = None
+        self._datetime_keys = frozenset()
+        self._datetime_facets = frozenset()
+
+    @property
+    def use_orjson(self) -> bool:
+        if self.backend == 'json':
+            return False
+        if self.backend == 'orjson' and orjson is None:
+            raise ImportError('orjson backend requested, but orjson is not installed!')
+        return orjson is not None
+
+    def _refresh(self) -> None:
+        from .schema import Schema
+        from .dgraph_types import Facet
+        if self._schema_size == len(Schema.__predicates__):
+            return
+        datetime_keys = set(self.extra_datetime_predicates)
+        datetime_facets = set()
+        for predicate_name, predicate in Schema.__predicates__.items():
+            if 'datetime' in predicate.dgraph_predicate_type:
+                datetime_keys.add(predicate_name)
+            for facet in (getattr(predicate, 'facets', None) or {}).values():
+                if isinstance(facet, Facet) and facet.type is datetime:
+                    datetime_keys.add(f'{predicate_name}|{facet.key}')
+                    datetime_facets.add(facet.key)
+        self._datetime_keys = frozenset(datetime_keys)
+        self._datetime_facets = frozenset(datetime_facets)
+        self._schema_size = len(Schema.__predicates__)
+
+    @property
+    def datetime_keys(self) -> frozenset:
+        self._refresh()
+        return self._datetime_keys
+
+    def _is_datetime_key(self, key: str) -> bool:
+        if key in self._datetime_keys:
+            return True
+        # facets can also appear on reverse edges, e.g. `~_added_by|timestamp`
+        if '|' in key:
+            return key.rsplit('|', 1)[1] in self._datetime_facets
+        return False
+
+    @staticmethod
+    def _convert_value(value):
+        if isinstance(value, str):
+            return parse_datetime(value)
+        if isinstance(value, list):
+            return [parse_datetime(v) for v in value]
+        if isinstance(value, dict):
+            # facets of list predicates: {"0": value, "1": value}
+            return {k: parse_datetime(v) for k, v in value.items()}
+        return value
+
+    def object_hook(self, obj: dict) -> dict:
+        for key in obj:
+            if self._is_datetime_key(key):
+                obj[key] = self._convert_value(obj[key])
+        return obj
+
+    def _walk(self, obj):
+        if isinstance(obj, dict):
+            for key, value in obj.items():
+                if isinstance(value, (dict, list)) and not self._is_datetime_key(key):
+                    self._walk(value)
+            return self.object_hook(obj)
+        if isinstance(obj, list):
+            for item in obj:
+                self._walk(item)
+        return obj
+
+    def decode(self, data: t.Union[bytes, str]) -> dict:
+        self._refresh()
+        if self.use_orjson:
+            return self._walk(orjson.loads(data))
+        return json.loads(data, object_hook=self.object_hook)
@@ -5,10 +5,10 @@
     May later be used for automatic query building
 """
 
-from typing import Union, Any, Literal, get_args
+from typing import Union, Any, Literal, Iterator, get_args
 import datetime
 import json
-from copy import deepcopy
+from copy import copy, deepcopy
 
 # external utils
 from slugify import slugify
@@ -49,6 +49,8 @@ AvailableConnectors = Literal['AND', 'OR', 'NOT']
 
 class UID:
 
+    __slots__ = ('uid', 'facets')
+
     def __init__(self, uid, facets=None):
         self.uid = uid.strip()
         self.facets = facets
@@ -76,6 +78,8 @@ class UID:
 
 class NewID:
 
+    __slots__ = ('newid', 'facets', 'original_value')
+
     def __init__(self, newid=None, facets=None, suffix=None):
         if newid is None:
             newid = '_:newentry'
@@ -259,8 +263,8 @@ class Facet:
 
     @property
     def query_field(self) -> StringField:
-        self.render_kw.update(
-            {'data-entities': ",".join(Schema.__predicates_types__[self.predicate])})
+        self.render_kw = {**self.render_kw,
+                          'data-entities': ",".join(Schema.__predicates_types__[self.predicate])}
         if self.type == bool:
             return BooleanField(label=self.query_label, render_kw=self.render_kw)
         elif self.type == int:
@@ -416,6 +420,17 @@ class _PrimitivePredicate:
         cls_.predicate = key
         return cls_
 
+    def bind(self, dgraph_type: str) -> '_PrimitivePredicate':
+        """
+            Get a view of this predicate that is bound to a DGraph Type.
+            The view is a shallow copy, so all values are shared with the
+            definition. Treat them as read-only: per-request state
+            (e.g., `choices`) has to be assigned, not mutated in place.
+        """
+        bound = copy(self)
+        bound.bound_dgraph_type = dgraph_type
+        return bound
+
     @property
     def default(self):
         try:
@@ -530,12 +545,13 @@ class _PrimitivePredicate:
     def _prepare_query_field(self):
         # not a very elegant solution...
         # provides a hook for UI (JavaScript)
+        # `render_kw` is shared with other views of the predicate, replace it
         if isinstance(self, ReverseRelationship):
-            self.render_kw.update(
-                {'data-entities': ",".join(Schema.__reverse_predicates_types__[self.predicate])})
+            self.render_kw = {**self.render_kw,
+                              'data-entities': ",".join(Schema.__reverse_predicates_types__[self.predicate])}
         elif self.predicate:
-            self.render_kw.update(
-                {'data-entities': ",".join(Schema.__predicates_types__[self.predicate])})
+            self.render_kw = {**self.render_kw,
+                              'data-entities': ",".join(Schema.__predicates_types__[self.predicate])}
 
     @property
     def query_field(self) -> StringField:
@@ -682,6 +698,9 @@ class Scalar:
         Utility class for Single Values
     """
 
+    # many of them are created for every mutation
+    __slots__ = ('value', 'facets', 'year', 'month', 'day')
+
     def __init__(self, value: Any, facets: dict = None) -> None:
         if type(value) in [datetime.date, datetime.datetime]:
             self.year = value.year
@@ -728,6 +747,8 @@ class GeoScalar(Scalar):
         Currently only supports Point Locations
     """
 
+    __slots__ = ('geotype', 'coordinates', 'lon', 'lat')
+
     def __init__(self, geotype, coordinates, facets=None):
         self.geotype = geotype
         if isinstance(coordinates, (list, tuple)):
@@ -755,6 +776,8 @@ class Variable:
 
     """ Represents DGraph Query Variable """
 
+    __slots__ = ('var', 'predicate', 'val')
+
     def __init__(self, var, predicate, val=False):
         self.var = var
         self.predicate = predicate
@@ -1927,6 +1950,7 @@ class SingleRelationship(Predicate):
         else:
             self.choices = {}
             self.choices_tuples = {}
+            self.choices_dicts = []
             for dgraph_type in self.relationship_constraint:
                 self.choices_tuples[dgraph_type] = [
                     (c['uid'], c.get('name') or c.get('_unique_name')) for c in choices[dgraph_type.lower()]]
@@ -2075,7 +2099,33 @@ class ListRelationship(SingleRelationship):
 
 
 def _enquote(string) -> str:
-    return f'"{string}"'
+    # escapes quotes, backslashes and line breaks
+    return json.dumps(str(string), ensure_ascii=False)
+
+
+def _predicate_nquad(p) -> str:
+    # plain keys do not need a full Predicate object
+    if isinstance(p, _PrimitivePredicate):
+        return p.nquad
+    p = str(p)
+    if p == '*':
+        return '*'
+    return f'<{p}>'
+
+
+def facets_nquad(facets: dict) -> str:
+    """ Facets of a statement, e.g.: `(kind="first", sequence=0)` """
+    _facets = []
+    for key, val in facets.items():
+        if isinstance(val, list):
+            val = val[0]
+        if isinstance(val, (datetime.date, datetime.datetime)):
+            _facets.append(f'{key}={val.isoformat()}')
+        elif isinstance(val, (int, float)):
+            _facets.append(f'{key}={val}')
+        else:
+            _facets.append(f'{key}={_enquote(val)}')
+    return f'({", ".join(_facets)})'
 
 
 def make_nquad(s, p, o) -> str:
@@ -2084,50 +2134,33 @@ def make_nquad(s, p, o) -> str:
     if not isinstance(s, (UID, NewID, Variable)):
         s = NewID(newid=s)
 
-    if not isinstance(p, Predicate):
-        p = Predicate.from_key(p)
-
     if not isinstance(o, (list, set, Scalar, Variable, UID, NewID)):
         o = Scalar(o)
 
-    nquad_string = f'{s.nquad} {p.nquad} {o.nquad}'
-
-    if hasattr(o, "facets"):
-        if o.facets is not None:
-            facets = []
-            for key, val in o.facets.items():
-                if isinstance(val, list):
-                    val = val[0]
-                if isinstance(val, (datetime.date, datetime.datetime)):
-                    facets.append(f'{key}={val.isoformat()}')
-                elif isinstance(val, (int, float)):
-                    facets.append(f'{key}={val}')
-                else:
-                    facets.append(f'{key}={_enquote(val)}')
-            nquad_string += f' ({", ".join(facets)})'
+    facets = getattr(o, "facets", None)
+    if facets is not None:
+        return f'{s.nquad} {_predicate_nquad(p)} {o.nquad} {facets_nquad(facets)} .'
 
-    nquad_string += ' .'
-    return nquad_string
+    return f'{s.nquad} {_predicate_nquad(p)} {o.nquad} .'
 
 
-def dict_to_nquad(d: dict) -> list:
+def iter_nquads(d: dict) -> Iterator[str]:
+    """ Generates nquad statements for a dict, one by one """
     if d.get('uid'):
         uid = d['uid']
     else:
         uid = NewID()
-    nquads = []
     for key, val in d.items():
         if val is None:
             continue
         if key == 'uid':
             continue
-        if not isinstance(key, Predicate):
-            key = Predicate.from_key(key)
         if isinstance(val, (list, set)):
-            if len(val) > 0:
-                for item in val:
-                    nquads.append(make_nquad(uid, key, item))
+            for item in val:
+                yield make_nquad(uid, key, item)
         else:
-            nquads.append(make_nquad(uid, key, val))
+            yield make_nquad(uid, key, val)
+
 
-    return nquads
+def dict_to_nquad(d: dict) -> list:
+    return list(iter_nquads(d))
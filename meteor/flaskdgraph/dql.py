@@ -279,6 +279,10 @@ class QueryBlock:
             for f in query_filter:
                 if isinstance(f.value, GraphQLVariable):
                     self.graphql_variables[f.value.name] = f.value
+                elif isinstance(f.value, list):
+                    for v in f.value:
+                        if isinstance(v, GraphQLVariable):
+                            self.graphql_variables[v.name] = v
                 try:
                     if isinstance(f.value2, GraphQLVariable):
                         self.graphql_variables[f.value2.name] = f.value
@@ -0,0 +1,184 @@
+"""
+    Incremental N-Quad serialization
+
+    Instead of collecting lists of nquad strings and joining them,
+    statements are written one by one into a buffer (or any file like
+    object, e.g., a gzipped RDF file for `dgraph live`).
+
+        writer = NQuadWriter()
+        writer.write_dict(sanitizer.entry)
+        writer.write(UID('0x123'), 'name', 'Der Standard')
+        set_nquads = writer.getvalue()
+
+    Objects in the JSON format of DGraph (as used with `set_obj`) are
+    converted as well, which is faster than sending JSON mutations:
+
+        for chunk in chunk_nquads(objects, max_bytes=4 * 1024 * 1024, format='json'):
+            txn.mutate(set_nquads=chunk)
+
+    Blank nodes (`_:name`) are only valid within one request. Chunks never
+    split an object, but references to blank nodes of earlier chunks have to
+    be replaced with the uids that DGraph assigned to them.
+"""
+
+import io
+import json
+import secrets
+import datetime
+import itertools
+import typing as t
+
+from .dgraph_types import facets_nquad, iter_nquads, make_nquad
+
+
+def literal(value: t.Any) -> str:
+    """ Quoted and escaped N-Quad literal """
+    if isinstance(value, bool):
+        value = str(value).lower()
+    elif isinstance(value, (datetime.date, datetime.datetime)):
+        value = value.isoformat()
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def _size(nquad: str) -> int:
+    if nquad.isascii():
+        return len(nquad)
+    return len(nquad.encode('utf-8'))
+
+
+class NQuadWriter:
+
+    """
+        Writes N-Quad statements one by one.
+
+        `out`: file like object for text, defaults to an in-memory buffer
+        `separator`: written between two statements
+    """
+
+    def __init__(self, out: t.TextIO = None, separator: str = ' \n') -> None:
+        self.out = out if out is not None else io.StringIO()
+        self.separator = separator
+        # number of statements and bytes (UTF-8) written so far
+        self.statements = 0
+        self.size = 0
+        # names for objects without uid
+        self._prefix = secrets.token_hex(3)
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return self.statements
+
+    def write_statement(self, nquad: str) -> None:
+        if self.statements > 0:
+            self.out.write(self.separator)
+            self.size += len(self.separator)
+        self.out.write(nquad)
+        self.statements += 1
+        self.size += _size(nquad)
+
+    def write(self, s, p, o) -> None:
+        """ Write a single statement, same arguments as `make_nquad` """
+        self.write_statement(make_nquad(s, p, o))
+
+    def write_dict(self, d: dict) -> None:
+        """ Write a dict with DGraph objects (e.g., `Sanitizer.entry`) """
+        for nquad in iter_nquads(d):
+            self.write_statement(nquad)
+
+    def write_json(self, obj: t.Union[dict, list]) -> None:
+        """ Write an object in the JSON format of DGraph mutations """
+        for nquad in self.iter_json(obj):
+            self.write_statement(nquad)
+
+    def getvalue(self) -> str:
+        return self.out.getvalue()
+
+    """ JSON Objects """
+
+    def _subject(self, obj: dict) -> str:
+        uid = obj.get('uid')
+        if uid is None:
+            return f'_:{self._prefix}_{next(self._counter)}'
+        uid = str(uid)
+        if uid.startswith('_:') or uid.startswith('uid('):
+            return uid
+        return f'<{uid}>'
+
+    def iter_json(self, obj: t.Union[dict, list]) -> t.Iterator[str]:
+        """ Generates nquads for an object (or list of objects) in DGraph's JSON format """
+        if isinstance(obj, list):
+            for item in obj:
+                yield from self.iter_json(item)
+            return
+        yield from self._iter_json(obj, self._subject(obj))
+
+    def _iter_json(self, obj: dict, subject: str) -> t.Iterator[str]:
+        # facets are declared as `predicate|facet`
+        facets = {}
+        for key, val in obj.items():
+            if '|' in key:
+                predicate, facet = key.split('|', 1)
+                facets.setdefault(predicate, {})[facet] = val
+
+        for key, val in obj.items():
+            if key == 'uid' or '|' in key or val is None:
+                continue
+            predicate = f'<{key}>'
+            if isinstance(val, list):
+                for i, item in enumerate(val):
+                    item_facets = {k: v[str(i)] for k, v in facets.get(key, {}).items()
+                                   if isinstance(v, dict) and str(i) in v}
+                    yield from self._iter_json_value(subject, key, predicate, item, item_facets)
+            else:
+                yield from self._iter_json_value(subject, key, predicate, val, facets.get(key))
+
+    def _iter_json_value(self, subject: str, key: str, predicate: str,
+                         val: t.Any, facets: dict = None) -> t.Iterator[str]:
+        if isinstance(val, dict) and not _is_geo(val):
+            # edge to another node, facets are declared in the node
+            child = self._subject(val)
+            edge_facets = {k.split('|', 1)[1]: v for k, v in val.items()
+                           if k.startswith(key + '|')}
+            yield _statement(subject, predicate, child, edge_facets)
+            yield from self._iter_json(val, child)
+        elif isinstance(val, dict):
+            yield _statement(subject, predicate,
+                             literal(json.dumps(val)) + '^^<geo:geojson>', facets)
+        else:
+            yield _statement(subject, predicate, literal(val), facets)
+
+
+def _is_geo(val: dict) -> bool:
+    return 'uid' not in val and 'type' in val and 'coordinates' in val
+
+
+def _statement(s: str, p: str, o: str, facets: dict = None) -> str:
+    if facets:
+        return f'{s} {p} {o} {facets_nquad(facets)} .'
+    return f'{s} {p} {o} .'
+
+
+def chunk_nquads(objects: t.Iterable, max_bytes: int = 4 * 1024 * 1024,
+                 format: str = 'dict') -> t.Iterator[str]:
+    """
+        Serialize objects into chunks of at most `max_bytes`.
+        An object is never split, so a single object larger than
+        `max_bytes` becomes its own chunk.
+
+        `format`: `'dict'` for dicts with DGraph objects (see `dict_to_nquad`),
+        `'json'` for objects in DGraph's JSON format
+    """
+    writer = NQuadWriter()
+    for obj in objects:
+        if format == 'json':
+            nquads = list(writer.iter_json(obj))
+        else:
+            nquads = list(iter_nquads(obj))
+        size = sum(_size(nquad) + len(writer.separator) for nquad in nquads)
+        if writer.statements > 0 and writer.size + size > max_bytes:
+            yield writer.getvalue()
+            writer = NQuadWriter()
+        for nquad in nquads:
+            writer.write_statement(nquad)
+    if writer.statements > 0:
+        yield writer.getvalue()
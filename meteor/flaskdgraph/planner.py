@@ -0,0 +1,213 @@
+"""
+    Query planner for `build_query_string`
+
+    Without a planner, queries built from user parameters start at
+    `has(dgraph.type)` and apply all filters to every node in the
+    database. The planner picks the most selective indexed filter
+    as root function instead:
+
+    - `type(...)` if exactly one DGraph type is requested
+    - `eq(predicate, [...])` for choices with a hash or exact index
+    - the reverse edges of the requested uids for relationships
+        with `@reverse` (e.g., `country`: all entries pointing to Austria)
+
+    Filters stay untouched, the root only has to be a superset of
+    the results. Cardinalities of the candidates are counted in DGraph
+    (one query for all candidates) and cached for `QUERY_STATS_TTL`
+    seconds (default: 3600). Root functions contain values from the
+    request, so only the `max_stats` most recently used are kept.
+
+    The planner also estimates the cost of a query (nodes at the root
+    times the weight of all filter functions). Queries over
+    `QUERY_COST_BUDGET` are downgraded (e.g., the regular expression
+    in the free text search is dropped) or rejected with `QueryTooExpensive`.
+    Downgrades are recorded in `g._query_downgraded`, so routes can
+    tell the client.
+"""
+
+import re
+import time
+import threading
+import collections
+import typing as t
+
+from flask import current_app, g
+
+from .utils import strip_query, validate_uid
+
+
+class QueryTooExpensive(ValueError):
+    pass
+
+
+class Root(t.NamedTuple):
+    """ candidate for the root function of a query """
+    func: str
+    stats: str
+    var_block: str = ''
+
+
+ALL_NODES = Root('has(dgraph.type)', 'func: has(dgraph.type)) { count(uid) }')
+
+# relative costs of filter functions, per node
+FILTER_WEIGHTS = {'regexp': 50, 'alloftext': 5, 'anyoftext': 5,
+                  'allofterms': 2, 'anyofterms': 2, 'match': 20,
+                  'between': 2, 'ge': 2, 'le': 2, 'gt': 2, 'lt': 2,
+                  'eq': 1, 'uid_in': 1, 'has': 1, 'type': 1}
+
+CASCADE_FACTOR = 2
+
+REGEX_FILTER_FUNCS = re.compile(r'\b(' + '|'.join(FILTER_WEIGHTS) + r')\(')
+
+# `eq` at the root needs one of these tokenizers
+REGEX_EQ_INDEX = re.compile(r'@index\(.*\b(hash|exact)\b')
+
+
+def type_root(dgraph_type: str) -> Root:
+    return Root(f'type({dgraph_type})', f'func: type({dgraph_type})) {{ count(uid) }}')
+
+
+def eq_root(predicate: str, values: t.List[str]) -> Root:
+    values = ", ".join([f'"{v}"' for v in values])
+    func = f'eq({predicate}, [{values}])'
+    return Root(func, f'func: {func}) {{ count(uid) }}')
+
+
+def reverse_root(predicates: t.List[str], uids: t.List[str]) -> Root:
+    """ all nodes that point to `uids` via one of the `predicates` """
+    uids = ", ".join(uids)
+    variables = [f"planner_root{i}" for i in range(len(predicates))]
+    edges = " ".join([f"{v} as ~{p}" for v, p in zip(variables, predicates)])
+    counts = " ".join([f"count(~{p})" for p in predicates])
+    return Root(f'uid({", ".join(variables)})',
+                f'func: uid({uids})) {{ {counts} }}',
+                f'var(func: uid({uids})) {{ {edges} }}')
+
+
+def root_candidates(predicate, vals: t.Union[str, list],
+                    operator: str = None, connector: str = None) -> t.List[Root]:
+    """
+        Indexed root functions that return a superset of the
+        entries matching the filter of `predicate`
+    """
+    from .dgraph_types import SingleChoice, SingleRelationship, MutualRelationship
+
+    if vals is None or operator is not None:
+        return []
+    if not isinstance(vals, list):
+        vals = [vals]
+    connector = connector or predicate.default_connector
+
+    directives = predicate.dgraph_directives or []
+
+    if isinstance(predicate, (SingleRelationship, MutualRelationship)):
+        if '@reverse' not in directives:
+            return []
+        uids = [validate_uid(v) for v in vals if validate_uid(v)]
+        if len(uids) == 0:
+            return []
+        predicates = [predicate.predicate] + (predicate.predicate_alias or [])
+        if connector == 'AND':
+            return [reverse_root(predicates, [uid]) for uid in uids]
+        return [reverse_root(predicates, uids)]
+
+    indexed = any(REGEX_EQ_INDEX.match(d) for d in directives)
+    if isinstance(predicate, SingleChoice) and indexed and not predicate.predicate_alias:
+        vals = [strip_query(str(v)) for v in vals]
+        if connector == 'AND':
+            return [eq_root(predicate.predicate, [v]) for v in vals]
+        return [eq_root(predicate.predicate, vals)]
+
+    return []
+
+
+def filter_weight(filters: str) -> int:
+    return sum(FILTER_WEIGHTS[func] for func in REGEX_FILTER_FUNCS.findall(filters))
+
+
+class Plan(t.NamedTuple):
+    root: Root
+    filters: t.List[str]
+    cost: float
+    downgraded: bool = False
+
+
+class QueryPlanner:
+
+    def __init__(self, client=None, ttl: int = 3600, budget: float = 10_000_000,
+                 max_stats: int = 10000) -> None:
+        self.client = client
+        self.ttl = ttl
+        self.budget = budget
+        self.max_stats = max_stats
+        self._stats = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def cardinalities(self, roots: t.List[Root]) -> t.Dict[str, int]:
+        """ number of nodes for each root function (cached) """
+        ttl = current_app.config.get('QUERY_STATS_TTL', self.ttl)
+        now = time.monotonic()
+        result = {}
+        missing = []
+        with self._lock:
+            for root in roots:
+                cached = self._stats.get(root.stats)
+                if cached is not None and now - cached[1] < ttl:
+                    result[root.stats] = cached[0]
+                    self._stats.move_to_end(root.stats)
+                elif root not in missing:
+                    missing.append(root)
+        if missing:
+            query_string = '{ ' + " ".join([f's{i}({root.stats}' for i, root in enumerate(missing)]) + ' }'
+            data = self.client.query(query_string)
+            with self._lock:
+                for i, root in enumerate(missing):
+                    count = sum(v for item in data.get(f's{i}', [])
+                                for v in item.values() if isinstance(v, int))
+                    self._stats[root.stats] = (count, now)
+                    self._stats.move_to_end(root.stats)
+                    result[root.stats] = count
+                while len(self._stats) > self.max_stats:
+                    self._stats.popitem(last=False)
+        return result
+
+    def estimate(self, cardinality: int, filters: t.List[str], cascade: bool = False) -> float:
+        cost = cardinality * (1 + filter_weight(" ".join(filters)))
+        if cascade:
+            cost *= CASCADE_FACTOR
+        return cost
+
+    def plan(self, candidates: t.List[Root], filters: t.List[str],
+             cascade: bool = False, downgrades: t.Dict[str, str] = None) -> Plan:
+        """
+            Choose the root with the fewest nodes.
+
+            `downgrades` maps expensive filters to cheaper alternatives
+            that are used if the query is over budget.
+        """
+        budget = current_app.config.get('QUERY_COST_BUDGET', self.budget)
+        try:
+            stats = self.cardinalities([ALL_NODES] + candidates)
+        except Exception as e:
+            current_app.logger.warning(f'Could not get query statistics: {e}')
+            return Plan(ALL_NODES, filters, 0)
+
+        root = min([ALL_NODES] + candidates, key=lambda r: stats[r.stats])
+        cost = self.estimate(stats[root.stats], filters, cascade=cascade)
+        if cost <= budget:
+            return Plan(root, filters, cost)
+
+        downgrades = downgrades or {}
+        cheaper = [downgrades.get(f, f) for f in filters]
+        cheaper_cost = self.estimate(stats[root.stats], cheaper, cascade=cascade)
+        if cheaper != filters and cheaper_cost <= budget:
+            current_app.logger.info(f'Downgraded query (estimated cost: {cost:.0f} -> {cheaper_cost:.0f})')
+            g._query_downgraded = True
+            return Plan(root, cheaper, cheaper_cost, downgraded=True)
+
+        raise QueryTooExpensive(f'Query is too expensive (estimated cost: {cost:.0f}, budget: {budget:.0f}). '
+                                'Please add more specific filters, e.g., a type or a country.')
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
@@ -1,13 +1,15 @@
 from .schema import Schema
+from .planner import QueryPlanner, ALL_NODES, type_root, eq_root, root_candidates
 
 from wtforms import SubmitField, SelectField, StringField, RadioField
 from flask_wtf import FlaskForm
 from .customformfields import TomSelectMultipleField
 
 from copy import deepcopy
+import re
 
 
-def build_query_string(query: dict, public=True, count=False) -> str:
+def build_query_string(query: dict, public=True, count=False, planner: QueryPlanner = None) -> str:
     """
         Construct a query string from a dictionary of filters.
         Returns a dql query string with either: `total` or `q`
@@ -27,6 +29,10 @@ def build_query_string(query: dict, public=True, count=False) -> str:
         default comparator is eq or uid_in
         checking for equality
 
+        With a `planner` the query starts at the most selective indexed
+        filter instead of `has(dgraph.type)` (see `planner.py`).
+        Raises `QueryTooExpensive` if the query is over budget.
+
     """
 
     from meteor.flaskdgraph.dgraph_types import Facet, MutualRelationship, SingleRelationship
@@ -54,6 +60,9 @@ def build_query_string(query: dict, public=True, count=False) -> str:
     # special treatment for free text search
     # maybe incorporate searchable predicates in Schema someday...
     filters = []
+    # root functions for the planner, and cheaper alternatives for filters
+    candidates = []
+    downgrades = {}
     try:
         search_terms = query.pop('_terms')
         if isinstance(search_terms, list):
@@ -72,6 +81,8 @@ def build_query_string(query: dict, public=True, count=False) -> str:
                             anyofterms(_authors_fallback, $searchTerms) OR 
                             eq(doi, $searchTerms) OR 
                             eq(arxiv, $searchTerms))""")
+            # regular expressions cannot use an index
+            downgrades[filters[-1]] = re.sub(r'regexp\(name, /\$searchTerms/i\) OR\s*', '', filters[-1])
 
         variables = {'$searchTerms': search_terms}
 
@@ -90,6 +101,9 @@ def build_query_string(query: dict, public=True, count=False) -> str:
             [f'type("{dt}")' for dt in dgraph_type if not Schema.is_private(dt)])
         if type_filter:
             filters.append(f'({type_filter})')
+        public_types = [dt for dt in dgraph_type if not Schema.is_private(dt)]
+        if len(public_types) == 1:
+            candidates.append(type_root(public_types[0]))
     except KeyError:
         dgraph_type = None
 
@@ -139,6 +153,7 @@ def build_query_string(query: dict, public=True, count=False) -> str:
 
     if public:
         filters.append('eq(entry_review_status, "accepted")')
+        candidates.append(eq_root('entry_review_status', ['accepted']))
 
     for predicate, val in cleaned_query.items():
         # get predicate from Schema
@@ -166,6 +181,7 @@ def build_query_string(query: dict, public=True, count=False) -> str:
             predicate_filter = f'({predicate_filter})'
 
         filters.append(predicate_filter)
+        candidates += root_candidates(predicate, val, operator=operator, connector=connector)
 
         facet_filter = []
         facet_list = []
@@ -195,6 +211,13 @@ def build_query_string(query: dict, public=True, count=False) -> str:
             query_parts.append(
                 f'{predicate.query} {facet_filter} {facet_list}'.strip())
 
+    root = ALL_NODES
+    if planner is not None:
+        plan = planner.plan(candidates, filters,
+                            cascade=len(facets.keys()) > 0,
+                            downgrades=downgrades)
+        root, filters = plan.root, plan.filters
+
     filters = " AND ".join(filters)
 
     # make sure these default predicates are always queried
@@ -224,7 +247,8 @@ def build_query_string(query: dict, public=True, count=False) -> str:
         query_string = f"""
             {variables_declaration}
             {{
-            total(func: has(dgraph.type)) 
+            {root.var_block}
+            total(func: {root.func}) 
                 @filter({filters}) {cascade} {{
                     {" ".join(query_parts_total)}
                 }}
@@ -234,7 +258,8 @@ def build_query_string(query: dict, public=True, count=False) -> str:
         query_string = f"""
             {variables_declaration}
             {{
-            q(func: has(dgraph.type), orderasc: name, first: {max_results}, offset: {page * max_results}) 
+            {root.var_block}
+            q(func: {root.func}, orderasc: name, first: {max_results}, offset: {page * max_results}) 
                 @filter({filters}) {cascade} {{
                     {" ".join(query_parts)}
                 }}
@@ -1,6 +1,12 @@
 import typing as t
-from copy import deepcopy
+from copy import copy
 import json
+import os
+import sys
+import hashlib
+import pickle
+import logging
+from pathlib import Path
 from datetime import datetime
 from flask_wtf import FlaskForm
 from wtforms import SubmitField
@@ -9,6 +15,21 @@ from wtforms import IntegerField
 from meteor.users.constants import USER_ROLES
 from inspect import cleandoc
 
+logger = logging.getLogger(__name__)
+
+# path to a precomputed schema (see `Schema.build_artifact`)
+SCHEMA_ARTIFACT_ENV = 'METEOR_SCHEMA_ARTIFACT'
+SCHEMA_ARTIFACT_VERSION = 1
+
+_REGISTRIES = ('__types__', '__types_meta__', '__predicates_types__',
+               '__reverse_predicates_types__', '__inheritance__',
+               '__perm_registry_new__', '__perm_registry_edit__',
+               '__predicates__', '__relationship_predicates__',
+               '__reverse_relationships__',
+               '__explicit_reverse_relationship_predicates__',
+               '__queryable_predicates__', '__queryable_predicates_by_type__',
+               '__private_types__')
+
 class Schema:
 
     # TODO: run consititency check. Currently one predicate declaration 
@@ -60,8 +81,16 @@ class Schema:
     # Flag to protect certain dgraph types to be exposed to API endpoints
     __private__ = False
 
+    # precomputed registries, see `Schema.load_artifact`
+    __artifact__ = None
+
     def __init_subclass__(cls) -> None:
 
+        # fast path: restore registries and bound predicates
+        # from a precomputed artifact
+        if Schema._restore_from_artifact(cls):
+            return
+
         from .dgraph_types import _PrimitivePredicate, Facet, Predicate, SingleRelationship, ReverseRelationship, MutualRelationship
         # all predicates associated with type
         predicates = {}
@@ -132,8 +161,8 @@ class Schema:
             attribute = getattr(cls, key)
             setattr(attribute, 'predicate', key)
 
-            cls_attribute = deepcopy(attribute)
-            setattr(cls_attribute, 'bound_dgraph_type', cls.__name__)
+            # bound views share their values with the definition
+            cls_attribute = attribute.bind(cls.__name__)
             setattr(cls, key, cls_attribute)
             if attribute.facets:
                 for facet in attribute.facets.values():
@@ -183,6 +212,121 @@ class Schema:
             # the generic constructor just assigns **kwargs as attributes
             cls.__init__ = _declarative_constructor
 
+    """ Precomputed Schema Artifact """
+
+    @staticmethod
+    def _artifact_sources(modules: t.Iterable[str]) -> dict:
+        """ sha1 of the source files that define the schema """
+        sources = {}
+        for name in sorted(set(modules)):
+            module = sys.modules.get(name)
+            path = getattr(module, '__file__', None)
+            if path is None:
+                continue
+            with open(path, 'rb') as f:
+                sources[name] = (path, hashlib.sha1(f.read()).hexdigest())
+        return sources
+
+    @classmethod
+    def build_artifact(cls, path: t.Union[str, Path]) -> dict:
+        """
+            Serialize all registries and bound predicates to `path`.
+            Import all DGraph Types (e.g., `meteor.main.model`) before
+            building the artifact.
+
+            Returns a summary of the artifact.
+        """
+        types = {}
+        modules = [__name__, cls.__module__]
+        for subclass in dict.fromkeys(_all_subclasses(Schema)):
+            name = subclass.__name__
+            if name not in Schema.__types__:
+                continue
+            attributes = {k: subclass.__dict__[k] for k in Schema.__types__[name]
+                          if k in subclass.__dict__}
+            types[name] = {'module': subclass.__module__,
+                           'qualname': subclass.__qualname__,
+                           'attributes': attributes}
+            modules.append(subclass.__module__)
+            modules += [type(v).__module__ for v in attributes.values()]
+
+        registries = {k: getattr(Schema, k) for k in _REGISTRIES}
+        payload = pickle.dumps({'registries': registries, 'types': types},
+                               protocol=pickle.HIGHEST_PROTOCOL)
+        artifact = {'version': SCHEMA_ARTIFACT_VERSION,
+                    'python': sys.version_info[:2],
+                    'sources': cls._artifact_sources(modules),
+                    'types': {k: (v['module'], v['qualname']) for k, v in types.items()},
+                    'payload': payload}
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return {'path': str(path), 'types': len(types), 'bytes': path.stat().st_size}
+
+    @classmethod
+    def load_artifact(cls, path: t.Union[str, Path]) -> bool:
+        """
+            Load an artifact created with `Schema.build_artifact`. Has
+            to be called before the DGraph Types are imported.
+            Stale artifacts (source files changed, other python version)
+            are ignored and the schema is built as usual.
+
+            Artifacts are pickled, only load files you built yourself!
+        """
+        try:
+            with open(path, 'rb') as f:
+                artifact = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f'Could not read schema artifact <{path}>: {e}')
+            return False
+        if artifact.get('version') != SCHEMA_ARTIFACT_VERSION or tuple(artifact.get('python', ())) != sys.version_info[:2]:
+            logger.warning(f'Schema artifact <{path}> was built with another version, ignoring it.')
+            return False
+        for name, (source, digest) in artifact['sources'].items():
+            try:
+                with open(source, 'rb') as f:
+                    current = hashlib.sha1(f.read()).hexdigest()
+            except OSError:
+                current = None
+            if current != digest:
+                logger.warning(f'Schema artifact <{path}> is stale ({name} changed), ignoring it.')
+                return False
+        artifact['applied'] = False
+        Schema.__artifact__ = artifact
+        return True
+
+    @staticmethod
+    def _restore_from_artifact(cls) -> bool:
+        artifact = Schema.__artifact__
+        if artifact is None:
+            return False
+        if artifact['types'].get(cls.__name__) != (cls.__module__, cls.__qualname__):
+            return False
+        if not artifact['applied']:
+            if any(getattr(Schema, k) for k in _REGISTRIES):
+                # some types are registered already, the artifact
+                # would overwrite them
+                logger.warning('Schema registries are not empty, ignoring schema artifact.')
+                Schema.__artifact__ = None
+                return False
+            # unpickle on first use: the payload references
+            # predicate classes that are not importable before
+            data = pickle.loads(artifact['payload'])
+            for k, registry in data['registries'].items():
+                if isinstance(registry, list):
+                    getattr(Schema, k).extend(registry)
+                else:
+                    getattr(Schema, k).update(registry)
+            artifact['data'] = data
+            artifact['applied'] = True
+
+        for key, val in artifact['data']['types'][cls.__name__]['attributes'].items():
+            setattr(cls, key, val)
+        if getattr(cls, "__init__", object.__init__) is object.__init__:
+            cls.__init__ = _declarative_constructor
+        return True
+
     """ ORM Methods """
     @staticmethod
     def _normalize_dict_vals(val):
@@ -262,12 +406,13 @@ class Schema:
     def get_predicates(cls, _cls) -> dict:
         """
             Get all predicates of a DGraph Type
-            Returns a deepcopy dict of `{'predicate_name': <DGraph Predicate>}`
+            Returns a dict of `{'predicate_name': <DGraph Predicate>}` with
+            shallow copies of the predicates (see `_PrimitivePredicate.bind`)
             `Schema.get_predicates('NewsSource')` -> {'name': <DGraph Predicate "name"> ...}
         """
         if not isinstance(_cls, str):
             _cls = _cls.__name__
-        return deepcopy(cls.__types__[_cls])
+        return _copy_predicates(cls.__types__[_cls])
 
     @classmethod
     def get_relationships(cls, _cls) -> dict:
@@ -310,7 +455,7 @@ class Schema:
         if not isinstance(_cls, str):
             _cls = _cls.__name__
         if _cls in cls.__explicit_reverse_relationship_predicates__:
-            return deepcopy(cls.__explicit_reverse_relationship_predicates__[_cls])
+            return _copy_predicates(cls.__explicit_reverse_relationship_predicates__[_cls])
         else:
             return None
 
@@ -325,20 +470,20 @@ class Schema:
             `FileFormat.predicates()` -> Only predicates for this DGraph Type
         """
         try:
-            predicates = deepcopy(cls.__types__[cls.__name__])
+            predicates = _copy_predicates(cls.__types__[cls.__name__])
         except KeyError:
-            predicates = deepcopy(cls.__predicates__)
+            predicates = _copy_predicates(cls.__predicates__)
 
         return predicates
 
     @classmethod
     def relationship_predicates(cls) -> dict:
-        return deepcopy(cls.__relationship_predicates__)
+        return {k: list(v) for k, v in cls.__relationship_predicates__.items()}
 
     @classmethod
     def reverse_predicates(cls) -> dict:
         if cls.__name__ in cls.__explicit_reverse_relationship_predicates__:
-            return deepcopy(cls.__explicit_reverse_relationship_predicates__[cls.__name__])
+            return _copy_predicates(cls.__explicit_reverse_relationship_predicates__[cls.__name__])
         else:
             return None
 
@@ -485,9 +630,9 @@ class Schema:
     def get_queryable_predicates(cls, _cls=None) -> dict:
         if _cls is None:
             try:
-                return deepcopy(cls.__queryable_predicates_by_type__[cls.__name__])
+                return _copy_predicates(cls.__queryable_predicates_by_type__[cls.__name__])
             except KeyError:
-                return deepcopy(cls.__queryable_predicates__)
+                return _copy_predicates(cls.__queryable_predicates__)
 
         if not isinstance(_cls, str):
             _cls = _cls.__name__
@@ -495,7 +640,7 @@ class Schema:
             _cls = cls.get_type(_cls)
 
         try:
-            return deepcopy(cls.__queryable_predicates_by_type__[_cls])
+            return _copy_predicates(cls.__queryable_predicates_by_type__[_cls])
         except KeyError:
             return {}
         
@@ -629,6 +774,24 @@ class Schema:
         return form
 
 
+def _copy_predicates(predicates: dict) -> dict:
+    # callers may assign per-request state (e.g., `choices`) to the
+    # predicates, shallow copies keep the registry clean
+    return {k: copy(v) for k, v in predicates.items()}
+
+
+def _all_subclasses(cls) -> list:
+    subclasses = []
+    for subclass in cls.__subclasses__():
+        subclasses.append(subclass)
+        subclasses += _all_subclasses(subclass)
+    return subclasses
+
+
+if os.environ.get(SCHEMA_ARTIFACT_ENV):
+    Schema.load_artifact(os.environ[SCHEMA_ARTIFACT_ENV])
+
+
 """ 
     Taken from SQL Alchemy ORM 
     Maybe we will keep this for implementing ORM style queries
@@ -1,5 +1,6 @@
 import re
-from typing import Any, Union
+import datetime
+from typing import Any, Union, Optional
 
 def strip_query(query: str) -> str:
     # Dgraph query strings have some weaknesses 
@@ -38,6 +39,19 @@ def validate_uid(uid: Any) -> Union[str, bool]:
     else:
         return False
 
+def as_datetime(value: Any) -> Optional[datetime.datetime]:
+    """
+        Coerce a DGraph datetime (decoded or ISO string) to a 
+        timezone aware datetime. Naive values are assumed to be UTC.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
 def restore_sequence(d: dict, sortkey = 'sequence') -> None:
     sortable_keys = list(filter(lambda x: x.endswith('|' + sortkey), d.keys()))
     for facet in sortable_keys:
@@ -55,4 +69,33 @@ def recursive_restore_sequence(l: list, sortkey = 'sequence') -> None:
         if type(item) == list:
             recursive_restore_sequence(item, sortkey=sortkey)
         if type(item) == dict:
-            restore_sequence(item, sortkey=sortkey)
\ No newline at end of file
+            restore_sequence(item, sortkey=sortkey)
+
+""" Helpers for raw (undecoded) DGraph responses """
+
+_TYPE_LIST = re.compile(rb'"(dgraph\.type|type)":\[([^\]]*)\]')
+
+def strip_dgraph_types(data: bytes, types: tuple = ('Entry', )) -> bytes:
+    """
+        Remove type names (e.g., "Entry") from all `dgraph.type` lists
+        in a raw DGraph JSON response. DQL cannot filter the values of
+        list predicates, so we do it on the bytes without decoding.
+    """
+    strip = {b'"' + t.encode('utf-8') + b'"' for t in types}
+
+    def _clean(match: re.Match) -> bytes:
+        values = [v for v in match.group(2).split(b',') if v not in strip]
+        return b'"' + match.group(1) + b'":[' + b','.join(values) + b']'
+
+    return _TYPE_LIST.sub(_clean, data)
+
+def extract_block(data: bytes, block: str = 'q') -> bytes:
+    """
+        Get the raw JSON array of a single query block:
+        `{"q":[...]}` -> `[...]`
+        Raises ValueError if the response has a different shape.
+    """
+    prefix = b'{"' + block.encode('utf-8') + b'":'
+    if not data.startswith(prefix) or not data.endswith(b'}'):
+        raise ValueError(f'Response does not consist of a single block <{block}>')
+    return data[len(prefix):-1]
@@ -1,6 +1,7 @@
 from meteor.flaskdgraph import Schema
 from meteor.flaskdgraph.dgraph_types import (UID, MutualRelationship, NewID, Predicate, ReverseRelationship, Scalar,
                                                      SingleRelationship, GeoScalar, Variable, make_nquad, dict_to_nquad)
+from meteor.flaskdgraph.nquads import NQuadWriter
 from meteor.flaskdgraph.utils import validate_uid
 from meteor.errors import InventoryValidationError, InventoryPermissionError
 from meteor.auxiliary import icu_codes
@@ -132,10 +133,11 @@ class Sanitizer:
         return cls(data, is_upsert=True, dgraph_type=dgraph_type, entry_review_status=entry_review_status, fields=edit_fields, **kwargs)
 
     def _set_nquads(self):
-        nquads = dict_to_nquad(self.entry)
+        writer = NQuadWriter()
+        writer.write_dict(self.entry)
         for related_news_sources in self.related_entries:
-            nquads += dict_to_nquad(related_news_sources)
-        self.set_nquads = " \n".join(nquads)
+            writer.write_dict(related_news_sources)
+        self.set_nquads = writer.getvalue()
 
     def _delete_nquads(self):
         if self.is_upsert:
@@ -160,8 +162,10 @@ class Sanitizer:
                     except KeyError:
                         pass
 
-            nquads = [" \n".join(dict_to_nquad(obj)) for obj in del_obj]
-            self.delete_nquads = " \n".join(nquads)
+            writer = NQuadWriter()
+            for obj in del_obj:
+                writer.write_dict(obj)
+            self.delete_nquads = writer.getvalue()
             if upsert_query != '':
                 self.upsert_query = upsert_query
             else:
@@ -0,0 +1,168 @@
+"""
+    Response compression
+
+    Compresses responses with brotli (if installed) or gzip, depending
+    on the `Accept-Encoding` header of the client. Small responses
+    (below `COMPRESS_MIN_SIZE` bytes, default: 1024) and types that are
+    already compressed (images, files) are sent as they are.
+    Streamed responses are compressed chunk by chunk, so the client
+    still receives the first bytes early.
+
+    `precompressed` keeps compressed versions of payloads that rarely
+    change (e.g., the OpenAPI document), so they are compressed only
+    once with the highest level.
+
+    Settings:
+        - `COMPRESS_ENABLED` (default: True)
+        - `COMPRESS_MIN_SIZE` (default: 1024)
+        - `COMPRESS_LEVEL` gzip level for dynamic responses (default: 6)
+        - `COMPRESS_BROTLI_QUALITY` brotli quality for dynamic responses (default: 4)
+"""
+
+import gzip
+import zlib
+import threading
+import collections
+import typing as t
+
+from flask import Flask, Response, current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = {'application/json', 'application/javascript', 'application/xml',
+                      'image/svg+xml', 'text/html', 'text/plain', 'text/css',
+                      'text/csv', 'text/xml', 'text/javascript'}
+
+
+def available_encodings() -> t.List[str]:
+    """ in order of preference """
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate() -> t.Optional[str]:
+    """ best encoding accepted by the client, `None` for uncompressed """
+    return request.accept_encodings.best_match(available_encodings())
+
+
+def compress(data: bytes, encoding: str, level: int = None) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=level if level is not None else 11)
+    return gzip.compress(data, compresslevel=level if level is not None else 9)
+
+
+def compress_stream(chunks: t.Iterable[t.Union[bytes, str]], encoding: str,
+                    level: int = None) -> t.Iterator[bytes]:
+    """ compress each chunk and flush, so the client can decode it right away """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level if level is not None else 4)
+        flush, finish = compressor.flush, compressor.finish
+        process = compressor.process
+    else:
+        compressor = zlib.compressobj(level if level is not None else 6, zlib.DEFLATED, 31)
+        flush, finish = (lambda: compressor.flush(zlib.Z_SYNC_FLUSH)), compressor.flush
+        process = compressor.compress
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = process(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def _mark_encoded(response: Response, encoding: str) -> None:
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # the compressed body is only semantically equivalent
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+class Compressor:
+
+    """ Compresses responses in `after_request` """
+
+    def init_app(self, app: Flask) -> None:
+        app.after_request(self.after_request)
+
+    @staticmethod
+    def compressible(response: Response) -> bool:
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        return response.mimetype in COMPRESSIBLE_TYPES
+
+    def after_request(self, response: Response) -> Response:
+        config = current_app.config
+        if not config.get('COMPRESS_ENABLED', True) or not self.compressible(response):
+            return response
+        # responses differ by encoding, even if this one is not compressed
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate()
+        if encoding is None:
+            return response
+        level = config.get('COMPRESS_BROTLI_QUALITY', 4) if encoding == 'br' else config.get('COMPRESS_LEVEL', 6)
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, level=level)
+            response.headers.pop('Content-Length', None)
+            _mark_encoded(response, encoding)
+            return response
+        data = response.get_data()
+        if len(data) < config.get('COMPRESS_MIN_SIZE', 1024):
+            return response
+        response.set_data(compress(data, encoding, level=level))
+        _mark_encoded(response, encoding)
+        return response
+
+
+class PrecompressedCache:
+
+    """
+        Compressed variants of hot payloads. `key` has to change
+        whenever the payload changes (e.g., a hash of the schema).
+    """
+
+    def __init__(self, maxsize: int = 32) -> None:
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: t.Hashable, encoding: t.Optional[str],
+            build: t.Callable[[], bytes]) -> bytes:
+        with self._lock:
+            variants = self._entries.get(key)
+            if variants is not None:
+                self._entries.move_to_end(key)
+        if variants is None:
+            variants = {None: build()}
+        if encoding not in variants:
+            variants[encoding] = compress(variants[None], encoding)
+        with self._lock:
+            self._entries[key] = variants
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return variants[encoding]
+
+    def response(self, key: t.Hashable, build: t.Callable[[], bytes],
+                 mimetype: str = 'application/json') -> Response:
+        encoding = negotiate() if current_app.config.get('COMPRESS_ENABLED', True) else None
+        response = current_app.response_class(self.get(key, encoding, build), mimetype=mimetype)
+        response.vary.add('Accept-Encoding')
+        if encoding is not None:
+            _mark_encoded(response, encoding)
+        return response
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+compressor = Compressor()
+precompressed = PrecompressedCache()
@@ -0,0 +1,94 @@
+"""
+    In-memory indexes over DGraph data
+
+    `LazyIndex` is the base for structures that are expensive to build
+    from DGraph, but cheap to update (e.g., random samples, ownership
+    networks, fuzzy name search). Each index is built on first use
+    (separately per key, e.g., per DGraph type) and rebuilt after `ttl`
+    seconds to pick up changes made by other processes.
+
+    Routes that write entries call `entry_changed(uid)` afterwards.
+    It updates all indexes (`LazyIndex.update`) and notifies other
+    caches that registered with `on_entry_changed`.
+"""
+
+import abc
+import time
+import threading
+import collections
+import typing as t
+
+from flask import current_app
+
+
+_subscribers = []
+
+
+def on_entry_changed(func: t.Callable[[str], None]) -> t.Callable[[str], None]:
+    """ call `func(uid)` whenever an entry was added, edited, reviewed or deleted """
+    _subscribers.append(func)
+    return func
+
+
+def entry_changed(uid: str) -> None:
+    """ post-write hook, call after every change of entry `uid` """
+    for func in _subscribers:
+        func(str(uid))
+
+
+class LazyIndex(abc.ABC):
+
+    """
+        Lazily built index per key, rebuilt after `ttl` seconds.
+        The config key `ttl_setting` overrides `ttl`. Subclasses implement
+        `_build(key)` and `update(uid)`.
+    """
+
+    ttl_setting = None
+
+    def __init__(self, ttl: int = 3600) -> None:
+        self.ttl = ttl
+        # key -> (time of build, index)
+        self._built = {}
+        self._locks = collections.defaultdict(threading.Lock)
+        on_entry_changed(self.update)
+
+    @abc.abstractmethod
+    def _build(self, key: t.Hashable) -> t.Any:
+        """ build the index for `key` from DGraph """
+
+    def _expired(self, built: t.Optional[tuple]) -> bool:
+        ttl = current_app.config.get(self.ttl_setting, self.ttl)
+        return built is None or time.monotonic() - built[0] >= ttl
+
+    def get(self, key: t.Hashable = None) -> t.Any:
+        built = self._built.get(key)
+        if not self._expired(built):
+            return built[1]
+        # only one thread builds the index, the others wait for it
+        with self._locks[key]:
+            built = self._built.get(key)
+            if self._expired(built):
+                built = (time.monotonic(), self._build(key))
+                self._built[key] = built
+        return built[1]
+
+    def peek(self, key: t.Hashable = None) -> t.Any:
+        """ the index for `key` if it is built already, otherwise `None` """
+        built = self._built.get(key)
+        return built[1] if built is not None else None
+
+    def items(self) -> t.List[t.Tuple[t.Hashable, t.Any]]:
+        """ all indexes that are built already """
+        return [(key, built[1]) for key, built in list(self._built.items())]
+
+    @abc.abstractmethod
+    def update(self, uid: str) -> None:
+        """ called by `entry_changed` """
+
+    def invalidate(self, key: t.Hashable = None) -> None:
+        """ drop the index for `key`, or all of them """
+        if key is None:
+            self._built.clear()
+        else:
+            self._built.pop(key, None)
@@ -0,0 +1,51 @@
+"""
+    Lazy imports for heavy optional dependencies
+
+    Clients for external services (e.g., `telethon`, `tweepy`, `instaloader`)
+    take a long time to import, but are only needed for a few requests.
+    `LazyImport` defers the import until the module (or one of its
+    attributes) is actually used.
+
+        tweepy = LazyImport('tweepy')
+        TelegramClient = LazyImport('telethon.sync', 'TelegramClient')
+"""
+
+import importlib
+import threading
+import typing as t
+
+
+class LazyImport:
+
+    """ Proxy that imports a module (or an attribute of it) on first access """
+
+    def __init__(self, module: str, attribute: str = None) -> None:
+        self._module = module
+        self._attribute = attribute
+        self._target = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> t.Any:
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    target = importlib.import_module(self._module)
+                    if self._attribute:
+                        target = getattr(target, self._attribute)
+                    self._target = target
+        return self._target
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._target is not None
+
+    def __getattr__(self, name: str) -> t.Any:
+        return getattr(self._load(), name)
+
+    def __call__(self, *args, **kwargs) -> t.Any:
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        name = self._module + ('.' + self._attribute if self._attribute else '')
+        status = 'loaded' if self.is_loaded else 'not loaded'
+        return f'<LazyImport "{name}" ({status})>'
@@ -0,0 +1,217 @@
+"""
+    Outbound mail queue
+
+    Emails are written to a local SQLite database and sent by a
+    background thread, so a slow mail server does not stall requests.
+    Queued mails survive restarts. The worker sends all due mails
+    over one SMTP connection and retries failed ones with exponential
+    backoff (`MAIL_QUEUE_MAX_ATTEMPTS`, default: 8).
+
+    Optionally, the worker also sends digests of unread notifications
+    to users who opted in (`preference_emails`), every
+    `MAIL_DIGEST_INTERVAL` seconds (disabled by default).
+
+    When the app is in TESTING mode (or `MAIL_QUEUE_SYNC` is set)
+    mails are sent immediately instead.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import smtplib
+import threading
+import typing as t
+
+from flask import Flask
+from flask_mail import Message
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message TEXT NOT NULL,
+                created REAL NOT NULL,
+                next_attempt REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )'''
+
+
+def serialize(msg: Message) -> str:
+    return json.dumps({'subject': msg.subject,
+                       'sender': msg.sender,
+                       'recipients': msg.recipients,
+                       'cc': msg.cc,
+                       'bcc': msg.bcc,
+                       'reply_to': msg.reply_to,
+                       'body': msg.body,
+                       'html': msg.html})
+
+
+def deserialize(message: str) -> Message:
+    return Message(**json.loads(message))
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """ errors of the connection (not of a single message) """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def backoff(attempts: int, base: float = 30, maximum: float = 6 * 3600) -> float:
+    """ seconds to wait before the next attempt """
+    return min(base * 2 ** (attempts - 1), maximum)
+
+
+class MailQueue:
+
+    """
+        Persistent queue with a single sender thread.
+    """
+
+    def __init__(self) -> None:
+        self.app = None
+        self.path = None
+        self._worker = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._last_digest = time.monotonic()
+
+    def init_app(self, app: Flask) -> None:
+        self.app = app
+        self.path = app.config.get('MAIL_QUEUE_PATH', os.path.join(app.instance_path, 'mail_queue.sqlite3'))
+        if self.is_sync:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute(SCHEMA)
+        # send mails that were queued before a restart
+        if len(self) > 0 or app.config.get('MAIL_DIGEST_INTERVAL'):
+            self._start()
+
+    @property
+    def is_sync(self) -> bool:
+        return bool(self.app.config.get('TESTING') or self.app.config.get('MAIL_QUEUE_SYNC'))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def __len__(self) -> int:
+        """ number of mails waiting to be sent """
+        with self._connect() as db:
+            return db.execute('SELECT COUNT(*) FROM outbox WHERE failed = 0').fetchone()[0]
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run,
+                                                name='mail',
+                                                daemon=True)
+                self._worker.start()
+
+    def submit(self, msg: Message) -> None:
+        if self.is_sync:
+            from meteor import mail
+            mail.send(msg)
+            return
+        with self._connect() as db:
+            now = time.time()
+            db.execute('INSERT INTO outbox (message, created, next_attempt) VALUES (?, ?, ?)',
+                       (serialize(msg), now, now))
+        self._start()
+        self._wakeup.set()
+
+    """ Worker """
+
+    def _claim(self, limit: int = 50, timeout: float = 600) -> t.List[tuple]:
+        """ 
+            due mails, postponed by `timeout` seconds, so other 
+            processes that share the queue do not send them as well
+        """
+        now = time.time()
+        claimed = []
+        with self._connect() as db:
+            due = db.execute('''SELECT id, message, attempts FROM outbox
+                                 WHERE failed = 0 AND next_attempt <= ?
+                                 ORDER BY id LIMIT ?''', (now, limit)).fetchall()
+            for id, message, attempts in due:
+                cursor = db.execute('UPDATE outbox SET next_attempt = ? WHERE id = ? AND next_attempt <= ?',
+                                    (now + timeout, id, now))
+                if cursor.rowcount == 1:
+                    claimed.append((id, message, attempts))
+        return claimed
+
+    def _next_attempt(self) -> t.Optional[float]:
+        with self._connect() as db:
+            return db.execute('SELECT MIN(next_attempt) FROM outbox WHERE failed = 0').fetchone()[0]
+
+    def _retry(self, db: sqlite3.Connection, id: int, attempts: int, error: Exception) -> None:
+        attempts += 1
+        max_attempts = self.app.config.get('MAIL_QUEUE_MAX_ATTEMPTS', 8)
+        if attempts >= max_attempts:
+            logger.error(f'Giving up sending mail <{id}> after {attempts} attempts: {error}')
+        else:
+            logger.warning(f'Could not send mail <{id}> (attempt {attempts}): {error}')
+        db.execute('UPDATE outbox SET attempts = ?, next_attempt = ?, failed = ?, error = ? WHERE id = ?',
+                   (attempts, time.time() + backoff(attempts), int(attempts >= max_attempts), str(error), id))
+
+    def send_due(self) -> int:
+        """ send all due mails over one connection, returns number of sent mails """
+        from meteor import mail
+        sent = 0
+        while True:
+            batch = self._claim()
+            if len(batch) == 0:
+                return sent
+            pending = list(batch)
+            with self._connect() as db:
+                try:
+                    with mail.connect() as connection:
+                        while pending:
+                            id, message, attempts = pending[0]
+                            try:
+                                connection.send(deserialize(message))
+                                db.execute('DELETE FROM outbox WHERE id = ?', (id,))
+                                sent += 1
+                            except Exception as e:
+                                if _is_connection_error(e):
+                                    raise
+                                self._retry(db, id, attempts, e)
+                            db.commit()
+                            pending.pop(0)
+                except Exception as e:
+                    # could not connect (or the connection broke)
+                    for id, message, attempts in pending:
+                        self._retry(db, id, attempts, e)
+                    return sent
+
+    def _digest_due(self) -> bool:
+        interval = self.app.config.get('MAIL_DIGEST_INTERVAL')
+        return bool(interval) and time.monotonic() - self._last_digest >= interval
+
+    def _run(self) -> None:
+        while True:
+            with self.app.app_context():
+                try:
+                    self.send_due()
+                    if self._digest_due():
+                        self._last_digest = time.monotonic()
+                        from meteor.users.emails import send_notification_digests
+                        send_notification_digests()
+                except Exception as e:
+                    logger.exception(f'Mail queue failed: {e}')
+                next_attempt = self._next_attempt()
+            timeout = 60
+            if next_attempt is not None:
+                timeout = min(timeout, max(next_attempt - time.time(), 0.1))
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+
+mail_queue = MailQueue()
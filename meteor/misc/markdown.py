@@ -37,15 +37,14 @@ except:
          from markupsafe import Markup
     except:
          raise Exception('Markup module not found')
-import markdown as md
-from markdown import (
-    blockprocessors,
-    Extension,
-    preprocessors,
-)
+# markdown is only needed once a template renders markdown
+from meteor.misc.lazy import LazyImport
+md = LazyImport('markdown')
+blockprocessors = LazyImport('markdown.blockprocessors')
+preprocessors = LazyImport('markdown.preprocessors')
 
 
-__all__ = ['blockprocessors', 'Extension', 'Markdown', 'preprocessors']
+__all__ = ['blockprocessors', 'Markdown', 'preprocessors']
 
 
 class Markdown(object):
@@ -69,9 +68,17 @@ class Markdown(object):
 
     def __init__(self, app, **markdown_options):
         """Markdown uses old style classes"""
-        self._instance = md.Markdown(**markdown_options)
+        self._options = markdown_options
+        self._markdown = None
         app.jinja_env.filters.setdefault('markdown', self)
 
+    @property
+    def _instance(self):
+        # created on first use, so the app starts without importing markdown
+        if self._markdown is None:
+            self._markdown = md.Markdown(**self._options)
+        return self._markdown
+
     def __call__(self, stream):
         return Markup(self._instance.convert(stream))
 
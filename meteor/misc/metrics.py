@@ -0,0 +1,162 @@
+"""
+    Lightweight in-process metrics
+
+    Collects counters and histograms and renders them
+    in the Prometheus text exposition format.
+    Used for DGraph calls (see `meteor.flaskdgraph.client`)
+    and API routes (see `meteor.api.routes`).
+"""
+
+import re
+import hashlib
+import threading
+import typing as t
+from bisect import bisect_left
+
+# seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2)
+
+
+class Metrics:
+
+    """
+        Thread-safe registry of counters and histograms.
+        Metrics are identified by name and a tuple of label values.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+
+    def describe(self, name: str, description: str) -> None:
+        self._help[name] = description
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: tuple = DEFAULT_BUCKETS, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            try:
+                histogram = self._histograms[key]
+            except KeyError:
+                histogram = self._histograms[key] = {'buckets': buckets,
+                                                     'counts': [0] * len(buckets),
+                                                     'sum': 0.0,
+                                                     'count': 0}
+            i = bisect_left(histogram['buckets'], value)
+            if i < len(histogram['buckets']):
+                histogram['counts'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def get(self, name: str, **labels) -> t.Union[float, dict, None]:
+        """ current value of a counter or histogram (mainly for testing) """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            if key in self._histograms:
+                return dict(self._histograms[key])
+        return None
+
+    @staticmethod
+    def _labels(labels: tuple, **extra) -> str:
+        labels = list(labels) + list(extra.items())
+        if len(labels) == 0:
+            return ''
+        rendered = []
+        for k, v in labels:
+            v = str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+            rendered.append(f'{k}="{v}"')
+        return '{' + ','.join(rendered) + '}'
+
+    def render(self) -> str:
+        """ Prometheus text format (version 0.0.4) """
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: dict(v, counts=list(v['counts'])) for k, v in self._histograms.items()}
+
+        for name in sorted({k[0] for k in counters}):
+            if name in self._help:
+                lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} counter')
+            for (_name, labels), value in counters.items():
+                if _name == name:
+                    lines.append(f'{name}{self._labels(labels)} {value}')
+
+        for name in sorted({k[0] for k in histograms}):
+            if name in self._help:
+                lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} histogram')
+            for (_name, labels), histogram in histograms.items():
+                if _name != name:
+                    continue
+                cumulative = 0
+                for bucket, count in zip(histogram['buckets'], histogram['counts']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{self._labels(labels, le=bucket)} {cumulative}')
+                lines.append(f'{name}_bucket{self._labels(labels, le="+Inf")} {histogram["count"]}')
+                lines.append(f'{name}_sum{self._labels(labels)} {histogram["sum"]}')
+                lines.append(f'{name}_count{self._labels(labels)} {histogram["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+metrics.describe('dgraph_request_duration_seconds', 'Client side latency of DGraph requests')
+metrics.describe('dgraph_server_duration_seconds', 'Server side latency reported by DGraph')
+metrics.describe('dgraph_response_bytes', 'Size of DGraph JSON responses')
+metrics.describe('dgraph_errors_total', 'Failed DGraph requests')
+metrics.describe('dgraph_slow_queries_total', 'DGraph requests above the slow query threshold')
+metrics.describe('api_request_duration_seconds', 'Latency of API routes')
+metrics.describe('api_dgraph_calls_per_request', 'Number of DGraph calls per API request')
+
+
+""" Query Fingerprints """
+
+_STRING_LITERALS = re.compile(r'"(?:[^"\\]|\\.)*"')
+_REGEX_LITERALS = re.compile(r'/[^/\s]+/[a-z]*')
+_UIDS = re.compile(r'\b0x[0-9a-fA-F]+\b')
+_NUMBERS = re.compile(r'\b\d+(\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+_QUERY_NAME = re.compile(r'^\s*(?:query\s+)?([A-Za-z_][A-Za-z0-9_]*)\s*\(')
+
+
+def normalize_query(query: str) -> str:
+    """ replace literals (strings, uids, numbers) and collapse whitespace """
+    if not query:
+        return ''
+    query = _STRING_LITERALS.sub('?', query)
+    query = _REGEX_LITERALS.sub('?', query)
+    query = _UIDS.sub('?', query)
+    query = _NUMBERS.sub('?', query)
+    return _WHITESPACE.sub(' ', query).strip()
+
+
+def fingerprint(query: str) -> str:
+    """
+        Short, stable identifier for the shape of a query.
+        Queries that only differ in their literals share a fingerprint.
+        If the query is named (`query getRecent(...)`), the name is prefixed.
+    """
+    if not query:
+        return 'none'
+    digest = hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()[:10]
+    match = _QUERY_NAME.match(query)
+    if match and match.group(1) != 'query':
+        return match.group(1) + ':' + digest
+    return digest
@@ -0,0 +1,179 @@
+"""
+    Rate limiting and admission control for expensive routes
+
+    Every client (user id if logged in, otherwise the IP address) has a
+    token bucket that refills with `RATE_LIMIT_RATE` tokens per second
+    up to `RATE_LIMIT_BURST` tokens. Expensive routes cost tokens
+    (`API.route(..., cost=5)`); if the bucket is empty the request is
+    rejected with `429 Too Many Requests`.
+
+    Buckets are kept in memory of the current process. With several
+    worker processes set `RATE_LIMIT_STORE` to the path of an SQLite
+    database, so all workers share the same buckets.
+
+    Additionally, every process runs at most `RATE_LIMIT_MAX_CONCURRENT`
+    expensive requests at the same time. Further requests wait up to
+    `RATE_LIMIT_QUEUE_TIMEOUT` seconds for a free slot, otherwise they
+    are rejected with `503 Service Unavailable`, before they pile up
+    in the DGraph queue.
+
+    Disabled in TESTING mode, unless `RATE_LIMIT_ENABLED` is set.
+"""
+
+import time
+import random
+import sqlite3
+import threading
+import collections
+import typing as t
+
+from flask import current_app
+
+
+class Bucket(t.NamedTuple):
+    allowed: bool
+    remaining: float
+    retry_after: float
+
+
+def refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(now - updated, 0) * rate)
+
+
+def take(tokens: float, cost: float, rate: float) -> Bucket:
+    if tokens >= cost:
+        return Bucket(True, tokens - cost, 0)
+    return Bucket(False, tokens, (cost - tokens) / rate)
+
+
+class MemoryStore:
+
+    """ 
+        Token buckets of the current process, least recently 
+        updated first (so old buckets are pruned from the front) 
+    """
+
+    def __init__(self, max_keys: int = 100000) -> None:
+        self.max_keys = max_keys
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, cost: float, rate: float, burst: float) -> Bucket:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            bucket = take(refill(tokens, updated, now, rate, burst), cost, rate)
+            self._buckets[key] = (bucket.remaining, now)
+            self._prune(now, now - burst / rate)
+        return bucket
+
+    def _prune(self, now: float, expired: float) -> None:
+        """ 
+            buckets not updated since `expired` are full again, 
+            full buckets are the same as no bucket 
+        """
+        while self._buckets:
+            key, (tokens, updated) = next(iter(self._buckets.items()))
+            if updated > expired and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteStore:
+
+    """ Token buckets shared by all processes on this host """
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                )'''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            self._local.db = db
+        return db
+
+    def consume(self, key: str, cost: float, rate: float, burst: float) -> Bucket:
+        now = time.time()
+        db = self._connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            bucket = take(refill(tokens, updated, now, rate, burst), cost, rate)
+            db.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                       (key, bucket.remaining, now))
+            # forget buckets that are full again
+            if random.random() < 0.01:
+                db.execute('DELETE FROM buckets WHERE updated < ?', (now - burst / rate,))
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return bucket
+
+    def clear(self) -> None:
+        self._connect().execute('DELETE FROM buckets')
+
+
+class RateLimiter:
+
+    def __init__(self) -> None:
+        self._store = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return current_app.config.get('RATE_LIMIT_ENABLED', not current_app.config.get('TESTING'))
+
+    @property
+    def store(self) -> t.Union[MemoryStore, SQLiteStore]:
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    path = current_app.config.get('RATE_LIMIT_STORE')
+                    self._store = SQLiteStore(path) if path else MemoryStore()
+        return self._store
+
+    @property
+    def slots(self) -> threading.BoundedSemaphore:
+        if self._slots is None:
+            with self._lock:
+                if self._slots is None:
+                    self._slots = threading.BoundedSemaphore(current_app.config.get('RATE_LIMIT_MAX_CONCURRENT', 8))
+        return self._slots
+
+    def consume(self, key: str, cost: float) -> Bucket:
+        rate = current_app.config.get('RATE_LIMIT_RATE', 0.5)
+        burst = current_app.config.get('RATE_LIMIT_BURST', 30)
+        try:
+            return self.store.consume(key, min(cost, burst), rate, burst)
+        except Exception as e:
+            # never fail a request because of the limiter
+            current_app.logger.warning(f'Rate limiter not available: {e}')
+            return Bucket(True, burst, 0)
+
+    def admit(self) -> bool:
+        """ take a slot for an expensive request, call `release` afterwards """
+        return self.slots.acquire(timeout=current_app.config.get('RATE_LIMIT_QUEUE_TIMEOUT', 0.5))
+
+    def release(self) -> None:
+        self.slots.release()
+
+
+rate_limiter = RateLimiter()
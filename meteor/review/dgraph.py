@@ -8,6 +8,7 @@ from meteor.flaskdgraph.dgraph_types import (UID, NewID, Predicate, Scalar,
 from meteor.flaskdgraph.utils import validate_uid
 from meteor.errors import InventoryDatabaseError
 from meteor.users.emails import send_accept_email
+from meteor.misc.indexes import entry_changed
 
 def get_overview(dgraphtype, country=None, user=None):
     if dgraphtype == 'all':
@@ -97,6 +98,7 @@ def accept_entry(uid, user):
     set_nquads = " \n ".join(dict_to_nquad(accepted))
 
     dgraph.upsert(None, set_nquads=set_nquads)
+    entry_changed(uid)
     
 
 
@@ -132,3 +134,4 @@ def reject_entry(uid, user):
 
     dgraph.upsert(query, del_nquads=del_nquads)
     dgraph.upsert(None, set_nquads=set_nquads)
+    entry_changed(uid)
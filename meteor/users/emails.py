@@ -1,5 +1,6 @@
+import json
 from flask import current_app, url_for, render_template
-from meteor import mail
+from meteor.misc.mailqueue import mail_queue
 from flask_mail import Message
 from meteor.users.dgraph import UserLogin
 
@@ -15,7 +16,7 @@ def send_reset_email(token, email):
         If you did not make this request then simply ignore this email and no changes will be made.
         '''
 
-    mail.send(msg)
+    mail_queue.submit(msg)
 
 
 def send_verification_email(user: UserLogin):
@@ -26,7 +27,7 @@ def send_verification_email(user: UserLogin):
 
     msg.html = render_template('emails/verify.html', token=token, subject=subject)
 
-    mail.send(msg)
+    mail_queue.submit(msg)
 
 def send_invite_email(user: UserLogin):
     token = user.get_invite_token()
@@ -36,7 +37,7 @@ def send_invite_email(user: UserLogin):
 
     msg.html = render_template('emails/invitation.html', subject=subject, token=token)
 
-    mail.send(msg)
+    mail_queue.submit(msg)
 
 
 def send_accept_email(entry):
@@ -58,4 +59,48 @@ def send_accept_email(entry):
 
     msg.html = render_template('emails/entry_accepted.html', subject=subject, entry=entry)
 
-    mail.send(msg)
\ No newline at end of file
+    mail_queue.submit(msg)
+
+
+def send_notification_digests() -> int:
+    """
+        Email unread notifications that were not emailed yet, one digest
+        per user. Only for users who want to receive emails (`preference_emails`).
+
+        Notifications are claimed (`_email_dispatched`) in the same transaction
+        that selects them. If several processes send digests at the same time,
+        DGraph aborts all but one of the transactions, so every notification
+        is emailed at most once.
+
+        Returns number of sent digests
+    """
+    from meteor import dgraph
+
+    query_string = """{
+        q(func: has(~_notify)) @filter(type(User) AND eq(preference_emails, "true") AND has(email)) {
+            uid email display_name
+            notifications: ~_notify (orderasc: _notification_date) 
+                @filter(NOT eq(_read, "true") AND NOT eq(_email_dispatched, "true")) {
+                claimed as uid _title _content _notification_date
+            }
+        }
+    }"""
+    response = dgraph.upsert(query_string, set_nquads='uid(claimed) <_email_dispatched> "true" .')
+    if not response:
+        current_app.logger.info('Notification digests are sent by another process')
+        return 0
+
+    digests = 0
+    for user in json.loads(response.json).get('q', []):
+        notifications = user.get('notifications', [])
+        if len(notifications) == 0:
+            continue
+        subject = f'Meteor: {len(notifications)} new notification{"s" if len(notifications) > 1 else ""}'
+        msg = Message(subject=subject,
+                      sender=current_app.config['MAIL_DEFAULT_SENDER'], recipients=[user['email']])
+        msg.html = render_template('emails/digest.html', subject=subject,
+                                   user=user, notifications=notifications)
+        mail_queue.submit(msg)
+        digests += 1
+
+    return digests
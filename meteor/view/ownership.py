@@ -0,0 +1,254 @@
+"""
+    Ownership networks
+
+    The ownership network of an entry is the connected component of
+    `owns` and `publishes` edges (in both directions) it belongs to.
+    Instead of walking the edges with `@recurse` on every request,
+    all components are computed from a single query and kept in memory.
+    Adding, editing, reviewing or deleting an entry only updates the
+    edges of that entry (see `meteor.misc.indexes.entry_changed`).
+
+    The payload (accepted members with their edges) of a component is
+    cached until one of its members changes.
+"""
+
+import threading
+import itertools
+import collections
+import typing as t
+
+from flask import current_app
+
+from meteor import dgraph
+from meteor.misc.indexes import LazyIndex
+
+
+OWNERSHIP_PREDICATES = ['owns', 'publishes']
+
+# component ids are never reused, also not by rebuilt graphs
+_component_ids = itertools.count()
+
+# projections of the members of a component, one per route
+OWNERSHIP_VIEWS = {
+    'api': {
+        'types': ["Organization", "NewsSource", "PoliticalParty"],
+        'fields': '''name uid dgraph.type _unique_name
+                     channel { _unique_name uid name }
+                     publishes @filter(eq(entry_review_status, "accepted")) { uid _unique_name }
+                     owns @filter(eq(entry_review_status, "accepted")) { uid _unique_name }'''},
+    'endpoint': {
+        'types': ["Organization", "NewsSource", "PoliticalParty", "Government", "Parliament"],
+        'fields': '''name uid dgraph.type
+                     channel { _unique_name }
+                     publishes @filter(eq(entry_review_status, "accepted")) { uid }
+                     owns @filter(eq(entry_review_status, "accepted")) { uid }'''},
+}
+
+
+class OwnershipGraph:
+
+    """
+        Undirected graph of ownership edges and its connected components.
+        Entries without any edges are not stored, they form a component
+        of their own.
+    """
+
+    def __init__(self, edges: t.Iterable[t.Tuple[str, str]] = None) -> None:
+        self.neighbours = collections.defaultdict(set)
+        # uid -> component id and component id -> uids
+        self.component_of = {}
+        self.components = {}
+        for a, b in edges or []:
+            if a != b:
+                self.neighbours[a].add(b)
+                self.neighbours[b].add(a)
+        self._label(list(self.neighbours))
+
+    def __len__(self) -> int:
+        return len(self.components)
+
+    def _walk(self, uid: str, depth: int = None) -> t.Set[str]:
+        """ breadth first search, optionally limited to `depth` steps """
+        seen = {uid}
+        frontier = [uid]
+        steps = 0
+        while frontier and (depth is None or steps < depth):
+            steps += 1
+            following = []
+            for node in frontier:
+                for neighbour in self.neighbours.get(node, ()):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        following.append(neighbour)
+            frontier = following
+        return seen
+
+    def _label(self, uids: t.Iterable[str]) -> None:
+        """ assign new components to all nodes reachable from `uids` """
+        for uid in uids:
+            if uid in self.component_of or uid not in self.neighbours:
+                continue
+            members = self._walk(uid)
+            component = next(_component_ids)
+            self.components[component] = members
+            for member in members:
+                self.component_of[member] = component
+
+    def component(self, uid: str) -> t.Tuple[t.Optional[int], t.Set[str]]:
+        """ returns `(component id, members)`, the id is `None` for isolated entries """
+        component = self.component_of.get(uid)
+        if component is None:
+            return None, {uid}
+        return component, self.components[component]
+
+    def within(self, uid: str, depth: int) -> t.Set[str]:
+        """ members of the component that are at most `depth` edges away from `uid` """
+        return self._walk(uid, depth=depth)
+
+    def set_neighbours(self, uid: str, neighbours: t.Iterable[str]) -> t.Set[int]:
+        """
+            Replace all edges of `uid`. Returns the ids of components
+            that changed (and no longer exist, if the edges changed).
+        """
+        neighbours = set(neighbours) - {uid}
+        old = set(self.neighbours.get(uid, ()))
+        stale = {self.component_of[node] for node in {uid} | old | neighbours
+                 if node in self.component_of}
+        if old == neighbours:
+            return stale
+
+        for node in old - neighbours:
+            self.neighbours[node].discard(uid)
+            if len(self.neighbours[node]) == 0:
+                del self.neighbours[node]
+        for node in neighbours - old:
+            self.neighbours[node].add(uid)
+        if neighbours:
+            self.neighbours[uid] = neighbours
+        else:
+            self.neighbours.pop(uid, None)
+
+        # all edges that were removed start at `uid`, so every part of
+        # a split component is reachable from `uid` or its old neighbours
+        for component in stale:
+            for member in self.components.pop(component):
+                self.component_of.pop(member, None)
+        self._label({uid} | old | neighbours)
+        return stale
+
+
+def _restrict(payload: t.List[dict], uids: t.Set[str]) -> t.List[dict]:
+    """ only keep members in `uids` and edges between them """
+    result = []
+    for entry in payload:
+        if entry['uid'] not in uids:
+            continue
+        entry = dict(entry)
+        for predicate in OWNERSHIP_PREDICATES:
+            if predicate in entry:
+                entry[predicate] = [item for item in entry[predicate] if item['uid'] in uids]
+        result.append(entry)
+    return result
+
+
+class OwnershipIndex(LazyIndex):
+
+    """
+        Lazily built `OwnershipGraph` with cached payloads per component.
+        Rebuilt after `OWNERSHIP_INDEX_TTL` seconds to pick up changes 
+        from other processes.
+    """
+
+    ttl_setting = 'OWNERSHIP_INDEX_TTL'
+
+    def __init__(self, ttl: int = 3600, max_payloads: int = 1024) -> None:
+        super().__init__(ttl=ttl)
+        self.max_payloads = max_payloads
+        self._payloads = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def _build(self, key: None = None) -> OwnershipGraph:
+        query_string = '''{
+            owns(func: has(owns)) { uid owns { uid } }
+            publishes(func: has(publishes)) { uid publishes { uid } }
+        }'''
+        data = dgraph.query(query_string)
+        edges = [(entry['uid'], target['uid'])
+                 for predicate in OWNERSHIP_PREDICATES
+                 for entry in data.get(predicate, [])
+                 for target in entry.get(predicate, [])]
+        graph = OwnershipGraph(edges)
+        with self._lock:
+            self._payloads.clear()
+        return graph
+
+    def update(self, uid: str) -> None:
+        """ reload the ownership edges of `uid` after it was changed """
+        graph = self.peek()
+        if graph is None:
+            return
+        query_string = '''query ownership_edges($id: string) {
+            q(func: uid($id)) { owns { uid } publishes { uid } ~owns { uid } ~publishes { uid } }
+        }'''
+        try:
+            data = dgraph.query(query_string, variables={'$id': str(uid)})
+        except Exception as e:
+            current_app.logger.warning(f'Could not update ownership network of <{uid}>: {e}')
+            self.invalidate()
+            return
+        neighbours = {item['uid'] for entry in data['q'] for items in entry.values()
+                      if isinstance(items, list) for item in items}
+        with self._lock:
+            for component in graph.set_neighbours(str(uid), neighbours):
+                for view in OWNERSHIP_VIEWS:
+                    self._payloads.pop((component, view), None)
+
+    def invalidate(self, key: None = None) -> None:
+        super().invalidate()
+        with self._lock:
+            self._payloads.clear()
+
+    def _fetch(self, uids: t.Iterable[str], view: str) -> t.List[dict]:
+        projection = OWNERSHIP_VIEWS[view]
+        types = ', '.join(f'"{dgraph_type}"' for dgraph_type in projection['types'])
+        query_string = f'''{{
+            q(func: uid({", ".join(uids)}))
+                @filter(eq(entry_review_status, "accepted") AND eq(dgraph.type, [{types}])) {{
+                {projection['fields']}
+            }}
+        }}'''
+        return dgraph.query(query_string)['q']
+
+    def subgraph(self, uid: str, view: str = 'api', depth: int = None) -> t.List[dict]:
+        """
+            Accepted members of the ownership network of `uid`.
+            `depth` limits the network to members that are at most
+            `depth` edges away from `uid`.
+        """
+        graph = self.get()
+        with self._lock:
+            component, members = graph.component(uid)
+            members = set(members)
+            nearby = graph.within(uid, depth) if depth is not None else None
+            payload = self._payloads.get((component, view))
+            if payload is not None:
+                self._payloads.move_to_end((component, view))
+
+        if payload is None and nearby is not None and len(nearby) < len(members):
+            # do not load (and cache) the whole network
+            return _restrict(self._fetch(nearby, view), nearby)
+
+        if payload is None:
+            payload = self._fetch(members, view)
+            if component is not None:
+                with self._lock:
+                    self._payloads[(component, view)] = payload
+                    while len(self._payloads) > self.max_payloads:
+                        self._payloads.popitem(last=False)
+
+        if nearby is not None:
+            return _restrict(payload, nearby)
+        return payload
+
+
+ownership_index = OwnershipIndex()
@@ -1,9 +1,9 @@
 from flask import (Blueprint, render_template, url_for,
-                   flash, redirect, request, abort, jsonify)
+                   flash, redirect, request, abort, jsonify, g)
 from flask_login import current_user, login_required
-from meteor import dgraph
+from meteor import dgraph, query_planner
 from meteor.flaskdgraph.dgraph_types import SingleChoice
-from meteor.flaskdgraph import Schema, build_query_string
+from meteor.flaskdgraph import Schema, build_query_string, QueryTooExpensive
 from meteor.flaskdgraph.query import generate_query_forms
 from meteor.users.constants import USER_ROLES
 from meteor.users.utils import requires_access_level
@@ -177,12 +177,20 @@ def query():
         json_output = False
     if len(r) > 0:
         try:
-            query_string = build_query_string(r)
+            query_string = build_query_string(r, planner=query_planner)
+        except QueryTooExpensive as e:
+            if json_output:
+                return jsonify({'_total_results': 0})
+            flash(f'{e}', category="danger")
+            return redirect(url_for("view.query"))
         except ValueError:
             if json_output:
                 return jsonify({'_total_results': 0})
             flash('Invalid Query. Did you try to query private fields?', category="danger")
             return redirect(url_for("view.query"))
+        if g.get('_query_downgraded'):
+            flash('Your search matched too many entries, so names were only searched for whole words. '
+                  'Add more filters (e.g., a type or a country) for a complete search.', category="warning")
         search_terms = request.args.get('_terms', '')
         if not search_terms == '':
             variables = {'$searchTerms': search_terms}
@@ -191,7 +199,7 @@ def query():
 
         result = dgraph.query(query_string, variables=variables)
         
-        count_query_string = build_query_string(r, count=True)
+        count_query_string = build_query_string(r, count=True, planner=query_planner)
         count_result = dgraph.query(count_query_string, variables=variables)
         total = count_result['total'][0]['count']
         max_results = int(request.args.get('_max_results', 25))
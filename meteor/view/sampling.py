@@ -0,0 +1,105 @@
+"""
+    Uniform random samples of accepted entries
+
+    Keeps an array of accepted uids per DGraph type, so drawing `k`
+    entries takes O(k) instead of one `offset` query per sample
+    (which makes DGraph walk `offset` nodes each time). The arrays are
+    built lazily and updated whenever the review status of an entry
+    changes (see `meteor.misc.indexes.entry_changed`).
+"""
+
+import random
+import threading
+import typing as t
+
+from flask import current_app
+
+from meteor import dgraph
+from meteor.misc.indexes import LazyIndex
+
+
+class SamplePool:
+
+    """ Array of uids with O(1) insertion, removal and O(k) sampling """
+
+    def __init__(self, uids: t.Iterable[str] = None) -> None:
+        self.uids = []
+        self.positions = {}
+        self._lock = threading.Lock()
+        for uid in uids or []:
+            self._add(uid)
+
+    def __len__(self) -> int:
+        return len(self.uids)
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self.positions
+
+    def _add(self, uid: str) -> None:
+        if uid not in self.positions:
+            self.positions[uid] = len(self.uids)
+            self.uids.append(uid)
+
+    def add(self, uid: str) -> None:
+        with self._lock:
+            self._add(uid)
+
+    def remove(self, uid: str) -> None:
+        """ swap the last uid into the gap """
+        with self._lock:
+            i = self.positions.pop(uid, None)
+            if i is None:
+                return
+            last = self.uids.pop()
+            if i < len(self.uids):
+                self.uids[i] = last
+                self.positions[last] = i
+
+    def sample(self, k: int, rng: random.Random = None) -> t.List[str]:
+        rng = rng or random
+        with self._lock:
+            return rng.sample(self.uids, min(k, len(self.uids)))
+
+
+class SamplingIndex(LazyIndex):
+
+    """ Lazily built `SamplePool` per DGraph type, rebuilt after `RANDOM_SAMPLE_TTL` seconds """
+
+    ttl_setting = 'RANDOM_SAMPLE_TTL'
+
+    def _build(self, dgraph_type: str) -> SamplePool:
+        query_string = '''query accepted($type: string) {
+            q(func: type($type)) @filter(eq(entry_review_status, "accepted") AND has(_date_created)) { uid }
+        }'''
+        data = dgraph.query(query_string, variables={'$type': dgraph_type})
+        return SamplePool(entry['uid'] for entry in data['q'])
+
+    def update(self, uid: str) -> None:
+        """ add or remove `uid` after its review status changed """
+        pools = self.items()
+        if len(pools) == 0:
+            return
+        uid = str(uid)
+        query_string = '''query sample_status($id: string) {
+            q(func: uid($id)) @filter(has(dgraph.type)) { dgraph.type entry_review_status _date_created }
+        }'''
+        try:
+            data = dgraph.query(query_string, variables={'$id': uid})
+        except Exception as e:
+            current_app.logger.warning(f'Could not update random samples with <{uid}>: {e}')
+            self.invalidate()
+            return
+        entry = data['q'][0] if len(data['q']) > 0 else {}
+        accepted = entry.get('entry_review_status') == 'accepted' and '_date_created' in entry
+        types = set(entry.get('dgraph.type', [])) if accepted else set()
+        for dgraph_type, pool in pools:
+            if dgraph_type in types:
+                pool.add(uid)
+            else:
+                pool.remove(uid)
+
+    def sample(self, dgraph_type: str, k: int) -> t.List[str]:
+        return self.get(dgraph_type).sample(k)
+
+
+sampling_index = SamplingIndex()
@@ -6,6 +6,7 @@ path.append(dirname(path[0]))
 
 from test_setup import BasicTestSetup
 from meteor import dgraph
+from meteor.flaskdgraph.utils import as_datetime
 from meteor.main.model import User
 import unittest
 
@@ -73,6 +74,93 @@ class TestAPILoggedOut(BasicTestSetup):
                              headers=self.headers)
             self.assertEqual(response.status_code, 404)
 
+    def test_view_uid_conditional(self):
+
+        # /view/uid/<uid> with If-None-Match
+        with self.client as c:
+            response = c.get('/api/view/uid/' + self.derstandard_mbh_uid,
+                             headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            etag = response.headers['ETag']
+            self.assertIn('public', response.headers['Cache-Control'])
+
+            response = c.get('/api/view/uid/' + self.derstandard_mbh_uid,
+                             headers={**self.headers, 'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, b'')
+
+            # edits change the ETag
+            original = dgraph.query(f'{{ q(func: uid({self.derstandard_mbh_uid})) {{ _date_modified }} }}')
+            original = original['q'][0].get('_date_modified') if original['q'] else None
+            if original is None:
+                self.addCleanup(dgraph.delete, {'uid': self.derstandard_mbh_uid, '_date_modified': None})
+            else:
+                self.addCleanup(dgraph.mutation, {'uid': self.derstandard_mbh_uid,
+                                                  '_date_modified': as_datetime(original).isoformat()})
+            dgraph.mutation({'uid': self.derstandard_mbh_uid,
+                             '_date_modified': '2030-01-01T00:00:00Z'})
+            response = c.get('/api/view/uid/' + self.derstandard_mbh_uid,
+                             headers={**self.headers, 'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers['ETag'], etag)
+
+            response = c.get('/api/openapi.json', headers=self.headers)
+            response = c.get('/api/openapi.json',
+                             headers={**self.headers, 'If-None-Match': response.headers['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+    def test_view_reverse(self):
+
+        # /view/reverse/<uid>
+        with self.client as c:
+            # hub nodes need pagination or counts
+            response = c.get('/api/view/reverse/' + self.austria_uid,
+                             headers=self.headers)
+            self.assertEqual(response.status_code, 400)
+
+            response = c.get('/api/view/reverse/' + self.austria_uid,
+                             query_string={'output': 'count'},
+                             headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            counts = response.json
+            self.assertGreater(counts['countries__newssources'], 1)
+
+            response = c.get('/api/view/reverse/' + self.austria_uid,
+                             query_string={'predicates': 'countries__newssources', 'first': 1},
+                             headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.json.keys()), ['countries__newssources', '_next'])
+            self.assertEqual(len(response.json['countries__newssources']), 1)
+            seen = [response.json['countries__newssources'][0]['uid']]
+            cursor = response.json['_next']['countries__newssources']
+
+            while cursor:
+                response = c.get('/api/view/reverse/' + self.austria_uid,
+                                 query_string={'predicates': 'countries__newssources',
+                                               'first': 1, 'after': cursor},
+                                 headers=self.headers)
+                self.assertEqual(response.status_code, 200)
+                seen += [entry['uid'] for entry in response.json['countries__newssources']]
+                cursor = response.json['_next'].get('countries__newssources')
+            self.assertEqual(len(seen), len(set(seen)))
+            self.assertEqual(len(seen), counts['countries__newssources'])
+
+            response = c.get('/api/view/reverse/' + self.austria_uid,
+                             query_string={'predicates': 'not_a_predicate', 'first': 1},
+                             headers=self.headers)
+            self.assertEqual(response.status_code, 400)
+
+            response = c.get('/api/view/reverse/' + self.austria_uid,
+                             query_string={'after': self.austria_uid},
+                             headers=self.headers)
+            self.assertEqual(response.status_code, 400)
+
+            # cursors only apply to a single relationship
+            response = c.get('/api/view/reverse/' + self.austria_uid,
+                             query_string={'first': 1, 'after': self.austria_uid},
+                             headers=self.headers)
+            self.assertEqual(response.status_code, 400)
+
     def test_view_uid_pending(self):
 
         # pending entries
@@ -923,6 +1011,39 @@ class TestAPILoggedOut(BasicTestSetup):
                 self.assertEqual(response.status_code, 200)
                 self.assertEqual(len(response.json), 0)
 
+            response = c.get('/api/review/count',
+                             headers=self.headers)
+            if not self.logged_in:
+                self.assertEqual(response.status_code, 401)
+            elif self.logged_in == 'contributor':
+                self.assertEqual(response.status_code, 403)
+            else:
+                self.assertEqual(response.status_code, 200)
+                count = response.json
+                self.assertGreaterEqual(count, 1)
+
+                # page through all pending entries
+                uids = []
+                query = {'first': 1}
+                while True:
+                    response = c.get('/api/review',
+                                     query_string=query,
+                                     headers=self.headers)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLessEqual(len(response.json), 1)
+                    uids += [item['uid'] for item in response.json]
+                    if 'X-Next-Cursor' not in response.headers:
+                        break
+                    query['after'] = response.headers['X-Next-Cursor']
+                self.assertEqual(len(uids), len(set(uids)))
+                self.assertEqual(len(uids), count)
+                self.assertIn(self.derstandard_print, uids)
+
+                response = c.get('/api/review',
+                                 query_string={'after': 'invalid'},
+                                 headers=self.headers)
+                self.assertEqual(response.status_code, 400)
+
             res = dgraph.mutation({'uid': self.derstandard_print,
                                    'entry_review_status': "accepted"})
             self.assertNotEqual(res, False)
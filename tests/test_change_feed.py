@@ -0,0 +1,36 @@
+import unittest
+
+from sys import path
+from os.path import dirname
+from types import SimpleNamespace
+
+path.append(dirname(path[0]))
+
+from meteor.api.events import ChangeFeed, Subscription
+from meteor.users.constants import USER_ROLES
+
+
+class TestChangeFeed(unittest.TestCase):
+
+    def test_change_feed(self):
+        feed = ChangeFeed(size=3)
+        feed.publish('add', '0x1', 'Tool')
+        feed.publish('add', '0x2', 'Dataset', public=False, actor='0xa')
+        feed.publish('notification', '0x1', user='0xb')
+        anonymous = Subscription()
+        contributor = Subscription(SimpleNamespace(uid='0xa', is_authenticated=True, _role=USER_ROLES.Contributor))
+        reviewer = Subscription(SimpleNamespace(uid='0xb', is_authenticated=True, _role=USER_ROLES.Reviewer),
+                                dgraph_types=['Tool'])
+        self.assertEqual([e['uid'] for e in feed.since(0, anonymous)[0]], ['0x1'])
+        self.assertEqual([e['uid'] for e in feed.since(0, contributor)[0]], ['0x1', '0x2'])
+        self.assertEqual([e['event'] for e in feed.since(0, reviewer)[0]], ['add', 'notification'])
+        self.assertEqual(feed.since(2, anonymous), ([], False))
+        # oldest event falls out of the buffer
+        feed.publish('edit', '0x1', 'Tool')
+        self.assertTrue(feed.since(0)[1])
+        self.assertFalse(feed.since(1)[1])
+        self.assertEqual(feed.wait(4, timeout=0.01), ([], False))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
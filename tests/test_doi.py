@@ -4,7 +4,10 @@
 from sys import path
 from os.path import dirname
 from requests import HTTPError
+from unittest.mock import patch
+import requests
 import unittest
+import time
 
 path.append(dirname(path[0]))
 from test_setup import BasicTestSetup
@@ -115,6 +118,39 @@ class TestDOI(BasicTestSetup):
         self.assertEqual(
             r['title'], "Quantitative Analysis of Textual Data : Differentiation and Coordination of Two Approaches")
 
+    def test_resolve_doi_deadline(self):
+        # fake providers, so the outcome does not depend on the network
+        def slow(doi, timeout=None):
+            time.sleep(0.1)
+            raise requests.Timeout()
+
+        def missing(doi, timeout=None):
+            raise HTTPError('not found')
+
+        def found(doi, timeout=None):
+            return {'doi': doi}
+
+        class SlowOpenAlex:
+            def resolve_doi(self, doi, timeout=None):
+                return slow(doi, timeout=timeout)
+
+        with patch('meteor.external.doi.OpenAlex', SlowOpenAlex), \
+                patch('meteor.external.doi.crossref', missing), \
+                patch('meteor.external.doi.datacite', found), \
+                patch('meteor.external.doi.jalc', slow), \
+                patch('meteor.external.doi.doi_org', slow):
+            self.assertRaises(HTTPError, resolve_doi, self.manifesto_doi, deadline=0)
+
+            before = get_provider_stats()
+            r = resolve_doi(self.manifesto_doi, deadline=5)
+            self.assertEqual(r, {'doi': self.manifesto_doi.upper()})
+            stats = get_provider_stats()
+
+        # only the providers that were awaited are finished for sure
+        self.assertGreater(stats['openalex']['timeout'], before.get('openalex', {}).get('timeout', 0))
+        self.assertGreater(stats['crossref']['failure'], before.get('crossref', {}).get('failure', 0))
+        self.assertGreater(stats['datacite']['success'], before.get('datacite', {}).get('success', 0))
+
     def test_arxiv(self):
         r = resolve_doi(self.arxiv_link)
         # ANEW Sentiment dict
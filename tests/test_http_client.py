@@ -0,0 +1,122 @@
+import unittest
+
+from sys import path
+from os.path import dirname
+import os
+import time
+import tempfile
+from pathlib import Path
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+path.append(dirname(path[0]))
+
+from requests import HTTPError
+from meteor.external.http_client import HTTPClient, CacheMissError, RateLimiter
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    hits = []
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = b'{"status": "ok"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPClient(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), Handler)
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.client = HTTPClient(cache_dir=self.tmp.name)
+        Handler.hits.clear()
+
+    def tearDown(self):
+        self.client.close()
+        self.tmp.cleanup()
+
+    def test_cache_hit(self):
+        r = self.client.get(self.url + '/works', params={'q': 'test'})
+        self.assertEqual(r.json()['status'], 'ok')
+        self.assertFalse(r.from_cache)
+        r = self.client.get(self.url + '/works', params={'q': 'test'})
+        self.assertEqual(r.json()['status'], 'ok')
+        self.assertTrue(r.from_cache)
+        self.assertEqual(len(Handler.hits), 1)
+
+    def test_revalidate(self):
+        self.client.get(self.url + '/works')
+        r = self.client.get(self.url + '/works', ttl=0)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.from_cache)
+        self.assertEqual(r.headers['ETag'], '"v1"')
+        self.assertEqual(len(Handler.hits), 2)
+
+    def test_negative_cache(self):
+        r = self.client.get(self.url + '/missing')
+        self.assertEqual(r.status_code, 404)
+        r = self.client.get(self.url + '/missing')
+        self.assertTrue(r.from_cache)
+        self.assertRaises(HTTPError, r.raise_for_status)
+        self.assertEqual(len(Handler.hits), 1)
+
+    def test_cache_only(self):
+        self.client.get(self.url + '/works')
+        self.client.configure(cache_only=True)
+        self.assertTrue(self.client.get(self.url + '/works').from_cache)
+        self.assertRaises(CacheMissError, self.client.get, self.url + '/other')
+        self.assertEqual(len(Handler.hits), 1)
+
+    def test_prune(self):
+        self.client.max_entries = 2
+        for i in range(3):
+            self.client.get(self.url + f'/works/{i}')
+        old = self.client._path(self.client.cache_key(self.url + '/works/0'))
+        os.utime(old, (time.time() - 3600, time.time() - 3600))
+        # the oldest entry goes first
+        self.assertEqual(self.client.prune(), 1)
+        self.assertFalse(old.exists())
+        self.assertEqual(self.client.prune(max_age=0), 2)
+        self.assertEqual(list(Path(self.tmp.name).glob('*/*')), [])
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter(rate=20)
+        start = time.monotonic()
+        threads = [threading.Thread(target=limiter.wait) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # first request goes through immediately, the other four are spaced out
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
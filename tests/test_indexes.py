@@ -0,0 +1,76 @@
+import unittest
+
+from sys import path
+from os.path import dirname
+import time
+
+path.append(dirname(path[0]))
+
+from flask import Flask
+from meteor.misc.indexes import LazyIndex, entry_changed, on_entry_changed
+
+
+class CountingIndex(LazyIndex):
+
+    ttl_setting = 'COUNTING_INDEX_TTL'
+
+    def __init__(self, ttl: int = 3600) -> None:
+        super().__init__(ttl=ttl)
+        self.builds = []
+        self.updates = []
+
+    def _build(self, key):
+        self.builds.append(key)
+        return {'key': key}
+
+    def update(self, uid: str) -> None:
+        self.updates.append(uid)
+
+
+class TestIndexes(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+
+    def test_lazy_index(self):
+        index = CountingIndex()
+        with self.app.app_context():
+            self.assertIsNone(index.peek('NewsSource'))
+            self.assertEqual(index.get('NewsSource'), {'key': 'NewsSource'})
+            index.get('NewsSource')
+            index.get('Organization')
+            self.assertEqual(index.builds, ['NewsSource', 'Organization'])
+            self.assertEqual([key for key, _ in index.items()], ['NewsSource', 'Organization'])
+
+            # rebuilt after ttl
+            self.app.config['COUNTING_INDEX_TTL'] = 0.01
+            time.sleep(0.02)
+            index.get('NewsSource')
+            self.assertEqual(index.builds.count('NewsSource'), 2)
+
+            index.invalidate('NewsSource')
+            self.assertIsNone(index.peek('NewsSource'))
+            self.assertIsNotNone(index.peek('Organization'))
+            index.invalidate()
+            self.assertEqual(index.items(), [])
+
+    def test_abstract(self):
+        class Incomplete(LazyIndex):
+            def update(self, uid: str) -> None:
+                pass
+
+        # fails right away, not on the first build
+        self.assertRaises(TypeError, Incomplete)
+
+    def test_entry_changed(self):
+        index = CountingIndex()
+        changed = []
+        on_entry_changed(changed.append)
+        with self.app.app_context():
+            entry_changed('0x123')
+        self.assertEqual(index.updates, ['0x123'])
+        self.assertEqual(changed, ['0x123'])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
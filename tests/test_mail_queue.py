@@ -0,0 +1,48 @@
+import unittest
+
+from sys import path
+from os.path import dirname
+import os
+import tempfile
+from types import SimpleNamespace
+
+path.append(dirname(path[0]))
+
+from flask_mail import Message
+from meteor.misc.mailqueue import MailQueue, serialize, deserialize, backoff, SCHEMA
+
+
+class TestMailQueue(unittest.TestCase):
+
+    def test_mail_queue(self):
+        msg = Message('Subject', sender='meteor@opted.eu', recipients=['user@opted.eu'], html='<p>Hi</p>')
+        restored = deserialize(serialize(msg))
+        self.assertEqual(restored.subject, 'Subject')
+        self.assertEqual(restored.recipients, ['user@opted.eu'])
+        self.assertEqual(restored.html, '<p>Hi</p>')
+        self.assertEqual(backoff(1), 30)
+        self.assertEqual(backoff(2), 60)
+        self.assertEqual(backoff(100), 6 * 3600)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = MailQueue()
+            queue.app = SimpleNamespace(config={'MAIL_QUEUE_MAX_ATTEMPTS': 2})
+            queue.path = os.path.join(tmp, 'queue.sqlite3')
+            with queue._connect() as db:
+                db.execute(SCHEMA)
+                db.execute('INSERT INTO outbox (message, created, next_attempt) VALUES (?, 0, 0)', (serialize(msg),))
+            self.assertEqual(len(queue), 1)
+            claimed = queue._claim()
+            self.assertEqual(len(claimed), 1)
+            # claimed mails are not handed out twice
+            self.assertEqual(queue._claim(), [])
+            with queue._connect() as db:
+                queue._retry(db, claimed[0][0], 0, Exception('refused'))
+            self.assertEqual(len(queue), 1)
+            with queue._connect() as db:
+                queue._retry(db, claimed[0][0], 1, Exception('refused'))
+            self.assertEqual(len(queue), 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -46,10 +46,17 @@ class TestNotifications(BasicTestSetup):
         unread = get_unread_notifications(self.Reviewer)
         self.assertEqual(unread[0]['uid'], new_notification)
         self.assertFalse(unread[0]['_read'])
+        self.assertEqual(unread_counter.get(self.Reviewer), 1)
+        self.assertEqual(len(get_unread_notifications(self.Reviewer, first=1, offset=1)), 0)
+
+        # count differs from the known count: respond immediately
+        self.assertEqual(unread_counter.wait(self.Reviewer, known=0, timeout=10), 1)
 
         mark_notifications_as_read([new_notification], self.Reviewer)
         unread = get_unread_notifications(self.Reviewer)
         self.assertEqual(len(unread), 0)
+        self.assertEqual(unread_counter.get(self.Reviewer), 0)
+        self.assertEqual(unread_counter.wait(self.Reviewer, known=0, timeout=0.1), 0)
 
         read = get_all_notifications(self.Reviewer)
         self.assertEqual(read[0]['uid'], new_notification)
@@ -57,6 +64,21 @@ class TestNotifications(BasicTestSetup):
 
         dgraph.delete({'uid': new_notification})
 
+    def test_notification_digests(self):
+        from meteor.users.emails import send_notification_digests
+        new_notification = dispatch_notification(self.Reviewer, "Test Notification", "some content", self.derstandard_facebook)
+        dgraph.mutation({'uid': self.reviewer_uid, 'preference_emails': True})
+
+        with self.app.app_context():
+            self.assertGreaterEqual(send_notification_digests(), 1)
+            # claimed notifications are not sent again
+            self.assertEqual(send_notification_digests(), 0)
+
+        notification = dgraph.query(f'{{ q(func: uid({new_notification})) {{ _email_dispatched }} }}')
+        self.assertTrue(notification['q'][0]['_email_dispatched'])
+
+        dgraph.delete({'uid': new_notification})
+
     def test_follow_type(self):
         self.Reviewer.follow_type('Entry')
         following = self.Reviewer.show_follow_types()
@@ -117,7 +139,36 @@ class TestNotifications(BasicTestSetup):
         dgraph.delete({'uid': new_entry})
         self.Reviewer.unfollow_entity(self.lang_german)
 
-    
+    def test_notify_new_entry(self):
+        # Reviewer follows both: type and entity, but should only get one notification
+        self.Reviewer.follow_type('Tool')
+        self.Reviewer.follow_entity(self.lang_german)
+        self.Admin.follow_type('Tool')
+        result = dgraph.upsert(None, set_obj={'uid': '_:test_entry',
+                                        '_unique_name': 'test_entry',
+                                        'dgraph.type': ['Entry', 'Tool'],
+                                        'name': 'Test Entry',
+                                        'entry_review_status': 'pending',
+                                        'languages': [{'uid': self.lang_german}]})
+
+        new_entry = result.uids['test_entry']
+        notify_new_entry(new_entry, 'Tool')
+
+        notifications = get_unread_notifications(self.Reviewer)
+        self.assertEqual(len(notifications), 1)
+        self.assertEqual(notifications[0]['_linked']['uid'], new_entry)
+        self.assertEqual(notifications[0]['_title'], "New pending Tool: <Test Entry>!")
+        dgraph.delete({'uid': notifications[0]['uid']})
+
+        notifications = get_unread_notifications(self.Admin)
+        self.assertEqual(len(notifications), 1)
+        dgraph.delete({'uid': notifications[0]['uid']})
+
+        dgraph.delete({'uid': new_entry})
+        self.Reviewer.unfollow_type('Tool')
+        self.Reviewer.unfollow_entity(self.lang_german)
+        self.Admin.unfollow_type('Tool')
+
     def test_review_notification(self):
         result = dgraph.upsert(None, set_obj={'uid': '_:test_entry',
                                         '_unique_name': 'test_entry',
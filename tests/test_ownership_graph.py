@@ -0,0 +1,33 @@
+import unittest
+
+from sys import path
+from os.path import dirname
+
+path.append(dirname(path[0]))
+
+from meteor.view.ownership import OwnershipGraph
+
+
+class TestOwnershipGraph(unittest.TestCase):
+
+    def test_ownership_graph(self):
+        graph = OwnershipGraph([('0x1', '0x2'), ('0x2', '0x3'), ('0x4', '0x5')])
+        self.assertEqual(len(graph), 2)
+        self.assertEqual(graph.component('0x3')[1], {'0x1', '0x2', '0x3'})
+        self.assertEqual(graph.component('0x9'), (None, {'0x9'}))
+        self.assertEqual(graph.within('0x1', 1), {'0x1', '0x2'})
+        # connect both components
+        stale = graph.set_neighbours('0x3', {'0x2', '0x4'})
+        self.assertEqual(len(stale), 2)
+        self.assertEqual(graph.component('0x5')[1], {'0x1', '0x2', '0x3', '0x4', '0x5'})
+        # split them again
+        graph.set_neighbours('0x2', {'0x1'})
+        self.assertEqual(graph.component('0x1')[1], {'0x1', '0x2'})
+        self.assertEqual(graph.component('0x3')[1], {'0x3', '0x4', '0x5'})
+        graph.set_neighbours('0x1', [])
+        self.assertEqual(graph.component('0x2'), (None, {'0x2'}))
+        self.assertEqual(len(graph), 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,73 @@
+import unittest
+
+from sys import path
+from os.path import dirname
+
+path.append(dirname(path[0]))
+
+from flask import Flask, g
+from meteor.flaskdgraph import build_query_string
+from meteor.flaskdgraph.dgraph_types import SingleChoice, SingleRelationship
+from meteor.flaskdgraph.planner import QueryPlanner, QueryTooExpensive, root_candidates
+
+
+class TestQueryPlanner(unittest.TestCase):
+
+    def test_query_planner(self):
+
+        class Stats:
+            calls = 0
+            def query(self, query_string):
+                self.calls += 1
+                counts = {'has(dgraph.type)': [{'count': 100000}],
+                          'type(NewsSource)': [{'count': 5000}],
+                          'eq(entry_review_status': [{'count': 90000}],
+                          'uid(0x12)': [{'count(~country)': 300, 'count(~countries)': 200}]}
+                blocks = query_string.strip('{} ').split(' } s')
+                result = {}
+                for i, block in enumerate(blocks):
+                    result[f's{i}'] = next((v for k, v in counts.items() if k in block), [{'count': 20000}])
+                return result
+
+        stats = Stats()
+        planner = QueryPlanner(stats)
+        with Flask(__name__).app_context():
+            query_string = build_query_string({'dgraph.type': ['NewsSource'], 'country': ['0x12']}, planner=planner)
+            self.assertIn('var(func: uid(0x12)) { planner_root0 as ~country planner_root1 as ~countries }', query_string)
+            self.assertIn('q(func: uid(planner_root0, planner_root1)', query_string)
+            # filters are unchanged
+            self.assertIn('uid_in(country, 0x12)', query_string)
+            query_string = build_query_string({'dgraph.type': ['NewsSource']}, count=True, planner=planner)
+            self.assertIn('total(func: type(NewsSource))', query_string)
+            # statistics are cached
+            self.assertEqual(stats.calls, 1)
+
+            planner.budget = 2_000_000
+            query_string = build_query_string({'_terms': ['standard']}, planner=planner)
+            self.assertNotIn('regexp', query_string)
+            self.assertTrue(g._query_downgraded)
+            planner.budget = 100
+            self.assertRaises(QueryTooExpensive, build_query_string, {'_terms': ['standard']}, planner=planner)
+            self.assertIn('has(dgraph.type)', build_query_string({'_terms': ['standard']}))
+
+            # statistics of user supplied values do not pile up
+            planner = QueryPlanner(stats, max_stats=3)
+            for i in range(10):
+                build_query_string({'country': [hex(0x100 + i)]}, planner=planner)
+            self.assertEqual(len(planner._stats), 3)
+
+        # only hash / exact indexes and reverse edges can be used at the root
+        choice = SingleChoice(choices={'a': 'A'})
+        choice.predicate = 'kind'
+        choice.dgraph_directives = ['@index(term)']
+        self.assertEqual(root_candidates(choice, 'a'), [])
+        choice.dgraph_directives = ['@index(exact)']
+        self.assertEqual(root_candidates(choice, 'a')[0].func, 'eq(kind, ["a"])')
+        relationship = SingleRelationship(relationship_constraint=['Country'])
+        relationship.predicate = 'country'
+        relationship.dgraph_directives = []
+        self.assertEqual(root_candidates(relationship, '0x12'), [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
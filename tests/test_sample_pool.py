@@ -0,0 +1,33 @@
+import unittest
+
+from sys import path
+from os.path import dirname
+import random
+
+path.append(dirname(path[0]))
+
+from meteor.view.sampling import SamplePool
+
+
+class TestSamplePool(unittest.TestCase):
+
+    def test_sample_pool(self):
+        pool = SamplePool(['0x1', '0x2', '0x3'])
+        # fewer entries than requested
+        self.assertCountEqual(pool.sample(5), ['0x1', '0x2', '0x3'])
+        pool.remove('0x1')
+        pool.remove('0x9')
+        pool.add('0x4')
+        pool.add('0x4')
+        self.assertEqual(len(pool), 3)
+        self.assertNotIn('0x1', pool)
+        self.assertCountEqual(pool.sample(3), ['0x2', '0x3', '0x4'])
+        # every entry can be drawn, including the first one
+        rng = random.Random(1)
+        drawn = {uid for _ in range(100) for uid in pool.sample(1, rng=rng)}
+        self.assertEqual(drawn, {'0x2', '0x3', '0x4'})
+        self.assertEqual(SamplePool().sample(5), [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
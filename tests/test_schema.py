@@ -5,6 +5,11 @@ from sys import path
 from os.path import dirname
 from flask import request, url_for
 import unittest
+import os
+import sys
+import tempfile
+import subprocess
+import json
 
 path.append(dirname(path[0]))
 from test_setup import BasicTestSetup
@@ -30,5 +35,53 @@ class TestSchema(BasicTestSetup):
         self.assertEqual(NewsSource.name.query_filter('some name'), 'eq(name, "some name")')
         self.assertEqual(NewsSource.verified_account.query_filter(True), 'eq(verified_account, "true")')
 
+
+class TestSchemaArtifact(unittest.TestCase):
+
+    """ Schema loaded from a precomputed artifact is the same as the declared one """
+
+    script = """
+import sys, json
+sys.path.append({root!r})
+from meteor.main.model import Schema, NewsSource
+print(json.dumps({{'artifact': Schema.__artifact__ is not None,
+                  'schema': Schema.generate_dgraph_schema(),
+                  'queryable': sorted(Schema.__queryable_predicates__),
+                  'bound': NewsSource.name.bound_dgraph_type}}))
+"""
+
+    def run_script(self, artifact=None):
+        env = dict(os.environ)
+        env.pop('METEOR_SCHEMA_ARTIFACT', None)
+        if artifact:
+            env['METEOR_SCHEMA_ARTIFACT'] = artifact
+        script = self.script.format(root=dirname(dirname(os.path.abspath(__file__))))
+        result = subprocess.run([sys.executable, '-c', script], env=env,
+                                capture_output=True, text=True, check=True)
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def test_artifact(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            artifact = os.path.join(tmp, 'schema.pickle')
+            summary = Schema.build_artifact(artifact)
+            self.assertGreater(summary['types'], 0)
+
+            declared = self.run_script()
+            restored = self.run_script(artifact)
+
+        self.assertFalse(declared.pop('artifact'))
+        self.assertTrue(restored.pop('artifact'))
+        self.assertEqual(declared, restored)
+        self.assertEqual(restored['bound'], 'NewsSource')
+
+    def test_load_artifact(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            artifact = os.path.join(tmp, 'schema.pickle')
+            Schema.build_artifact(artifact)
+            self.assertTrue(Schema.load_artifact(artifact))
+            Schema.__artifact__ = None
+            self.assertFalse(Schema.load_artifact(os.path.join(tmp, 'missing.pickle')))
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=1)
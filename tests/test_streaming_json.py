@@ -0,0 +1,28 @@
+import unittest
+
+from sys import path
+from os.path import dirname
+import gzip
+import json
+
+path.append(dirname(path[0]))
+
+from meteor.api.routes import iter_json
+from meteor.misc.compression import compress_stream, compress
+
+
+class TestStreamingJSON(unittest.TestCase):
+
+    def test_streaming_json(self):
+        data = {'sources_included__datasets': [{'uid': hex(i), 'name': f'Dataset {i}'} for i in range(1000)],
+                'count': 1000}
+        chunks = list(iter_json(data, chunk_size=1024))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(json.loads(''.join(chunks)), data)
+        self.assertEqual(json.loads(''.join(iter_json([]))), [])
+        self.assertEqual(json.loads(gzip.decompress(b''.join(compress_stream(chunks, 'gzip')))), data)
+        self.assertEqual(gzip.decompress(compress(b'meteor', 'gzip')), b'meteor')
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
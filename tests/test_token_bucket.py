@@ -0,0 +1,45 @@
+import unittest
+
+from sys import path
+from os.path import dirname
+import time
+import os
+import tempfile
+
+path.append(dirname(path[0]))
+
+from meteor.misc.ratelimit import MemoryStore, SQLiteStore
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_token_bucket(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for store in (MemoryStore(), SQLiteStore(os.path.join(tmp, 'buckets.sqlite3'))):
+                self.assertTrue(store.consume('ip:0.0.0.0', 5, rate=0.001, burst=10).allowed)
+                bucket = store.consume('ip:0.0.0.0', 5, rate=0.001, burst=10)
+                self.assertTrue(bucket.allowed)
+                self.assertLess(bucket.remaining, 1)
+                bucket = store.consume('ip:0.0.0.0', 5, rate=0.001, burst=10)
+                self.assertFalse(bucket.allowed)
+                self.assertGreater(bucket.retry_after, 4000)
+                # other clients have their own bucket
+                self.assertTrue(store.consume('user:0x1', 10, rate=0.001, burst=10).allowed)
+                # refills over time
+                self.assertTrue(store.consume('user:0x2', 10, rate=1000, burst=10).allowed)
+                time.sleep(0.02)
+                self.assertTrue(store.consume('user:0x2', 10, rate=1000, burst=10).allowed)
+
+        # full buckets are forgotten, the store never grows over max_keys
+        store = MemoryStore(max_keys=2)
+        store.consume('user:0x1', 1, rate=1000, burst=10)
+        time.sleep(0.02)
+        store.consume('user:0x2', 1, rate=1000, burst=10)
+        self.assertEqual(list(store._buckets), ['user:0x2'])
+        for key in ('user:0x3', 'user:0x4', 'user:0x5'):
+            store.consume(key, 1, rate=0.001, burst=10)
+        self.assertEqual(list(store._buckets), ['user:0x4', 'user:0x5'])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
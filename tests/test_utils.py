@@ -6,7 +6,11 @@ from requests import HTTPError
 
 path.append(dirname(path[0]))
 
-from meteor.flaskdgraph.utils import restore_sequence, recursive_restore_sequence
+from meteor.flaskdgraph.utils import restore_sequence, recursive_restore_sequence, extract_block, strip_dgraph_types, as_datetime
+from meteor.flaskdgraph.decoder import SchemaDecoder
+from meteor.misc.metrics import Metrics, fingerprint
+import meteor.main.model
+import datetime
 
 class TestUtils(unittest.TestCase):
     
@@ -58,7 +62,115 @@ class TestUtils(unittest.TestCase):
         self.assertListEqual(l[1]['_authors_fallback'], solution)
         self.assertListEqual(l[2]['_authors_fallback'], ['Author A'])
 
+    def test_raw_response(self):
+        response = b'{"data":[{"uid":"0x1","dgraph.type":["Entry","Tool"]},{"type":["NewsSource","Entry"],"name":"[Entry]"}]}'
+        data = strip_dgraph_types(extract_block(response, block='data'))
+        self.assertEqual(data, b'[{"uid":"0x1","dgraph.type":["Tool"]},{"type":["NewsSource"],"name":"[Entry]"}]')
+        self.assertRaises(ValueError, extract_block, response, block='q')
 
+    def test_schema_decoder(self):
+        response = b'''{"q": [{"uid": "0x1", 
+                               "name": "2021-01-01",
+                               "_date_created": "2021-04-20T14:23:45.123Z",
+                               "_added_by": {"uid": "0x2", "_added_by|timestamp": "2021-04-20T14:23:45Z"}}]}'''
+        for backend in ('json', 'auto'):
+            decoder = SchemaDecoder(backend=backend)
+            data = decoder.decode(response)['q'][0]
+            self.assertEqual(data['name'], '2021-01-01')
+            self.assertIsInstance(data['_date_created'], datetime.datetime)
+            self.assertIsInstance(data['_added_by']['_added_by|timestamp'], datetime.datetime)
+
+
+    def test_metrics(self):
+        q1 = 'query getRecent ($limit: int) { data(func: uid(0x12a), first: 5) @filter(eq(name, "Der Standard")) { uid } }'
+        q2 = 'query getRecent ($limit: int) { data(func: uid(0x3), first: 10) @filter(eq(name, "Falter")) { uid } }'
+        self.assertEqual(fingerprint(q1), fingerprint(q2))
+        self.assertTrue(fingerprint(q1).startswith('getRecent:'))
+
+        metrics = Metrics()
+        metrics.inc('requests_total', route='/view')
+        metrics.inc('requests_total', route='/view')
+        metrics.observe('latency_seconds', 0.3, buckets=(0.1, 0.5), route='/view')
+        self.assertEqual(metrics.get('requests_total', route='/view'), 2)
+        rendered = metrics.render()
+        self.assertIn('requests_total{route="/view"} 2', rendered)
+        self.assertIn('latency_seconds_bucket{route="/view",le="0.1"} 0', rendered)
+        self.assertIn('latency_seconds_bucket{route="/view",le="0.5"} 1', rendered)
+
+    def test_bound_predicates(self):
+        from meteor.flaskdgraph import Schema
+        from meteor.flaskdgraph.dgraph_types import Scalar, UID, make_nquad, dict_to_nquad
+        NewsSource = meteor.main.model.NewsSource
+        Organization = meteor.main.model.Organization
+
+        # inherited predicates are views bound to each type
+        self.assertEqual(NewsSource._date_created.bound_dgraph_type, 'NewsSource')
+        self.assertEqual(Organization._date_created.bound_dgraph_type, 'Organization')
+        self.assertIs(NewsSource._date_created.render_kw, Organization._date_created.render_kw)
+
+        # per-request state stays on the copy
+        predicate = Schema.get_predicates('NewsSource')['countries']
+        predicate.choices = {'0x1': 'Austria'}
+        self.assertNotEqual(NewsSource.countries.choices, {'0x1': 'Austria'})
+
+        # value objects have no instance dict
+        self.assertFalse(hasattr(Scalar('a'), '__dict__'))
+        self.assertFalse(hasattr(UID('0x1'), '__dict__'))
+        self.assertEqual(make_nquad(UID('0x1'), 'name', 'Falter'), '<0x1> <name> "Falter" .')
+        self.assertEqual(make_nquad(UID('0x1'), '*', '*'), '<0x1> * * .')
+        self.assertEqual(dict_to_nquad({'uid': UID('0x1'), 'name': 'Falter'}), ['<0x1> <name> "Falter" .'])
+
+    def test_nquad_writer(self):
+        from meteor.flaskdgraph.dgraph_types import UID, Scalar
+        from meteor.flaskdgraph.nquads import NQuadWriter, chunk_nquads
+
+        writer = NQuadWriter()
+        writer.write_dict({'uid': UID('0x1'),
+                           'name': 'Der "Standard"\nWien',
+                           'alternate_names': [Scalar('DS', facets={'kind': 'short "name"'})]})
+        self.assertEqual(writer.getvalue(),
+                         '<0x1> <name> "Der \\"Standard\\"\\nWien" . \n'
+                         '<0x1> <alternate_names> "DS" (kind="short \\"name\\"") .')
+        self.assertEqual(writer.size, len(writer.getvalue().encode('utf-8')))
+
+        writer = NQuadWriter(separator='\n')
+        writer.write_json({'uid': '_:a', 'dgraph.type': ['NewsSource', 'Entry'],
+                           'name': 'Zürich', 'name|lang': 'de',
+                           'authors': [{'uid': '0x2', 'authors|sequence': 0},
+                                       {'name': 'New Author', 'authors|sequence': 1}],
+                           'audience_size': [10, 20], 'audience_size|unit': {'0': 'followers', '1': 'likes'}})
+        nquads = writer.getvalue().split('\n')
+        self.assertIn('_:a <dgraph.type> "Entry" .', nquads)
+        self.assertIn('_:a <name> "Zürich" (lang="de") .', nquads)
+        self.assertIn('_:a <authors> <0x2> (sequence=0) .', nquads)
+        self.assertIn('_:a <audience_size> "20" (unit="likes") .', nquads)
+        new_author = [n for n in nquads if n.endswith('<name> "New Author" .')][0].split(' ')[0]
+        self.assertIn(f'_:a <authors> {new_author} (sequence=1) .', nquads)
+
+        objects = [{'uid': f'_:n{i}', 'name': 'x' * 100} for i in range(50)]
+        chunks = list(chunk_nquads(objects, max_bytes=1000, format='json'))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 1000 for chunk in chunks))
+        self.assertEqual(sum(chunk.count(' .') for chunk in chunks), 50)
+
+    def test_as_datetime(self):
+        utc = datetime.datetime(2021, 4, 20, 14, 23, 45, tzinfo=datetime.timezone.utc)
+        self.assertEqual(as_datetime('2021-04-20T14:23:45Z'), utc)
+        self.assertEqual(as_datetime(datetime.datetime(2021, 4, 20, 14, 23, 45)), utc)
+        self.assertEqual(as_datetime(utc).isoformat(), '2021-04-20T14:23:45+00:00')
+        self.assertIsNone(as_datetime(None))
+
+    def test_fuzzy_index(self):
+        from meteor.add.duplicates import FuzzyIndex
+        index = FuzzyIndex([{'uid': '0x1', 'name': 'Der Standard', 'alternate_names': ['derstandard.at']},
+                            {'uid': '0x2', 'name': 'Falter'},
+                            {'uid': '0x3', 'name': 'Kronen Zeitung', 'alternate_names': ['Krone']}])
+        self.assertEqual(index.search('Der Standrad')[0][0], '0x1')
+        self.assertEqual(index.search('https://www.derstandard.at')[0], ('0x1', 100))
+        self.assertEqual(index.search('Kronen Zeitunk')[0][0], '0x3')
+        self.assertEqual(index.search('Süddeutsche'), [])
+        index.add('0x4', 'Falter Wien')
+        self.assertEqual([uid for uid, _ in index.search('Falter Wein')], ['0x4'])
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -56,6 +56,7 @@ def save_publication_cache():
 
 from meteor.external.doi import resolve_doi, resolve_authors, clean_doi
 from meteor.external.cran import cran
+from meteor.external.dgraph import build_author_match_query, map_author_matches
 import datetime
 import secrets
 from slugify import slugify
@@ -73,40 +74,37 @@ with open(p / 'meteor' / 'config.json') as f:
     CONFIG = json.load(f)
 
 
-def dgraph_check_author(orcid: str = None, openalex: typing.Union[str, list] = None) -> typing.Union[dict, None]:
-
-    dgraph_author_query = """query checkAuthor ( $orcid: string, $openalex: string ) {
-        q(func: type(Author)) @filter(eq(orcid, $orcid) OR eq(openalex, $openalex)) {
-            uid openalex orcid
-            }
-        }
-    """
-    variables = {'$orcid': str(orcid)}
-    if openalex is None:
-        variables['$openalex'] = 'None'
-    elif isinstance(openalex, list):
-        _openalex = ", ".join(openalex)
-        variables['$openalex'] = f'"[{_openalex}]"'
-    else:
-        variables['$openalex'] = str(openalex)
+def dgraph_check_authors(authors: typing.List[dict]) -> typing.List[typing.Union[dict, None]]:
+    """ Find existing authors in DGraph with one query. Returns one match (or None) per author """
+    query = build_author_match_query(authors)
+    if query is None:
+        return [None] * len(authors)
 
     txn = client.txn(read_only=True)
-    res = txn.query(dgraph_author_query, 
-                variables=variables,
+    res = txn.query(query.render(), 
+                variables=query.get_graphql_variables(),
                 timeout=10)
     txn.discard()
 
     j = json.loads(res.json)
-    
-    if len(j['q']) > 0:
-        return j['q'][0]
-   
-    return None
+
+    return map_author_matches(authors, j['q'])
+
+
+def dgraph_check_author(orcid: str = None, openalex: typing.Union[str, list] = None) -> typing.Union[dict, None]:
+    author = {}
+    if orcid:
+        author['orcid'] = orcid
+    if openalex:
+        author['openalex'] = openalex
+    return dgraph_check_authors([author])[0]
 
 def process_authors(authors_tmp: list, cache, entry_review_status='accepted') -> list:
     authors = resolve_authors(authors_tmp, orcid_token=CONFIG['ORCID_ACCESS_TOKEN'])
     authors_new = []
-    for author in authors:
+    # Check which authors are already in DGraph
+    existing_authors = dgraph_check_authors(authors)
+    for author, uid in zip(authors, existing_authors):
         if 'affiliations' in author:
             if author['affiliations'] is None:
                 _ = author.pop('affiliations')
@@ -117,7 +115,6 @@ def process_authors(authors_tmp: list, cache, entry_review_status='accepted') ->
             if not isinstance(openalex, list):
                 openalex = [openalex]
         # Then we check whether the author is already in DGraph
-        uid = dgraph_check_author(orcid=orcid, openalex=openalex)
         if uid:
             author_details = {'uid': uid['uid'],
                               'authors|sequence': author['authors|sequence']}